@@ -1,3 +1,19 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import AnalysisEvent, AnalysisJob
+
+
+@admin.register(AnalysisJob)
+class AnalysisJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "status", "stage", "progress", "created_at", "finished_at")
+    list_filter = ("status",)
+    exclude = ("image",)
+    readonly_fields = ("status", "stage", "progress", "prompt", "result", "error", "started_at", "finished_at",
+                       "owner", "heartbeat_at")
+
+
+@admin.register(AnalysisEvent)
+class AnalysisEventAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "endpoint", "label", "confidence", "latency_ms", "ok", "model_version")
+    list_filter = ("endpoint", "ok", "label")
+    date_hierarchy = "created_at"
@@ -0,0 +1,201 @@
+# api/admission.py
+"""
+Admission control untuk endpoint inferensi & LLM (per proses worker): /analyze, /classify,
+/explain, /chat, /chat/<id>. Nonaktif secara default (ADMISSION_ENABLED).
+
+- Token bucket per klien (ADMISSION_RATE_PER_MIN, ADMISSION_BURST) → 429 + Retry-After.
+- Dua jalur slot terbatas: "inference" (model) dan "llm" (Gemini), sehingga klasifikasi yang
+  cepat tidak mengantre di belakang panggilan LLM yang lambat. Sebelum menunggu slot, perkiraan
+  waktu tunggu = (antrean + 1) / slot × EWMA durasi layanan; bila melewati
+  ADMISSION_QUEUE_BUDGET_S request ditolak seketika (503 + Retry-After) alih-alih menumpuk
+  sampai klien timeout.
+- Jalur LLM penuh + ADMISSION_DEGRADE → view membalas hasil klasifikasi saja.
+"""
+from __future__ import annotations
+import math, threading, time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict
+
+from django.conf import settings
+
+
+class Overloaded(RuntimeError):
+    """Perkiraan tunggu melewati anggaran (503) atau klien melewati kuota (429)."""
+
+    def __init__(self, detail: str, retry_after_s: float, status: int = 503):
+        super().__init__(detail)
+        self.status = status
+        self.retry_after_s = retry_after_s
+
+    @property
+    def retry_after(self) -> str:
+        return str(max(1, math.ceil(self.retry_after_s)))
+
+
+class Lane:
+    def __init__(self, name: str, slots: int, est_service_s: float, alpha: float = 0.2):
+        self.name = name
+        self.slots = max(1, slots)
+        self._ewma = est_service_s
+        self._alpha = alpha
+        self._inflight = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+        self._stats = {"admitted": 0, "shed": 0, "timeout": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+
+    def _estimate_wait(self) -> float:
+        if self._inflight < self.slots and self._waiting == 0:
+            return 0.0
+        return (self._waiting + 1) / self.slots * self._ewma
+
+    def acquire(self, budget_s: float) -> float:
+        t0 = time.monotonic()
+        with self._cond:
+            est = self._estimate_wait()
+            if est > budget_s:
+                self._stats["shed"] += 1
+                raise Overloaded("Server sedang sibuk, coba lagi sebentar.", est)
+            self._waiting += 1
+            try:
+                while self._inflight >= self.slots:
+                    left = budget_s - (time.monotonic() - t0)
+                    if left <= 0:
+                        self._stats["timeout"] += 1
+                        raise Overloaded("Server sedang sibuk, coba lagi sebentar.", self._estimate_wait())
+                    self._cond.wait(left)
+            finally:
+                self._waiting -= 1
+            self._inflight += 1
+            wait_ms = (time.monotonic() - t0) * 1000.0
+            self._stats["admitted"] += 1
+            self._stats["wait_ms_total"] += wait_ms
+            self._stats["wait_ms_max"] = max(self._stats["wait_ms_max"], wait_ms)
+        return time.monotonic()
+
+    def release(self, service_s: float) -> None:
+        with self._cond:
+            self._inflight -= 1
+            self._ewma = self._alpha * service_s + (1 - self._alpha) * self._ewma
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self, budget_s: float):
+        start = self.acquire(budget_s)
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def snapshot(self) -> Dict:
+        with self._cond:
+            s = dict(self._stats)
+            s.update(slots=self.slots, inflight=self._inflight, waiting=self._waiting,
+                     service_s_ewma=self._ewma, est_wait_s=self._estimate_wait())
+        s["wait_ms_avg"] = s.pop("wait_ms_total") / s["admitted"] if s["admitted"] else 0.0
+        return s
+
+
+class TokenBucket:
+    """Kuota per klien; klien paling lama tidak aktif dibuang saat melewati max_clients."""
+
+    def __init__(self, rate_per_s: float, burst: float, max_clients: int = 10000):
+        self.rate = rate_per_s
+        self.burst = max(1.0, burst)
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"allowed": 0, "limited": 0}
+
+    def take(self, key: str) -> float:
+        """0 bila diizinkan, selain itu detik sampai token berikutnya tersedia."""
+        now = time.monotonic()
+        with self._lock:
+            b = self._buckets.pop(key, None) or [self.burst, now]
+            b[0] = min(self.burst, b[0] + (now - b[1]) * self.rate)
+            b[1] = now
+            self._buckets[key] = b
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            if b[0] >= 1.0:
+                b[0] -= 1.0
+                self._stats["allowed"] += 1
+                return 0.0
+            self._stats["limited"] += 1
+            return (1.0 - b[0]) / self.rate
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {**self._stats, "clients": len(self._buckets)}
+
+
+inference_lane = Lane("inference", settings.ADMISSION_INFER_SLOTS, settings.ADMISSION_INFER_EST_S)
+llm_lane = Lane("llm", settings.ADMISSION_LLM_SLOTS, settings.ADMISSION_LLM_EST_S)
+_bucket = None
+_bucket_lock = threading.Lock()
+_degraded = 0
+_degraded_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return settings.ADMISSION_ENABLED
+
+
+def _get_bucket() -> TokenBucket:
+    """Bucket mengikuti settings saat ini (rate/burst bisa diubah tanpa restart modul, mis. di test)."""
+    global _bucket
+    rate, burst = settings.ADMISSION_RATE_PER_MIN / 60.0, settings.ADMISSION_BURST
+    with _bucket_lock:
+        if _bucket is None or (_bucket.rate, _bucket.burst) != (rate, max(1.0, burst)):
+            _bucket = TokenBucket(rate, burst)
+        return _bucket
+
+
+def client_key(request) -> str:
+    """
+    Alamat klien untuk kuota. Entri awal X-Forwarded-For dikendalikan klien (bisa diganti tiap
+    request), jadi yang dipakai adalah entri ke-N dari kanan — yang ditambahkan proxy tepercaya
+    (N = ADMISSION_TRUSTED_PROXIES). Header kosong / kurang entri → REMOTE_ADDR.
+    """
+    header = settings.ADMISSION_CLIENT_HEADER
+    hops = settings.ADMISSION_TRUSTED_PROXIES
+    if header and hops > 0:
+        entries = [e.strip() for e in request.headers.get(header, "").split(",") if e.strip()]
+        if len(entries) >= hops:
+            return entries[-hops]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def check_rate(request) -> None:
+    """429 bila klien melewati kuota; no-op bila admission atau rate limit nonaktif."""
+    if not enabled() or settings.ADMISSION_RATE_PER_MIN <= 0:
+        return
+    wait_s = _get_bucket().take(client_key(request))
+    if wait_s > 0:
+        raise Overloaded("Terlalu banyak permintaan, coba lagi sebentar.", wait_s, status=429)
+
+
+@contextmanager
+def admit(lane: Lane, budget_s: float = None):
+    """Slot di lane (tunggu ≤ budget_s, default ADMISSION_QUEUE_BUDGET_S); no-op bila nonaktif."""
+    if not enabled():
+        yield
+        return
+    with lane.slot(settings.ADMISSION_QUEUE_BUDGET_S if budget_s is None else budget_s):
+        yield
+
+
+def note_degraded() -> None:
+    global _degraded
+    with _degraded_lock:
+        _degraded += 1
+
+
+def admission_stats() -> Dict:
+    return {
+        "enabled": enabled(),
+        "inference": inference_lane.snapshot(),
+        "llm": llm_lane.snapshot(),
+        "rate_limit": _bucket.snapshot() if _bucket is not None else {"allowed": 0, "limited": 0, "clients": 0},
+        "degraded": _degraded,
+    }
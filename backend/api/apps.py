@@ -1,6 +1,49 @@
+import os, sys
+
 from django.apps import AppConfig
 
 
+def _sqlite_pragmas(sender, connection, **kwargs):
+    """Pragma per koneksi untuk mode WAL (pembaca tidak terblokir writer: antrean job, log event).
+
+    journal_mode=WAL sendiri persisten di file DB dan diset sekali oleh migrasi 0004_sqlite_wal,
+    sehingga membuka koneksi tidak menulis ulang header db.sqlite3.
+    """
+    if connection.vendor != "sqlite":
+        return
+    from django.conf import settings
+
+    if settings.SQLITE_WAL:
+        with connection.cursor() as cur:
+            cur.execute("PRAGMA synchronous=NORMAL;")
+            cur.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)};")
+
+
+def _serves_web() -> bool:
+    """Proses web (runserver/gunicorn/uwsgi), bukan migrate/test/analyze_worker/score_images dsb."""
+    if os.environ.get("NAILBOT_INFER_POOL_WORKER"):  # proses pool inferensi (infer_pool.WORKER_ENV)
+        return False
+    prog = os.path.basename(sys.argv[0]) if sys.argv else ""
+    if prog in ("manage.py", "django-admin", "__main__.py"):
+        if len(sys.argv) < 2 or sys.argv[1] != "runserver":
+            return False
+        # autoreloader: hanya proses anak (RUN_MAIN) yang melayani request
+        return os.environ.get("RUN_MAIN") == "true" or "--noreload" in sys.argv
+    return prog not in ("", "-c") and "pytest" not in prog  # gunicorn/uwsgi/daphne...
+
+
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        connection_created.connect(_sqlite_pragmas, dispatch_uid="api.sqlite_pragmas")
+
+        from django.conf import settings
+
+        if settings.ANALYZE_JOB_AUTOSTART and _serves_web():
+            # job yang tertinggal (queued / stale) setelah restart diproses tanpa menunggu upload baru
+            from .jobs import ensure_inprocess_workers
+            ensure_inprocess_workers()
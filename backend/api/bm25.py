@@ -0,0 +1,146 @@
+# api/bm25.py
+"""
+Indeks leksikal BM25 ringan (tanpa dependensi selain numpy).
+
+Dibangun oleh scripts/build_index.py & scripts/build_scholar_index.py berdampingan
+dengan koleksi Chroma, lalu disimpan ringkas sebagai .npz (posting list gaya CSR).
+"""
+from __future__ import annotations
+import math
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"\w+", flags=re.UNICODE)
+
+# stopword minimal ID/EN — cukup untuk meredam kata tanya & kata sambung
+_STOPWORDS = {
+    "yang", "dan", "di", "ke", "dari", "ini", "itu", "pada", "untuk", "dengan", "atau",
+    "apa", "apakah", "adalah", "akan", "saya", "bisa", "juga", "ada", "tidak", "jika",
+    "the", "of", "and", "in", "to", "a", "an", "is", "are", "for", "with", "on", "or",
+    "label",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase + split kata; buang stopword & token 1 huruf."""
+    return [
+        t for t in _TOKEN_RE.findall((text or "").lower())
+        if len(t) > 1 and t not in _STOPWORDS
+    ]
+
+
+def bm25_path(index_dir: Path, collection: str) -> Path:
+    """Lokasi file BM25 untuk sebuah koleksi (disimpan di samping chroma.sqlite3)."""
+    return Path(index_dir) / f"{collection}.bm25.npz"
+
+
+class BM25Index:
+    """
+    Posting list per term dalam layout CSR:
+      indptr[t]..indptr[t+1] → (doc_idx, tf) untuk term ke-t.
+    """
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        vocab: np.ndarray,
+        indptr: np.ndarray,
+        doc_idx: np.ndarray,
+        tf: np.ndarray,
+        doc_len: np.ndarray,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ):
+        self.ids = ids
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_idx = doc_idx
+        self.tf = tf
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+        self._term_id: Dict[str, int] = {str(t): i for i, t in enumerate(vocab)}
+        self._avgdl = float(doc_len.mean()) if len(doc_len) else 0.0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, ids: Iterable[str], texts: Iterable[str]) -> "BM25Index":
+        ids = list(ids)
+        postings: Dict[str, Dict[int, int]] = {}
+        doc_len: List[int] = []
+        for d, text in enumerate(texts):
+            toks = tokenize(text)
+            doc_len.append(len(toks))
+            for t in toks:
+                row = postings.setdefault(t, {})
+                row[d] = row.get(d, 0) + 1
+
+        vocab = sorted(postings)
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        doc_idx: List[int] = []
+        tf: List[int] = []
+        for i, t in enumerate(vocab):
+            row = postings[t]
+            for d in sorted(row):
+                doc_idx.append(d)
+                tf.append(min(row[d], np.iinfo(np.uint16).max))
+            indptr[i + 1] = len(doc_idx)
+
+        return cls(
+            ids=np.asarray(ids, dtype=str),
+            vocab=np.asarray(vocab, dtype=str),
+            indptr=indptr,
+            doc_idx=np.asarray(doc_idx, dtype=np.int32),
+            tf=np.asarray(tf, dtype=np.uint16),
+            doc_len=np.asarray(doc_len, dtype=np.int32),
+        )
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp.npz")
+        np.savez_compressed(
+            tmp,
+            ids=self.ids, vocab=self.vocab, indptr=self.indptr,
+            doc_idx=self.doc_idx, tf=self.tf, doc_len=self.doc_len,
+        )
+        tmp.replace(path)  # atomic agar worker tidak membaca file setengah jadi
+
+    @classmethod
+    def load(cls, path: Path) -> "BM25Index":
+        with np.load(str(path), allow_pickle=False) as z:
+            return cls(
+                ids=z["ids"], vocab=z["vocab"], indptr=z["indptr"],
+                doc_idx=z["doc_idx"], tf=z["tf"], doc_len=z["doc_len"],
+            )
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Return [(doc_id, skor_bm25)] terurut menurun; kosong bila tak ada term yang cocok."""
+        n = len(self.ids)
+        if n == 0:
+            return []
+        scores = np.zeros(n, dtype=np.float32)
+        norm = self.k1 * (1.0 - self.b + self.b * self.doc_len / (self._avgdl or 1.0))
+        hit = False
+        for t in set(tokenize(query)):
+            ti = self._term_id.get(t)
+            if ti is None:
+                continue
+            lo, hi = self.indptr[ti], self.indptr[ti + 1]
+            docs = self.doc_idx[lo:hi]
+            tf = self.tf[lo:hi].astype(np.float32)
+            df = hi - lo
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tf * (self.k1 + 1.0) / (tf + norm[docs])
+            hit = True
+        if not hit:
+            return []
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(str(self.ids[i]), float(scores[i])) for i in top if scores[i] > 0]
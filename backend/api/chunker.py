@@ -0,0 +1,82 @@
+# api/chunker.py
+"""
+Chunker sekali jalan (linear) berbasis token untuk builder index.
+
+1. Segmentasi kalimat sekali dengan satu regex finditer (tanpa backtracking per jendela).
+2. Panjang token tiap kalimat dihitung dalam satu panggilan batch tokenizer (MiniLM).
+3. Kalimat dikemas ke jendela ≤ max_tokens dengan dua pointer; overlap = kalimat di ekor
+   jendela sebelumnya selama totalnya ≤ overlap_tokens. Kalimat yang sendirian melebihi
+   max_tokens dipotong di batas token (offset mapping tokenizer).
+Tiap chunk membawa offset karakter (start, end) di teks sumber dan n_tokens.
+"""
+from __future__ import annotations
+import re
+from typing import Dict, List, Tuple
+
+# akhir kalimat: tanda baca + spasi/akhir teks, atau paragraf baru
+_BOUNDARY = re.compile(r"[.!?]+(?=\s|$)|\n\s*\n")
+
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """Span (start, end) kalimat tanpa spasi tepi; satu kali scan."""
+    spans: List[Tuple[int, int]] = []
+    start = 0
+    for m in _BOUNDARY.finditer(text):
+        spans.append((start, m.end()))
+        start = m.end()
+    spans.append((start, len(text)))
+
+    out = []
+    for s, e in spans:
+        while s < e and text[s].isspace():
+            s += 1
+        while e > s and text[e - 1].isspace():
+            e -= 1
+        if s < e:
+            out.append((s, e))
+    return out
+
+
+def _split_long(text: str, span: Tuple[int, int], tokenizer, max_tokens: int) -> List[Tuple[int, int, int]]:
+    """Pecah satu kalimat kepanjangan di batas token → [(start, end, n_tokens)]."""
+    s0, e0 = span
+    offsets = tokenizer(text[s0:e0], add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+    pieces = []
+    for i in range(0, len(offsets), max_tokens):
+        part = offsets[i:i + max_tokens]
+        pieces.append((s0 + part[0][0], s0 + part[-1][1], len(part)))
+    return pieces
+
+
+def chunk_by_tokens(text: str, tokenizer, max_tokens: int = 200, overlap_tokens: int = 32) -> List[Dict]:
+    """
+    Return [{"text", "start", "end", "n_tokens"}]. tokenizer: tokenizer HF (fast) milik model
+    embedding, mis. SentenceTransformer(...).tokenizer.
+    """
+    spans = split_sentences(text)
+    if not spans:
+        return []
+    lengths = [len(ids) for ids in tokenizer([text[s:e] for s, e in spans], add_special_tokens=False)["input_ids"]]
+
+    units: List[Tuple[int, int, int]] = []  # (start, end, n_tokens), semua ≤ max_tokens
+    for span, n in zip(spans, lengths):
+        units.extend(_split_long(text, span, tokenizer, max_tokens) if n > max_tokens else [(span[0], span[1], n)])
+
+    chunks: List[Dict] = []
+    i, n_units = 0, len(units)
+    while i < n_units:
+        j, total = i, 0
+        while j < n_units and total + units[j][2] <= max_tokens:
+            total += units[j][2]
+            j += 1
+        start, end = units[i][0], units[j - 1][1]
+        chunks.append({"text": text[start:end], "start": start, "end": end, "n_tokens": total})
+        if j >= n_units:
+            break
+        # awal jendela berikutnya: mundur dari j selama ekor ≤ overlap_tokens (tetap maju > i)
+        k, tail = j, 0
+        while k - 1 > i and tail + units[k - 1][2] <= overlap_tokens:
+            k -= 1
+            tail += units[k][2]
+        i = k
+    return chunks
@@ -0,0 +1,160 @@
+# api/conversation.py
+"""
+Sesi percakapan lanjutan per gambar.
+
+State sesi (prediksi, passage yang sudah dikirim ke LLM (id + tag), jumlah tag terpakai,
+riwayat ringkas) disimpan di cache Django dengan kunci session_id dan TTL idle
+CHAT_SESSION_TTL_S, sehingga giliran berikutnya boleh mendarat di worker mana pun.
+Seperti token analisis (api/pipeline.py), deployment multi-worker/multi-host memerlukan
+CACHE_BACKEND bersama (redis/memcached/db); LocMemCache hanya berlaku per proses.
+Satu giliran per sesi pada satu waktu: dijaga lock di cache (cache.add atomik).
+
+Giliran pertama = explain_prediction penuh; giliran berikutnya hanya mengirim
+passage baru + riwayat ringkas (explain_followup_turn).
+"""
+from __future__ import annotations
+import re, secrets, threading, time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .llm import explain_followup_turn, explain_prediction
+
+_HEADING = re.compile(r"^#+\s.*$", flags=re.M)
+
+
+class ConversationBusy(Exception):
+    """Giliran lain pada sesi yang sama masih diproses."""
+
+
+def _summarize(answer_md: str, max_chars: int = 320) -> str:
+    """Ringkasan jawaban untuk riwayat: buang heading & blok sumber, potong pendek."""
+    text = answer_md.split("## Sumber")[0].split("**Sumber baru:**")[0]
+    text = _HEADING.sub("", text)
+    text = " ".join(text.split())
+    return text if len(text) <= max_chars else text[:max_chars].rstrip() + "…"
+
+
+def _state_key(session_id: str) -> str:
+    return f"chat:{session_id}"
+
+
+@contextmanager
+def _session_lock(session_id: str) -> Iterator[None]:
+    """Lock lintas worker via cache.add; TTL membatasi lock yatim bila worker mati di tengah giliran."""
+    key, token = f"chat:{session_id}:lock", secrets.token_hex(8)
+    deadline = time.monotonic() + settings.CHAT_LOCK_WAIT_S
+    while not cache.add(key, token, timeout=settings.CHAT_LOCK_TTL_S):
+        if time.monotonic() >= deadline:
+            store.count("busy")
+            raise ConversationBusy(session_id)
+        time.sleep(0.05)
+    try:
+        yield
+    finally:
+        if cache.get(key) == token:
+            cache.delete(key)
+
+
+class Conversation:
+    def __init__(self, label: str, confidence: float, probs: Dict, session_id: Optional[str] = None):
+        self.id = session_id or secrets.token_urlsafe(12)
+        self.label = label
+        self.confidence = confidence
+        self.probs = probs
+        self.seen_ids: Set[Tuple[str, str]] = set()
+        self.l_count = 0
+        self.s_count = 0
+        self.refs: List[str] = []
+        self.history: Deque[Tuple[str, str]] = deque(maxlen=settings.CHAT_HISTORY_TURNS)
+        self.turns = 0
+
+    def to_state(self) -> Dict:
+        return {
+            "label": self.label, "confidence": self.confidence, "probs": self.probs,
+            "seen_ids": sorted(self.seen_ids), "l_count": self.l_count, "s_count": self.s_count,
+            "refs": list(self.refs), "history": list(self.history), "turns": self.turns,
+        }
+
+    @classmethod
+    def from_state(cls, session_id: str, state: Dict) -> "Conversation":
+        conv = cls(state["label"], state["confidence"], state["probs"], session_id=session_id)
+        conv._load(state)
+        return conv
+
+    def _load(self, state: Dict) -> None:
+        self.seen_ids = {tuple(x) for x in state["seen_ids"]}
+        self.l_count, self.s_count = state["l_count"], state["s_count"]
+        self.refs = list(state["refs"])
+        self.history = deque((tuple(h) for h in state["history"]), maxlen=settings.CHAT_HISTORY_TURNS)
+        self.turns = state["turns"]
+
+    def save(self) -> None:
+        cache.set(_state_key(self.id), self.to_state(), timeout=settings.CHAT_SESSION_TTL_S)
+
+    def _absorb(self, selected: List[Dict], refs: List[str]) -> None:
+        for s in selected:
+            self.seen_ids.add((s["bucket"], s["id"]))
+            if s["bucket"] == "S":
+                self.s_count += 1
+            else:
+                self.l_count += 1
+        self.refs.extend(refs)
+
+    def ask(self, question: str) -> str:
+        """Satu giliran; state dimuat ulang dari cache di bawah lock (giliran sebelumnya bisa dari worker lain)."""
+        with _session_lock(self.id):
+            state = cache.get(_state_key(self.id))
+            if state is not None:
+                self._load(state)
+            if self.turns == 0:
+                trace: Dict = {}
+                answer = explain_prediction(self.label, self.confidence, self.probs, question, trace=trace)
+                self._absorb(trace.get("selected", []), trace.get("refs", []))
+            else:
+                answer, selected, refs = explain_followup_turn(
+                    self.label, self.confidence, question, list(self.history),
+                    self.seen_ids, self.l_count, self.s_count,
+                )
+                self._absorb(selected, refs)
+            self.history.append((question or "(penjelasan awal)", _summarize(answer)))
+            self.turns += 1
+            self.save()
+            return answer
+
+
+class ConversationStore:
+    """Akses sesi di cache Django; kedaluwarsa/eviction ditangani backend cache (TTL idle)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "resumed": 0, "missing": 0, "busy": 0}
+
+    def count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def create(self, label: str, confidence: float, probs: Dict) -> Conversation:
+        conv = Conversation(label, confidence, probs)
+        conv.save()
+        self.count("created")
+        return conv
+
+    def get(self, session_id: str) -> Optional[Conversation]:
+        state = cache.get(_state_key(session_id)) if session_id else None
+        if state is None:
+            self.count("missing")
+            return None
+        self.count("resumed")
+        return Conversation.from_state(session_id, state)
+
+    def snapshot(self) -> Dict:
+        """Statistik per proses worker (jumlah sesi aktif ada di backend cache)."""
+        with self._lock:
+            return dict(self.stats)
+
+
+store = ConversationStore()
@@ -0,0 +1,131 @@
+# api/encoder.py
+"""
+Backend encoder query untuk RAG (dipilih lewat RAG_EMB_BACKEND).
+
+- "torch": SentenceTransformer eager fp32 (default, sama persis dengan saat build index)
+- "int8" : salinan model dengan nn.Linear dikuantisasi dinamis ke int8 (CPU)
+- "onnx" : transformer diekspor sekali ke ONNX (RAG_ONNX_PATH), dijalankan ONNX Runtime;
+           mean pooling + normalisasi L2 di numpy (sama dengan pipeline all-MiniLM-L6-v2)
+
+Semua backend mengembalikan embedding float32 ternormalisasi sehingga tetap kompatibel dengan
+koleksi rag_index yang ada (lihat tes paritas kosinus di api/tests.py). Tokenisasi query
+di-cache (LRU) karena varian query yang sama sering berulang antar request.
+"""
+from __future__ import annotations
+import copy, logging, os, threading
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "int8", "onnx")
+
+
+class TorchEncoder:
+    name = "torch"
+
+    def __init__(self, st_model):
+        self.st = st_model
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        vecs = self.st.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+        return np.asarray(vecs, dtype=np.float32)
+
+
+class Int8Encoder(TorchEncoder):
+    name = "int8"
+
+    def __init__(self, st_model):
+        import torch
+        # kuantisasi salinan CPU; model fp32 asli tetap utuh untuk builder/perbandingan
+        q = copy.deepcopy(st_model).to("cpu")
+        super().__init__(torch.ao.quantization.quantize_dynamic(q, {torch.nn.Linear}, dtype=torch.qint8, inplace=True))
+
+
+class OnnxEncoder:
+    name = "onnx"
+
+    def __init__(self, st_model, onnx_path: Path):
+        import onnxruntime as ort
+
+        self.tokenizer = st_model.tokenizer
+        self.max_len = int(getattr(st_model, "max_seq_length", 256) or 256)
+        onnx_path = Path(onnx_path)
+        if not onnx_path.exists():
+            export_onnx(st_model, onnx_path)
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(onnx_path), opts, providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self.session.get_inputs()}
+        self._tok = lru_cache(maxsize=2048)(self._tokenize_one)
+
+    def _tokenize_one(self, text: str) -> Tuple[int, ...]:
+        return tuple(self.tokenizer(text, truncation=True, max_length=self.max_len)["input_ids"])
+
+    def _batch(self, texts: List[str]):
+        ids = [self._tok(t) for t in texts]
+        width = max(len(x) for x in ids)
+        pad = self.tokenizer.pad_token_id or 0
+        input_ids = np.full((len(ids), width), pad, dtype=np.int64)
+        mask = np.zeros((len(ids), width), dtype=np.int64)
+        for i, x in enumerate(ids):
+            input_ids[i, :len(x)] = x
+            mask[i, :len(x)] = 1
+        feeds = {"input_ids": input_ids, "attention_mask": mask}
+        if "token_type_ids" in self._inputs:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        return feeds, mask
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        out = []
+        for i in range(0, len(texts), batch_size):
+            feeds, mask = self._batch(texts[i:i + batch_size])
+            hidden = self.session.run(None, feeds)[0]  # (B, T, D)
+            m = mask[..., None].astype(np.float32)
+            pooled = (hidden * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            out.append(pooled.astype(np.float32))
+        return np.concatenate(out) if out else np.zeros((0, 0), dtype=np.float32)
+
+
+_export_lock = threading.Lock()
+
+
+def export_onnx(st_model, onnx_path: Path) -> None:
+    """Ekspor transformer (tanpa pooling) ke ONNX dengan sumbu batch & sekuens dinamis."""
+    import torch
+
+    with _export_lock:
+        if onnx_path.exists():
+            return
+        hf = copy.deepcopy(st_model[0].auto_model).to("cpu").eval()
+        enc = st_model.tokenizer(["contoh"], return_tensors="pt")
+        names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in enc]
+        dyn = {n: {0: "batch", 1: "seq"} for n in names}
+        dyn["last_hidden_state"] = {0: "batch", 1: "seq"}
+        onnx_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = onnx_path.with_name(onnx_path.name + ".tmp")
+        with torch.no_grad():
+            torch.onnx.export(
+                hf, tuple(enc[n] for n in names), str(tmp),
+                input_names=names, output_names=["last_hidden_state"],
+                dynamic_axes=dyn, opset_version=17,
+            )
+        os.replace(tmp, onnx_path)
+        log.info("Encoder ONNX diekspor ke %s", onnx_path)
+
+
+def build_encoder(backend: str, st_model, onnx_path: Path):
+    """Bangun encoder; bila backend gagal dimuat (mis. onnxruntime tidak terpasang) → torch."""
+    backend = (backend or "torch").lower()
+    try:
+        if backend == "int8":
+            return Int8Encoder(st_model)
+        if backend == "onnx":
+            return OnnxEncoder(st_model, onnx_path)
+    except Exception as e:
+        log.warning("Encoder %s tidak tersedia (%s); pakai torch.", backend, e)
+    return TorchEncoder(st_model)
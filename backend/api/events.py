@@ -0,0 +1,103 @@
+# api/events.py
+"""
+Log event analisis persisten tanpa menambah latensi request.
+
+record() hanya menaruh event ke buffer memori (deque terbatas) lalu kembali. Thread writer
+background mem-flush buffer dengan bulk_create setiap ANALYSIS_LOG_BATCH event atau tiap
+ANALYSIS_LOG_FLUSH_S detik. Bila buffer penuh (DB lambat/terkunci) event dibuang & dihitung,
+request tidak pernah menunggu. Ringkasan harian: `manage.py analysis_rollup`.
+"""
+from __future__ import annotations
+import atexit, logging, threading
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+log = logging.getLogger(__name__)
+
+_buf: Deque = deque()
+_lock = threading.Lock()
+_wake = threading.Event()
+_writer: Optional[threading.Thread] = None
+_stats = {"recorded": 0, "dropped": 0, "flushed": 0, "flush_errors": 0, "batches": 0}
+
+
+def record(endpoint: str, result: Optional[Dict], latency_ms: float, prompt: str = "", ok: bool = True) -> None:
+    if not settings.ANALYSIS_LOG_ENABLED:
+        return
+    from .model_loader import model_status
+
+    result = result or {}
+    ev = {
+        "endpoint": endpoint,
+        "label": str(result.get("prediction") or "")[:64],
+        "confidence": result.get("confidence"),
+        "latency_ms": float(latency_ms),
+        "ok": ok,
+        "prompt": (prompt or "")[: settings.ANALYSIS_LOG_PROMPT_CHARS],
+        "model_version": model_status()["version"] or "",
+        "created_at": timezone.now(),
+    }
+    with _lock:
+        if len(_buf) >= settings.ANALYSIS_LOG_BUFFER:
+            _stats["dropped"] += 1
+            return
+        _buf.append(ev)
+        _stats["recorded"] += 1
+        full = len(_buf) >= settings.ANALYSIS_LOG_BATCH
+    _ensure_writer()
+    if full:
+        _wake.set()
+
+
+def flush() -> int:
+    """Tulis seluruh isi buffer dalam batch bulk_create. Return jumlah baris tertulis."""
+    from .models import AnalysisEvent
+
+    written = 0
+    while True:
+        with _lock:
+            batch = [_buf.popleft() for _ in range(min(len(_buf), settings.ANALYSIS_LOG_BATCH))]
+        if not batch:
+            return written
+        try:
+            AnalysisEvent.objects.bulk_create([AnalysisEvent(**ev) for ev in batch])
+        except Exception as e:
+            # event batch ini hilang; jangan diulang tanpa batas (DB bisa sedang bermasalah)
+            log.warning("Gagal menulis %d event analisis: %s", len(batch), e)
+            with _lock:
+                _stats["flush_errors"] += 1
+                _stats["dropped"] += len(batch)
+            return written
+        written += len(batch)
+        with _lock:
+            _stats["flushed"] += len(batch)
+            _stats["batches"] += 1
+
+
+def _writer_loop() -> None:
+    while True:
+        _wake.wait(settings.ANALYSIS_LOG_FLUSH_S)
+        _wake.clear()
+        close_old_connections()
+        flush()
+
+
+def _ensure_writer() -> None:
+    global _writer
+    if _writer is not None:
+        return
+    with _lock:
+        if _writer is not None:
+            return
+        _writer = threading.Thread(target=_writer_loop, name="analysis-log", daemon=True)
+        _writer.start()
+    atexit.register(flush)
+
+
+def event_stats() -> Dict:
+    with _lock:
+        return {**_stats, "buffered": len(_buf)}
@@ -0,0 +1,141 @@
+# api/infer_pool.py
+"""
+Pool proses khusus inferensi CPU (klasifikasi & embedding), terpisah dari thread request.
+
+- INFER_POOL_WORKERS > 0 mengaktifkan pool (spawn); 0 = inline seperti sebelumnya.
+- Tiap proses: torch.set_num_threads(INFER_POOL_THREADS), interop 1 thread, dan (opsional)
+  afinitas CPU ke irisan core sendiri agar proses tidak berebut core / thread intra-op.
+- Gambar dikirim lewat shared memory (array uint8 H×W×3), bukan pickle; hasil (probs/embedding)
+  kecil sehingga dikembalikan biasa.
+Thread web hanya decode + I/O; model & SentenceTransformer hanya dimuat di proses pool.
+"""
+from __future__ import annotations
+import atexit, logging, os, threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+log = logging.getLogger(__name__)
+
+_in_worker = False
+# di-set di proses pool sebelum django.setup(): ApiConfig.ready() tidak menyalakan worker job
+# (proses anak spawn mewarisi sys.argv induk, mis. gunicorn)
+WORKER_ENV = "NAILBOT_INFER_POOL_WORKER"
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return settings.INFER_POOL_WORKERS > 0 and not _in_worker
+
+
+def _threads_per_worker() -> int:
+    if settings.INFER_POOL_THREADS > 0:
+        return settings.INFER_POOL_THREADS
+    return max(1, (os.cpu_count() or 1) // settings.INFER_POOL_WORKERS)
+
+
+def _init_worker(counter, threads: int, affinity: bool, settings_module: str) -> None:
+    global _in_worker
+    _in_worker = True
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    os.environ[WORKER_ENV] = "1"
+    import django
+    django.setup()
+    import torch
+
+    with counter.get_lock():
+        idx = counter.value
+        counter.value += 1
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+    if affinity and hasattr(os, "sched_setaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+        mine = [cores[(idx * threads + i) % len(cores)] for i in range(threads)]
+        os.sched_setaffinity(0, set(mine))
+    # muat model di awal supaya request pertama tidak menanggung biaya load
+    from .model_loader import get_model_and_meta
+    get_model_and_meta()
+    log.info("Worker inferensi #%d siap (pid %d, %d thread)", idx, os.getpid(), threads)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                ctx = get_context("spawn")
+                _pool = ProcessPoolExecutor(
+                    max_workers=settings.INFER_POOL_WORKERS,
+                    mp_context=ctx,
+                    initializer=_init_worker,
+                    initargs=(
+                        ctx.Value("i", 0), _threads_per_worker(), settings.INFER_POOL_AFFINITY,
+                        os.environ.get("DJANGO_SETTINGS_MODULE", "nailbot.settings"),
+                    ),
+                )
+                atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+    return _pool
+
+
+def _discard_pool(broken: ProcessPoolExecutor) -> None:
+    """Lepas pool yang rusak (worker mati: OOM-kill, segfault) agar _get_pool membuat yang baru."""
+    global _pool
+    with _pool_lock:
+        if _pool is broken:  # thread lain mungkin sudah menggantinya
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _submit(fn, *args):
+    """Submit + tunggu hasil; bila pool rusak, buat pool baru dan ulangi sekali."""
+    pool = _get_pool()
+    try:
+        return pool.submit(fn, *args).result()
+    except BrokenProcessPool:
+        log.warning("Pool inferensi rusak (worker mati); membuat pool baru dan mengulang request.")
+        _discard_pool(pool)
+    return _get_pool().submit(fn, *args).result()
+
+
+# ===== Task di proses worker =====
+
+def _predict_task(shm_name: str, shape: Tuple[int, ...], tta) -> Tuple[Dict, Optional[bool]]:
+    from PIL import Image
+    from .inference import _predict_local
+
+    # segmen milik proses induk (yang unlink). Worker spawn memakai resource tracker yang sama
+    # dengan induk, jadi registrasi saat attach cukup dilepas oleh unlink() di induk
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        pil = Image.fromarray(np.ndarray(shape, dtype=np.uint8, buffer=shm.buf).copy(), "RGB")
+    finally:
+        shm.close()
+    return _predict_local(pil, tta)
+
+
+def _embed_task(texts: List[str]) -> np.ndarray:
+    from .rag import embed
+    return embed(texts)
+
+
+# ===== API untuk thread web =====
+
+def predict(pil_img, tta) -> Tuple[Dict, Optional[bool]]:
+    """Jalankan inference._predict_local di pool. Return (out, early_exit)."""
+    arr = np.asarray(pil_img.convert("RGB"), dtype=np.uint8)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+    try:
+        np.ndarray(arr.shape, dtype=np.uint8, buffer=shm.buf)[:] = arr
+        return _submit(_predict_task, shm.name, arr.shape, tta)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def embed(texts: List[str]) -> np.ndarray:
+    return _submit(_embed_task, list(texts))
@@ -1,47 +1,173 @@
 # api/inference.py
-import io
+import json, logging, os, threading, time
 import numpy as np
-from PIL import Image, ImageOps
-import torch
-from torchvision import transforms
-from .model_loader import get_model_and_meta
-
-def _build_tfms(img_size: int):
-    return transforms.Compose([
-        transforms.Resize((img_size, img_size)),
+from PIL import ImageOps
+from django.conf import settings
+from .model_loader import get_model_and_meta, model_status
+from . import infer_pool, shadow
+
+log = logging.getLogger(__name__)
+
+# statistik early-exit (per proses), diekspor lewat /api/metrics
+_stats = {"requests": 0, "early_exit": 0, "tta": 0}
+_stats_lock = threading.Lock()
+
+# kalibrasi (temperature + ambang) per versi model (primer & shadow): versi → dict
+_calib = {}
+
+def _build_tfms(img_size: int, resize: bool = True):
+    """resize=False: gambar sudah img_size×img_size (mis. di-downscale klien) → lewati Resize."""
+    from torchvision import transforms  # lazy: torchvision berat, hanya perlu saat inferensi
+
+    steps = [transforms.Resize((img_size, img_size))] if resize else []
+    return transforms.Compose(steps + [
         transforms.ToTensor(),
         transforms.Normalize(mean=[0.485,0.456,0.406], std=[0.229,0.224,0.225]),
     ])
 
-@torch.inference_mode()
-def predict_image(pil_img, tta=True):
+def _tfms_for(img_size: int, pil_img):
+    return _build_tfms(img_size, resize=pil_img.size != (img_size, img_size))
+
+def _forward_logits(model, x, device):
+    import torch
+
+    if device.type == "cuda":
+        with torch.amp.autocast(device_type="cuda"):
+            return model(x).float()
+    return model(x)
+
+def _softmax_np(logits, temperature: float = 1.0):
+    import torch
+
+    return torch.softmax(logits / temperature, dim=1).cpu().numpy().squeeze()
+
+def _run_probs(model, img_size, device, pil_img, tta, temperature: float = 1.0):
+    import torch
+
+    with torch.inference_mode():
+        tfms = _tfms_for(img_size, pil_img)
+        x = tfms(pil_img).unsqueeze(0).to(device, non_blocking=True)
+        probs = _softmax_np(_forward_logits(model, x, device), temperature)
+
+        if tta:
+            pil_hf = ImageOps.mirror(pil_img)
+            x_hf = tfms(pil_hf).unsqueeze(0).to(device, non_blocking=True)
+            probs_hf = _softmax_np(_forward_logits(model, x_hf, device), temperature)
+            probs = (probs + probs_hf) / 2.0
+    return probs
+
+def _run_shadow(snap, pil_img, tta):
+    """
+    Dipanggil di thread shadow: (probs, latensi ms) untuk model kandidat, dengan mode TTA yang
+    sama seperti primer; kalibrasi (temperature & ambang) milik versi shadow.
+    """
+    model, _, img_size, device, version = snap
+    t0 = time.perf_counter()
+    calib = get_calibration(version)
+    if tta == "auto":
+        probs, _ = _run_adaptive(model, img_size, device, pil_img, calib)
+    else:
+        probs = _run_probs(model, img_size, device, pil_img, tta, calib["temperature"])
+    return probs, (time.perf_counter() - t0) * 1000.0
+
+def get_calibration(version=None) -> dict:
+    """
+    Kalibrasi untuk versi model (default: model aktif) dari hasil `manage.py calibrate_model`.
+    Jika file tidak ada / untuk checkpoint lain → temperature 1 & ambang default settings.
+    """
+    if version is None:
+        version = model_status()["version"]
+    cached = _calib.get(version)
+    if cached is not None:
+        return cached
+    calib = {
+        "temperature": 1.0,
+        "exit_threshold": settings.EARLY_EXIT_THRESHOLD,
+        "exit_margin": settings.EARLY_EXIT_MARGIN,
+        "source": "default",
+    }
+    path = settings.CALIBRATION_PATH
+    if path and os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("ckpt_version") == version:
+                calib.update({k: data[k] for k in ("temperature", "exit_threshold", "exit_margin") if k in data})
+                calib["source"] = path
+            else:
+                log.warning("Kalibrasi %s untuk checkpoint %s, bukan %s; pakai default.",
+                            path, data.get("ckpt_version"), version)
+        except Exception as e:
+            log.warning("Gagal membaca kalibrasi %s: %s", path, e)
+    if len(_calib) >= 4:  # versi lama (setelah hot-reload) tidak perlu disimpan
+        _calib.clear()
+    _calib[version] = calib
+    return calib
+
+def _run_adaptive(model, img_size, device, pil_img, calib):
+    """Satu pass; TTA hanya bila max prob / margin (setelah temperature scaling) di bawah ambang."""
+    import torch
+
+    with torch.inference_mode():
+        tfms = _tfms_for(img_size, pil_img)
+        T = float(calib["temperature"])
+        x = tfms(pil_img).unsqueeze(0).to(device, non_blocking=True)
+        probs = _softmax_np(_forward_logits(model, x, device), T)
+        top2 = np.sort(probs)[-2:]
+        if top2[-1] >= calib["exit_threshold"] and (top2[-1] - top2[0]) >= calib["exit_margin"]:
+            return probs, True
+        x_hf = tfms(ImageOps.mirror(pil_img)).unsqueeze(0).to(device, non_blocking=True)
+        probs_hf = _softmax_np(_forward_logits(model, x_hf, device), T)
+    return (probs + probs_hf) / 2.0, False
+
+def _predict_local(pil_img, tta):
+    """Inferensi di proses ini. Return (out, early) — early None bila tta bukan "auto"."""
+    t0 = time.perf_counter()
     model, class_names, img_size, device = get_model_and_meta()
-    tfms = _build_tfms(img_size)
 
     # pastikan RGB
     pil_img = pil_img.convert("RGB")
-    x = tfms(pil_img).unsqueeze(0).to(device, non_blocking=True)
-    if device.type == "cuda":
-        with torch.amp.autocast(device_type="cuda"):
-            logits = model(x)
+    early = None
+    # temperature berlaku di semua mode TTA: confidence konsisten & sebanding antar mode
+    calib = get_calibration()
+    if tta == "auto":
+        probs, early = _run_adaptive(model, img_size, device, pil_img, calib)
     else:
-        logits = model(x)
-    probs = torch.softmax(logits, dim=1).cpu().numpy().squeeze()
-
-    if tta:
-        pil_hf = ImageOps.mirror(pil_img)
-        x_hf = tfms(pil_hf).unsqueeze(0).to(device, non_blocking=True)
-        if device.type == "cuda":
-            with torch.amp.autocast(device_type="cuda"):
-                logits_hf = model(x_hf)
-        else:
-            logits_hf = model(x_hf)
-        probs_hf = torch.softmax(logits_hf, dim=1).cpu().numpy().squeeze()
-        probs = (probs + probs_hf) / 2.0
+        probs = _run_probs(model, img_size, device, pil_img, tta, calib["temperature"])
 
     idx = int(np.argmax(probs))
-    return {
+    out = {
         "label": class_names[idx],
         "confidence": float(probs[idx]),
         "probs": {k: float(v) for k, v in zip(class_names, probs)}
     }
+    # A/B: sebagian request dijalankan ulang di model shadow (background, tidak menambah latensi)
+    shadow.maybe_submit(pil_img, tta, out, (time.perf_counter() - t0) * 1000.0,
+                        model_status()["version"] or "", _run_shadow)
+    return out, early
+
+def predict_image(pil_img, tta=True):
+    """
+    tta=True   → selalu 2 pass (asli + flip)
+    tta=False  → 1 pass
+    tta="auto" → early-exit terkalibrasi (lihat get_calibration)
+    Bila INFER_POOL_WORKERS > 0, dijalankan di pool proses inferensi (api/infer_pool.py).
+    """
+    if infer_pool.enabled():
+        out, early = infer_pool.predict(pil_img, tta)
+    else:
+        out, early = _predict_local(pil_img, tta)
+
+    with _stats_lock:
+        _stats["requests"] += 1
+        if early:
+            _stats["early_exit"] += 1
+        elif tta:
+            _stats["tta"] += 1
+    return out
+
+def inference_stats() -> dict:
+    with _stats_lock:
+        s = dict(_stats)
+    s["early_exit_rate"] = (s["early_exit"] / s["requests"]) if s["requests"] else 0.0
+    return s
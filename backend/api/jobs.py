@@ -0,0 +1,213 @@
+# api/jobs.py
+"""
+Antrean job /analyze berbasis tabel AnalysisJob (SQLite/DB default, tanpa broker).
+
+- enqueue(): dipanggil view; menolak (QueueFull) bila antrean penuh → backpressure
+- worker: thread in-process (ANALYZE_JOB_WORKERS) atau proses terpisah
+  via `python manage.py analyze_worker`
+- klaim job atomik lewat UPDATE bersyarat status=queued → running, dengan owner (host:pid:thread)
+- selama job berjalan worker berdetak (heartbeat_at) tiap ANALYZE_JOB_HEARTBEAT_S; hanya job
+  yang detaknya berhenti > ANALYZE_JOB_TIMEOUT_S (worker mati) yang diantrekan ulang, sehingga
+  panggilan LLM yang lambat tidak diproses dua kali. Tulisan stage/hasil disaring owner.
+- job done/error lebih tua dari ANALYZE_JOB_RETENTION_S dihapus saat sweep
+"""
+from __future__ import annotations
+import logging, os, socket, threading, time
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Q
+from django.utils import timezone
+
+from . import memwatch
+from .models import AnalysisJob
+
+log = logging.getLogger(__name__)
+
+_workers_started = False
+_workers_lock = threading.Lock()
+
+
+class QueueFull(RuntimeError):
+    pass
+
+
+def queue_depth() -> int:
+    return AnalysisJob.objects.filter(status=AnalysisJob.STATUS_QUEUED).count()
+
+
+def enqueue(img_bytes: bytes, prompt: str) -> AnalysisJob:
+    if queue_depth() >= settings.ANALYZE_QUEUE_MAX:
+        raise QueueFull("Antrean analisis penuh.")
+    job = AnalysisJob.objects.create(image=img_bytes, prompt=prompt or "")
+    ensure_inprocess_workers()
+    return job
+
+
+def _owner_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def _requeue_stale() -> int:
+    """Job 'running' yang worker-nya berhenti berdetak (mati) dikembalikan ke antrean."""
+    cutoff = timezone.now() - timedelta(seconds=settings.ANALYZE_JOB_TIMEOUT_S)
+    return AnalysisJob.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+        status=AnalysisJob.STATUS_RUNNING,
+    ).update(
+        status=AnalysisJob.STATUS_QUEUED, stage="", progress=0.0, started_at=None, owner="", heartbeat_at=None,
+    )
+
+
+def _purge_finished() -> int:
+    """Hapus job done/error yang lebih tua dari ANALYZE_JOB_RETENTION_S."""
+    cutoff = timezone.now() - timedelta(seconds=settings.ANALYZE_JOB_RETENTION_S)
+    deleted, _ = AnalysisJob.objects.filter(
+        status__in=(AnalysisJob.STATUS_DONE, AnalysisJob.STATUS_ERROR), finished_at__lt=cutoff,
+    ).delete()
+    return deleted
+
+
+def sweep() -> None:
+    _requeue_stale()
+    _purge_finished()
+
+
+def claim_next(owner: Optional[str] = None) -> Optional[AnalysisJob]:
+    owner = owner or _owner_id()
+    for pk in AnalysisJob.objects.filter(status=AnalysisJob.STATUS_QUEUED).values_list("pk", flat=True)[:5]:
+        now = timezone.now()
+        won = AnalysisJob.objects.filter(pk=pk, status=AnalysisJob.STATUS_QUEUED).update(
+            status=AnalysisJob.STATUS_RUNNING, stage="starting", started_at=now, owner=owner, heartbeat_at=now,
+        )
+        if won:
+            return AnalysisJob.objects.get(pk=pk)
+    return None
+
+
+def _mine(job: AnalysisJob):
+    """Queryset job ini selama masih dipegang worker ini (tidak diantrekan ulang / diambil worker lain)."""
+    return AnalysisJob.objects.filter(pk=job.pk, status=AnalysisJob.STATUS_RUNNING, owner=job.owner)
+
+
+@contextmanager
+def _heartbeat(job: AnalysisJob):
+    """Thread detak selama job diproses (panggilan LLM bisa lama tanpa update stage)."""
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(settings.ANALYZE_JOB_HEARTBEAT_S):
+                try:
+                    _mine(job).update(heartbeat_at=timezone.now())
+                except Exception as e:
+                    log.warning("Heartbeat job %s gagal: %s", job.pk, e)
+        finally:
+            connection.close()  # koneksi DB per thread
+
+    t = threading.Thread(target=beat, name=f"analyze-job-heartbeat-{job.pk}", daemon=True)
+    t.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        t.join(timeout=5)
+
+
+def process_job(job: AnalysisJob) -> None:
+    # impor di sini: pipeline memuat torch/LLM, tidak perlu saat hanya enqueue
+    from .pipeline import ImageDecodeError, analyze_image, decode_image
+    from . import events
+
+    def _on_stage(stage: str, progress: float) -> None:
+        _mine(job).update(stage=stage, progress=progress, heartbeat_at=timezone.now())
+
+    try:
+        pil = decode_image(bytes(job.image or b""))
+        result = analyze_image(pil, job.prompt, on_stage=_on_stage)
+    except ImageDecodeError as e:
+        _finish(job, AnalysisJob.STATUS_ERROR, error=str(e))
+    except Exception as e:
+        log.exception("Job %s gagal: %s", job.pk, e)
+        if _finish(job, AnalysisJob.STATUS_ERROR, error="Terjadi kesalahan saat analisis."):
+            events.record("job", None, _elapsed_ms(job), job.prompt, ok=False)
+    else:
+        if _finish(job, AnalysisJob.STATUS_DONE, result=result):
+            events.record("job", result, _elapsed_ms(job), job.prompt)
+
+
+def _elapsed_ms(job: AnalysisJob) -> float:
+    """Latensi job dari mulai dikerjakan worker (tanpa waktu tunggu di antrean)."""
+    start = job.started_at or job.created_at
+    return (timezone.now() - start).total_seconds() * 1000.0
+
+
+def _finish(job: AnalysisJob, status: str, result=None, error: str = "") -> bool:
+    """Tulis hasil hanya bila job masih dipegang worker ini; bila sudah diantrekan ulang, dibuang."""
+    won = _mine(job).update(
+        status=status, stage=status, progress=1.0, result=result, error=error,
+        image=None, finished_at=timezone.now(),
+    )
+    if not won:
+        log.warning("Job %s sudah tidak dipegang %s; hasil dibuang.", job.pk, job.owner)
+    return bool(won)
+
+
+def worker_loop(stop: Optional[threading.Event] = None, poll_s: float = 0.5, exit_on_memory: bool = False) -> None:
+    """exit_on_memory: keluar saat RSS > MEM_RECYCLE_RSS_MB (proses worker terpisah, di-restart supervisor)."""
+    stop = stop or threading.Event()
+    owner = _owner_id()
+    last_sweep = 0.0
+    while not stop.is_set():
+        if exit_on_memory and memwatch.should_recycle():
+            log.warning("RSS %.0f MB melewati MEM_RECYCLE_RSS_MB; worker berhenti untuk didaur ulang.", memwatch.rss_mb())
+            stop.set()
+            break
+        close_old_connections()
+        try:
+            if time.monotonic() - last_sweep > 30.0:
+                sweep()
+                last_sweep = time.monotonic()
+            job = claim_next(owner)
+        except Exception as e:
+            log.warning("Worker gagal klaim job: %s", e)
+            job = None
+        if job is None:
+            stop.wait(poll_s)
+            continue
+        try:
+            with _heartbeat(job):
+                process_job(job)
+        except Exception as e:
+            # mis. "database is locked" di _finish: thread tetap hidup, job diantrekan ulang oleh
+            # _requeue_stale setelah detaknya berhenti ANALYZE_JOB_TIMEOUT_S
+            log.exception("Worker gagal memproses job %s: %s", job.pk, e)
+
+
+def ensure_inprocess_workers() -> None:
+    """Start thread worker di proses web (sekali), bila ANALYZE_JOB_WORKERS > 0."""
+    global _workers_started
+    n = settings.ANALYZE_JOB_WORKERS
+    if n <= 0 or _workers_started:
+        return
+    with _workers_lock:
+        if _workers_started:
+            return
+        for i in range(n):
+            threading.Thread(target=worker_loop, name=f"analyze-job-{i}", daemon=True).start()
+        _workers_started = True
+
+
+def wait_for_job(job_id, timeout_s: float, poll_s: float = 0.25) -> Optional[AnalysisJob]:
+    """Long-poll: tunggu sampai job selesai atau timeout; return status terakhir."""
+    deadline = time.monotonic() + max(0.0, timeout_s)
+    while True:
+        job = AnalysisJob.objects.filter(pk=job_id).defer("image").first()
+        if job is None or job.status in (AnalysisJob.STATUS_DONE, AnalysisJob.STATUS_ERROR):
+            return job
+        if time.monotonic() >= deadline:
+            return job
+        time.sleep(poll_s)
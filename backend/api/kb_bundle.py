@@ -0,0 +1,285 @@
+# api/kb_bundle.py
+"""
+Bundle knowledge-base tunggal, berversi & ber-checksum, bisa di-mmap.
+
+Layout file (.nkb):
+  b"NAILKB01" | uint64 panjang header | header JSON (padding 64 byte) | blob array (masing2 rata 64 byte)
+
+Header berisi versi, checksum sha256 payload, model embedding, alias, label map,
+serta per koleksi: ids, metadatas, vocab BM25 & lokasi array (embeddings, teks, posting BM25).
+
+Dibangun oleh scripts/compile_kb_bundle.py. Server membaca pointer <KB_BUNDLE_DIR>/CURRENT;
+bila berubah, bundle baru dimuat & diverifikasi penuh dulu (checksum, model embedding, label map
+vs kelas model aktif), baru referensi aktif ditukar
+(satu assignment → atomik; request yang sedang jalan tetap memakai bundle lama).
+"""
+from __future__ import annotations
+import hashlib, json, logging, os, struct, threading, time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .bm25 import BM25Index
+from . import qemb
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"NAILKB01"
+_ALIGN = 64
+# model embedding query; bundle dengan model lain tidak boleh dipakai (dimensi/ruang vektor beda)
+EMB_MODEL_NAME = os.getenv("EMB_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
+
+
+def _pad(n: int) -> int:
+    return (-n) % _ALIGN
+
+
+def write_bundle(
+    path: Path,
+    collections: Dict[str, Dict],
+    aliases: Dict,
+    labels: List[str],
+    emb_model: str,
+) -> str:
+    """
+    collections[name] = {"ids", "documents", "metadatas", "embeddings"}.
+    Return versi bundle (tanggal + 12 hex sha256 payload).
+    """
+    arrays: Dict[str, np.ndarray] = {}
+    coll_meta: Dict[str, Dict] = {}
+    for name, c in collections.items():
+        docs = [d or "" for d in c["documents"]]
+        blobs = [d.encode("utf-8") for d in docs]
+        offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in blobs])
+        bm25 = BM25Index.build(c["ids"], docs)
+        emb = np.ascontiguousarray(np.asarray(c["embeddings"], dtype=np.float32))
+        codes, scale = qemb.quantize_int8(emb)
+        arrays[f"{name}.emb"] = emb
+        arrays[f"{name}.emb_i8"] = codes
+        arrays[f"{name}.emb_scale"] = scale
+        arrays[f"{name}.emb_bits"] = qemb.binarize(emb)
+        arrays[f"{name}.text_blob"] = np.frombuffer(b"".join(blobs), dtype=np.uint8)
+        arrays[f"{name}.text_off"] = offsets
+        arrays[f"{name}.bm25_indptr"] = bm25.indptr
+        arrays[f"{name}.bm25_doc_idx"] = bm25.doc_idx
+        arrays[f"{name}.bm25_tf"] = bm25.tf
+        arrays[f"{name}.bm25_doc_len"] = bm25.doc_len
+        coll_meta[name] = {
+            "ids": list(c["ids"]),
+            "metadatas": [m or {} for m in c["metadatas"]],
+            "bm25_vocab": [str(t) for t in bm25.vocab],
+        }
+
+    # payload & tabel array (offset relatif terhadap awal payload)
+    table: Dict[str, Dict] = {}
+    chunks: List[bytes] = []
+    pos = 0
+    hasher = hashlib.sha256()
+    for name, arr in arrays.items():
+        raw = arr.tobytes()
+        table[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": pos, "nbytes": len(raw)}
+        chunk = raw + b"\0" * _pad(len(raw))
+        chunks.append(chunk)
+        hasher.update(chunk)
+        pos += len(chunk)
+    digest = hasher.hexdigest()
+    version = time.strftime("%Y%m%d%H%M%S") + "-" + digest[:12]
+
+    header = {
+        "version": version,
+        "sha256": digest,
+        "emb_model": emb_model,
+        "aliases": aliases,
+        "labels": labels,
+        "collections": coll_meta,
+        "arrays": table,
+    }
+    hbytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    hbytes += b" " * _pad(len(MAGIC) + 8 + len(hbytes))
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(hbytes)))
+        f.write(hbytes)
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(tmp, path)
+    return version
+
+
+class BundleCollection:
+    """Adaptor berbentuk koleksi Chroma (query/get) di atas array bundle."""
+
+    def __init__(
+        self, name: str, meta: Dict, emb: np.ndarray, text_blob: np.ndarray, text_off: np.ndarray,
+        qindex: Optional[qemb.QuantizedIndex] = None,
+    ):
+        self.name = name
+        self.ids: List[str] = meta["ids"]
+        self.metadatas: List[Dict] = meta["metadatas"]
+        self.emb = emb
+        self.qindex = qindex
+        self._blob = text_blob
+        self._off = text_off
+        self._pos = {doc_id: i for i, doc_id in enumerate(self.ids)}
+
+    def _text(self, i: int) -> str:
+        return self._blob[self._off[i]:self._off[i + 1]].tobytes().decode("utf-8")
+
+    def query(self, query_embeddings, n_results: int = 10) -> Dict:
+        q = np.asarray(query_embeddings[0], dtype=np.float32)
+        n = len(self.ids)
+        if n == 0:
+            return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+        k = min(n_results, n)
+        if self.qindex is not None and qemb.SEARCH_MODE != "off":
+            # dua tahap: kandidat dari kode int8/biner, rescoring float32 hanya untuk kandidat
+            top, top_sims = self.qindex.search(q, k, qemb.SEARCH_MODE, qemb.RESCORE_FACTOR)
+            sims = dict(zip(top.tolist(), top_sims.tolist()))
+        else:
+            sims = self.emb @ q
+            top = np.argpartition(-sims, k - 1)[:k]
+            top = top[np.argsort(-sims[top])]
+        return {
+            "ids": [[self.ids[i] for i in top]],
+            "documents": [[self._text(i) for i in top]],
+            "metadatas": [[self.metadatas[i] for i in top]],
+            # setara squared-L2 (default Chroma) untuk vektor ternormalisasi
+            "distances": [[float(2.0 - 2.0 * sims[i]) for i in top]],
+        }
+
+    def get(self, ids: List[str]) -> Dict:
+        idx = [self._pos[d] for d in ids if d in self._pos]
+        return {
+            "ids": [self.ids[i] for i in idx],
+            "documents": [self._text(i) for i in idx],
+            "metadatas": [self.metadatas[i] for i in idx],
+        }
+
+
+class KBBundle:
+    def __init__(self, path: Path, verify: bool = True, emb_model: Optional[str] = EMB_MODEL_NAME):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"Bukan bundle KB: {self.path}")
+            (hlen,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(hlen).decode("utf-8"))
+        base = len(MAGIC) + 8 + hlen
+        self.header = header
+        self.version: str = header["version"]
+        self.aliases: Dict = header.get("aliases") or {}
+        self.labels: List[str] = header.get("labels") or []
+        self.emb_model: str = header.get("emb_model", "")
+        if emb_model and self.emb_model != emb_model:
+            raise ValueError(f"Bundle {self.path} dibangun dengan model embedding "
+                             f"{self.emb_model or '?'}, server memakai {emb_model}")
+
+        payload = np.memmap(self.path, dtype=np.uint8, mode="r", offset=base)
+        if verify:
+            if hashlib.sha256(payload).hexdigest() != header["sha256"]:
+                raise ValueError(f"Checksum bundle tidak cocok: {self.path}")
+
+        def _arr(name: str) -> np.ndarray:
+            spec = header["arrays"][name]
+            raw = payload[spec["offset"]:spec["offset"] + spec["nbytes"]]
+            return raw.view(np.dtype(spec["dtype"])).reshape(spec["shape"])
+
+        self.collections: Dict[str, BundleCollection] = {}
+        self.bm25: Dict[str, BM25Index] = {}
+        for name, meta in header["collections"].items():
+            emb = _arr(f"{name}.emb")
+            qindex = None
+            if f"{name}.emb_i8" in header["arrays"]:  # bundle lama tidak punya kode terkuantisasi
+                qindex = qemb.QuantizedIndex(
+                    np.asarray(meta["ids"], dtype=str), emb,
+                    _arr(f"{name}.emb_i8"), _arr(f"{name}.emb_scale"), _arr(f"{name}.emb_bits"),
+                )
+            self.collections[name] = BundleCollection(
+                name, meta, emb, _arr(f"{name}.text_blob"), _arr(f"{name}.text_off"), qindex,
+            )
+            self.bm25[name] = BM25Index(
+                ids=np.asarray(meta["ids"], dtype=str),
+                vocab=np.asarray(meta["bm25_vocab"], dtype=str),
+                indptr=_arr(f"{name}.bm25_indptr"),
+                doc_idx=_arr(f"{name}.bm25_doc_idx"),
+                tf=_arr(f"{name}.bm25_tf"),
+                doc_len=_arr(f"{name}.bm25_doc_len"),
+            )
+
+
+# ===== Bundle aktif + hot-swap =====
+BUNDLE_DIR = Path(os.getenv("KB_BUNDLE_DIR", str(Path(__file__).resolve().parents[1] / "kb_bundles")))
+POLL_S = float(os.getenv("KB_BUNDLE_POLL_S", "2"))
+
+_active: Optional[KBBundle] = None
+_pointer_sig: Optional[tuple] = None
+_last_check = 0.0
+_swap_lock = threading.Lock()
+
+
+def pointer_path() -> Path:
+    return BUNDLE_DIR / "CURRENT"
+
+
+def publish(bundle_path: Path) -> None:
+    """Arahkan CURRENT ke bundle baru secara atomik (tmp + rename)."""
+    ptr = pointer_path()
+    tmp = ptr.with_name("CURRENT.tmp")
+    tmp.write_text(Path(bundle_path).name, encoding="utf-8")
+    os.replace(tmp, ptr)
+
+
+def _check_labels(bundle: KBBundle) -> None:
+    """Label map bundle harus sama dengan kelas model aktif (prefer_label retrieval memakai nama kelas)."""
+    from .model_loader import loaded_class_names
+
+    names = loaded_class_names()
+    if not bundle.labels or names is None:  # bundle tanpa label / model belum dimuat → tidak bisa dicek
+        return
+    if set(bundle.labels) != set(names):
+        missing, extra = sorted(set(names) - set(bundle.labels)), sorted(set(bundle.labels) - set(names))
+        raise ValueError(f"Label bundle {bundle.version} tidak cocok dengan model aktif "
+                         f"(tidak ada: {missing}, tambahan: {extra})")
+
+
+def active_bundle() -> Optional[KBBundle]:
+    """
+    Bundle aktif (None bila belum ada CURRENT → pakai Chroma/BM25 lama).
+    Pointer dicek paling sering tiap KB_BUNDLE_POLL_S detik.
+    """
+    global _active, _pointer_sig, _last_check
+    now = time.monotonic()
+    if now - _last_check < POLL_S:
+        return _active
+    with _swap_lock:
+        if now - _last_check < POLL_S:
+            return _active
+        _last_check = now
+        ptr = pointer_path()
+        try:
+            st = ptr.stat()
+            sig = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return _active
+        if sig == _pointer_sig:
+            return _active
+        try:
+            target = BUNDLE_DIR / ptr.read_text(encoding="utf-8").strip()
+            bundle = KBBundle(target)  # muat + verifikasi penuh sebelum swap
+            _check_labels(bundle)
+        except Exception as e:
+            log.error("Gagal memuat bundle KB baru (tetap pakai %s): %s",
+                      _active.version if _active else "index lama", e)
+            _pointer_sig = sig  # jangan coba ulang pointer rusak yang sama terus-menerus
+            return _active
+        prev = _active.version if _active else None
+        _active = bundle
+        _pointer_sig = sig
+        log.info("Bundle KB aktif: %s (sebelumnya %s)", bundle.version, prev)
+        return _active
@@ -1,4 +1,18 @@
 # api/llm/__init__.py
-from .llm import explain_prediction
+from .llm import (
+    explain_followup_turn,
+    explain_prediction,
+    get_followup,
+    llm_call_stats,
+    prefix_cache_stats,
+    semantic_cache_stats,
+)
 
-__all__ = ["explain_prediction"]
+__all__ = [
+    "explain_followup_turn",
+    "explain_prediction",
+    "get_followup",
+    "llm_call_stats",
+    "prefix_cache_stats",
+    "semantic_cache_stats",
+]
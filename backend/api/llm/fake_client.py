@@ -0,0 +1,92 @@
+# api/llm/fake_client.py
+"""
+Klien Gemini palsu untuk dev/test offline (LLM_BACKEND=fake).
+
+Meniru permukaan google-genai yang dipakai aplikasi:
+  - client.models.generate_content(model=..., contents=..., config=...)
+  - client.caches.create(model=..., config=...) / client.caches.delete(name=...)
+Latensi & kegagalan bisa diatur via ENV agar jalur timeout/fallback bisa diuji.
+"""
+from __future__ import annotations
+import json, os, re, threading, time, uuid
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+FAKE_DELAY_MS = float(os.getenv("LLM_FAKE_DELAY_MS", "0"))
+FAKE_FAIL_RATE = float(os.getenv("LLM_FAKE_FAIL_RATE", "0"))
+
+# cached content dibagikan lintas instance (seperti sisi provider)
+_caches: Dict[str, str] = {}
+_lock = threading.Lock()
+_calls = 0
+
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text or "") // 4)
+
+
+def _contents_text(contents) -> str:
+    if isinstance(contents, str):
+        return contents
+    buf = []
+    for c in contents or []:
+        for p in (c.get("parts") or []):
+            buf.append(p.get("text") or "")
+    return "\n".join(buf)
+
+
+class _FakeModels:
+    def generate_content(self, model: str, contents, config: Optional[dict] = None):
+        global _calls
+        config = config or {}
+        with _lock:
+            _calls += 1
+            n = _calls
+        if FAKE_DELAY_MS:
+            time.sleep(FAKE_DELAY_MS / 1000.0)
+        if FAKE_FAIL_RATE and (n % max(1, round(1 / FAKE_FAIL_RATE))) == 0:
+            raise RuntimeError("fake provider error")
+
+        text = _contents_text(contents)
+        cached = ""
+        if config.get("cached_content"):
+            cached = _caches.get(config["cached_content"], "")
+            if not cached:
+                raise RuntimeError(f"cached content not found: {config['cached_content']}")
+        system = config.get("system_instruction") or ""
+
+        m = re.search(r"=== USER ===\n(\{.*?\})\n", text, flags=re.S)
+        user = json.loads(m.group(1)) if m else {}
+        label = user.get("label", "-")
+        body = (
+            "# Penjelasan\n\n"
+            "## Ringkasan\n(fake) Ini bukan diagnosis.\n\n"
+            "## Hasil Prediksi\n"
+            f"- **Label:** *{label}*\n- **Keyakinan model:** **{user.get('confidence_str', '-')}**\n\n"
+            "## Disclaimer\nInformasi ini edukasi umum dan bukan diagnosis medis.\n"
+        )
+        usage = SimpleNamespace(
+            prompt_token_count=_approx_tokens(cached or system) + _approx_tokens(text),
+            cached_content_token_count=_approx_tokens(cached) if cached else 0,
+            candidates_token_count=_approx_tokens(body),
+        )
+        return SimpleNamespace(text=body, usage_metadata=usage)
+
+
+class _FakeCaches:
+    def create(self, model: str, config: Optional[dict] = None):
+        config = config or {}
+        name = f"cachedContents/fake-{uuid.uuid4().hex[:12]}"
+        with _lock:
+            _caches[name] = config.get("system_instruction") or ""
+        return SimpleNamespace(name=name, model=model)
+
+    def delete(self, name: str):
+        with _lock:
+            _caches.pop(name, None)
+
+
+class FakeGenaiClient:
+    def __init__(self, *args, **kwargs):
+        self.models = _FakeModels()
+        self.caches = _FakeCaches()
@@ -1,12 +1,13 @@
 # api/llm/llm.py
 from __future__ import annotations
-import os, json, logging
+import os, json, logging, re, time
 from typing import List, Dict, Tuple, Optional
 from django.conf import settings
 
-from ..rag import retrieve_multi_smart  # naik satu level krn sekarang di dalam paket api/llm/
+from ..rag import retrieve_multi_smart, embed, index_version  # naik satu level krn sekarang di dalam paket api/llm/
 
 from .llm_utils import (
+    CONTEXT_TOKEN_BUDGET,
     _extract_text_safe,
     _client,
     _format_context_dual,
@@ -16,18 +17,190 @@ from .llm_utils import (
     _normalize_sections,
     _is_nail_domain,        # <— NEW: deteksi relevansi domain kuku
 )
-from .prompts import SYSTEM_PROMPT
+from .prompts import STATIC_PREFIX, MISMATCH_RULES, FOLLOWUP_PREFIX
+from .prefix_cache import PrefixCache
+from .semantic_cache import SemanticCache
+from ..singleflight import SingleFlight, make_key
+from .resilience import CircuitBreaker, CircuitOpen, FollowupRegistry, LLMBudgetExceeded, ResilientCaller
 
 log = logging.getLogger(__name__)
 
-def explain_prediction(pred_label: str, conf: float, probs: dict, user_prompt: str) -> str:
+# Satu registrasi prefix per proses
+_prefix_cache = PrefixCache(
+    STATIC_PREFIX,
+    ttl_s=settings.GEMINI_PREFIX_CACHE_TTL,
+    enabled=settings.GEMINI_PREFIX_CACHE,
+)
+_followup_prefix_cache = PrefixCache(
+    FOLLOWUP_PREFIX,
+    ttl_s=settings.GEMINI_PREFIX_CACHE_TTL,
+    enabled=settings.GEMINI_PREFIX_CACHE,
+)
+
+def prefix_cache_stats() -> Dict:
+    """Statistik hit/miss prefix cache (untuk endpoint metrik/monitoring)."""
+    return {**_prefix_cache.snapshot(), "followup": _followup_prefix_cache.snapshot()}
+
+_semantic_cache = SemanticCache(
+    embed,
+    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+    ttl_s=settings.SEMANTIC_CACHE_TTL,
+    max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+)
+
+# Entri cache semantik berlaku untuk satu bucket confidence (10 poin); persentase milik request
+# asal diganti slot dan dirender ulang dengan confidence request yang kena hit.
+_CONF_SLOT = "\u27e6CONF\u27e7"
+_CONF_LINE = re.compile(r"(\*\*Keyakinan model:\*\*[ \t]*)\S[^\n]*")
+
+def _conf_template(text: str, conf: float) -> str:
+    text = _CONF_LINE.sub(lambda m: m.group(1) + f"**{_CONF_SLOT}**", text)
+    for literal in {_percent_id(conf), f"{conf * 100:.1f}%"}:
+        text = text.replace(literal, _CONF_SLOT)
+    return text
+
+def _render_conf(template: str, conf: float) -> str:
+    return template.replace(_CONF_SLOT, _percent_id(conf))
+
+def semantic_cache_stats() -> Dict:
+    """Statistik cache semantik: hit rate & latensi yang dihemat (ms)."""
+    return _semantic_cache.snapshot()
+
+_resilient = ResilientCaller(
+    budget_ms=settings.LLM_LATENCY_BUDGET_MS,
+    hedge=settings.LLM_HEDGE,
+    hedge_min_samples=settings.LLM_HEDGE_MIN_SAMPLES,
+    breaker=CircuitBreaker(settings.LLM_BREAKER_FAILURES, settings.LLM_BREAKER_RESET_S),
+    max_workers=settings.LLM_MAX_WORKERS,
+)
+_followups = FollowupRegistry()
+# panggilan Gemini identik yang bersamaan (prompt final sama) → satu panggilan upstream
+_llm_flight = SingleFlight("llm")
+
+def llm_call_stats() -> Dict:
+    """Statistik panggilan LLM: timeout, hedging, status circuit breaker, p95."""
+    return _resilient.snapshot()
+
+def get_followup(handle: str) -> Optional[Dict]:
+    """Status jawaban LLM terlambat: {status: pending|done|error, explanation_md}."""
+    return _followups.get(handle)
+
+def _cache_version() -> str:
+    # jawaban dianggap basi bila index RAG atau prefix prompt berubah
+    return f"{index_version()}#{_prefix_cache.digest}"
+
+def _build_dynamic_suffix(context_md: str, user_struct: Dict, intent: str, on_domain: bool) -> str:
+    """Bagian prompt yang berubah per request: konteks, JSON user, intent & aturan mismatch."""
+    return (
+        "=== KONTEN ===\n" + context_md
+        + "\n\n=== USER ===\n" + json.dumps(user_struct, ensure_ascii=False)
+        + "\n\n=== INTENT TERDETEKSI ===\n"
+        f"- intent: {intent}\n"
+        + ("\n=== ATURAN MISMATCH ===\n" + MISMATCH_RULES if not on_domain else "")
+        + "\n# KELUARKAN HASIL SESUAI TEMPLATE DI ATAS"
+    )
+
+def _local_fallback(
+    pred_label: str, conf: float, user_prompt: str, on_domain: bool, ref_list: List[str], context_md: str
+) -> str:
+    """Penjelasan templat deterministik (tanpa LLM / LLM lambat / circuit open)."""
+    mismatch_note = ""
+    if not on_domain and user_prompt:
+        mismatch_note = ("Catatan: prompt yang Anda masukkan tampaknya tidak terkait dengan domain kuku; "
+                         "jawaban berikut difokuskan pada hasil analisis kuku. ")
+
+    parts: List[str] = []
+    parts.append("# Penjelasan\n")
+    parts.append("## Ringkasan\n"
+                 + mismatch_note
+                 + "Berdasarkan analisis citra, hasil mengarah ke kategori yang sesuai dengan temuan visual. "
+                 "Ini **bukan diagnosis**; konteks klinis tetap diperlukan.")
+    parts.append("## Hasil Prediksi\n"
+                 f"- **Label:** *{pred_label}*\n"
+                 f"- **Keyakinan model:** **{_percent_id(conf)}**\n"
+                 "- **Deskripsi singkat:** (lihat ringkasan dari konteks).")
+    parts.append("## Mengapa Model Memperkirakan Ini\n"
+                 "- Pola visual konsisten dengan karakteristik pada konteks.\n- Lihat butir pada referensi lokal/ilmiah.")
+    parts.append("## Catatan Kemungkinan Terkait (*bukan diagnosis*)\n"
+                 "- Kemungkinan bervariasi; rujuk literatur terkait bila tersedia.")
+    parts.append("## Saran Pemantauan & Perawatan Umum\n"
+                 "- Dokumentasikan dengan foto berkala.\n- Jaga kebersihan, hindari trauma.\n- Konsultasi jika perubahan menetap/berkembang.")
+    parts.append("## Disclaimer\n"
+                 "Informasi ini untuk edukasi umum dan **bukan** diagnosis medis; penilaian tenaga kesehatan tetap diperlukan.")
+    if ref_list:
+        parts.append("## Sumber\n" + "\n".join(f"- {r}" for r in ref_list))
+    parts.append("\n---\n**Konteks (ringkas):**\n" + context_md)
+    return _normalize_sections("\n\n".join(parts))
+
+def _finalize_llm_text(
+    resp, pred_label: str, conf: float, user_prompt: str, on_domain: bool, ref_list: List[str]
+) -> Tuple[str, bool]:
+    """Respons Gemini → markdown final (+ Sumber). Return (markdown, True bila teks asli LLM)."""
+    text = (_extract_text_safe(resp) or "").strip()
+    llm_ok = bool(text)
+    if not text:
+        log.warning("Gemini return empty text; using fallback minimal.")
+        mismatch_note = ""
+        if not on_domain and user_prompt:
+            mismatch_note = ("Catatan: prompt yang Anda masukkan tampaknya tidak terkait dengan domain kuku; "
+                             "jawaban berikut difokuskan pada hasil analisis kuku.\n\n")
+
+        text = (
+            "# Penjelasan\n\n"
+            "## Ringkasan\n" + mismatch_note +
+            "Tidak ada respons dari model. Ini bukan diagnosis.\n\n"
+            "## Hasil Prediksi\n"
+            f"- **Label:** *{pred_label}*\n- **Keyakinan model:** **{_percent_id(conf)}**\n"
+            "- **Deskripsi singkat:** (tidak tersedia)\n\n"
+            "## Mengapa Model Memperkirakan Ini\n(tidak tersedia)\n\n"
+            "## Catatan Kemungkinan Terkait (*bukan diagnosis*)\n(tidak tersedia)\n\n"
+            "## Saran Pemantauan & Perawatan Umum\n"
+            "- Dokumentasikan perubahan, jaga kebersihan, konsultasi bila perlu.\n\n"
+            "## Disclaimer\nInformasi ini edukasi umum dan bukan diagnosis medis.\n"
+        )
+    if ref_list:
+        if "## Sumber" not in text:
+            text = text.rstrip() + "\n\n## Sumber\n"
+        text = text.rstrip() + "\n" + "\n".join(f"- {r}" for r in ref_list)
+    return _normalize_sections(text), llm_ok
+
+def explain_prediction(
+    pred_label: str,
+    conf: float,
+    probs: dict,
+    user_prompt: str,
+    followup: Optional[Dict] = None,
+    trace: Optional[Dict] = None,
+) -> str:
     """
     Penjelasan berbasis RAG (lokal + literatur akademik) + Gemini.
     - Struktur output FIX (heading markdown).
     - Sitasi [Lx]/[Sx] sesuai konteks yang disediakan retriever.
     - Ambang ketidakpastian: 0.70 (ditekankan di Ringkasan & Saran bila < 0.70).
     - Deteksi relevansi prompt: jika di luar domain kuku → beri catatan mismatch di Ringkasan & abaikan bagian tak relevan.
+    - Anggaran latensi LLM: bila lewat, kembalikan fallback templat; jika `followup` (dict) diberikan,
+      followup["handle"] diisi untuk mengambil jawaban LLM yang datang terlambat (lihat get_followup).
+    - trace (dict, opsional): diisi "selected" (passage terpilih + tag) & "refs" untuk percakapan lanjutan.
     """
+    t_start = time.perf_counter()
+    intent = _detect_intent(user_prompt or "")
+
+    # 0) Cache semantik: pertanyaan serupa untuk label & bucket confidence yang sama
+    cache_key = cache_version = None
+    if settings.SEMANTIC_CACHE_ENABLED:
+        try:
+            cache_version = _cache_version()
+            cache_key = _semantic_cache.make_key(pred_label, conf, intent, user_prompt or "")
+            cached = _semantic_cache.get(cache_key, cache_version)
+            if cached is not None:
+                if trace is not None:  # percakapan lanjutan butuh tag [Lx]/[Sx] yang sudah terpakai
+                    trace["selected"] = [dict(x) for x in cached.get("selected", [])]
+                    trace["refs"] = list(cached.get("refs", []))
+                return _render_conf(cached["md"], conf)
+        except Exception as e:
+            log.warning("Semantic cache lookup gagal: %s", e)
+            cache_key = None
+
     # 1) Retrieval
     base_query = (user_prompt or "Jelaskan secara non-diagnostik") + f" | label: {pred_label}"
     passages = retrieve_multi_smart(
@@ -37,7 +210,11 @@ def explain_prediction(pred_label: str, conf: float, probs: dict, user_prompt: s
         k_sch_each=3,
         max_total=8,
     )
-    context_md, ref_list = _format_context_dual(passages, max_chars=3600)
+    selected: List[Dict] = []
+    context_md, ref_list = _format_context_dual(passages, selected=selected)
+    if trace is not None:
+        trace["selected"] = selected
+        trace["refs"] = ref_list
 
     # 2) Build prompt → user payload
     top_probs = sorted(
@@ -58,105 +235,41 @@ def explain_prediction(pred_label: str, conf: float, probs: dict, user_prompt: s
         "prompt_on_domain": bool(on_domain),  # info ke LLM
     }
 
-    intent = _detect_intent(user_prompt or "")
-
-    # Aturan tambahan untuk mismatch/out-of-domain
-    mismatch_rules = (
-        "- PROMPT PENGGUNA TERDETEKSI TIDAK RELEVAN DENGAN DOMAIN KUKU.\n"
-        "- Tambahkan SATU kalimat di bagian **Ringkasan** yang menyatakan ketidak-sesuaian prompt "
-        "dan bahwa jawaban difokuskan pada hasil analisis kuku.\n"
-        "- Abaikan bagian prompt yang tidak relevan di seksi-seksi berikutnya.\n"
-    ) if not on_domain else ""
-
-    rules = (
-        "- Ikuti JUDUL & URUTAN seksi persis seperti di templat.\n"
-        "- Gunakan Bahasa Indonesia yang padat & empatik.\n"
-        "- Jika confidence < 0.70, tekankan ketidakpastian di Ringkasan & Saran.\n"
-        "- Wajib gunakan konteks [L]/[S]; jika info tidak tersedia, nyatakan tidak ada di konteks.\n"
-        "- Hindari diagnosis atau instruksi medis definitif.\n"
-        "- Maksimum 3–5 kalimat per seksi, kecuali '## Sumber'.\n"
-    ) + ("\n" + mismatch_rules if mismatch_rules else "")
-
-    final_prompt = (
-        SYSTEM_PROMPT.strip()
-        + "\n\n=== KONTEN ===\n" + context_md
-        + "\n\n=== USER ===\n" + json.dumps(user_struct, ensure_ascii=False)
-        + "\n\n=== INTENT TERDETEKSI ===\n"
-          f"- intent: {intent}\n"
-          "- Jika intent=danger: tekankan risiko & red flags dari KONTEN.\n"
-          "- Jika intent=care: fokus pada perawatan non-diagnostik & kapan perlu evaluasi tenaga kesehatan.\n"
-          "- Jika intent=cause: paparkan kemungkinan penyebab umum, non-diagnostik.\n"
-          "- Jika intent=diagnosis_request: tekankan ini bukan diagnosis; jelaskan apa yang model lihat.\n"
-        + "\n=== ATURAN TAMBAHAN ===\n" + rules
-        + "\n\n# KELUARKAN HASIL SESUAI TEMPLATE DI ATAS"
-    )
+    # Hanya bagian dinamis; prefix statis (SYSTEM_PROMPT + intent + aturan) dikirim via cache
+    final_prompt = _build_dynamic_suffix(context_md, user_struct, intent, on_domain)
 
     # 3) Panggil Gemini
     model_name = (settings.GEMINI_MODEL or os.getenv("GEMINI_MODEL") or "gemini-2.5-flash").strip()
     cli = _client()
     if cli is None:
-        # Fallback lokal dengan catatan mismatch bila perlu
-        mismatch_note = ""
-        if not on_domain and user_prompt:
-            mismatch_note = ("Catatan: prompt yang Anda masukkan tampaknya tidak terkait dengan domain kuku; "
-                             "jawaban berikut difokuskan pada hasil analisis kuku. ")
+        return _local_fallback(pred_label, conf, user_prompt, on_domain, ref_list, context_md)
 
-        parts: List[str] = []
-        parts.append("# Penjelasan\n")
-        parts.append("## Ringkasan\n"
-                     + mismatch_note
-                     + "Berdasarkan analisis citra, hasil mengarah ke kategori yang sesuai dengan temuan visual. "
-                     "Ini **bukan diagnosis**; konteks klinis tetap diperlukan.")
-        parts.append("## Hasil Prediksi\n"
-                     f"- **Label:** *{pred_label}*\n"
-                     f"- **Keyakinan model:** **{_percent_id(conf)}**\n"
-                     "- **Deskripsi singkat:** (lihat ringkasan dari konteks).")
-        parts.append("## Mengapa Model Memperkirakan Ini\n"
-                     "- Pola visual konsisten dengan karakteristik pada konteks.\n- Lihat butir pada referensi lokal/ilmiah.")
-        parts.append("## Catatan Kemungkinan Terkait (*bukan diagnosis*)\n"
-                     "- Kemungkinan bervariasi; rujuk literatur terkait bila tersedia.")
-        parts.append("## Saran Pemantauan & Perawatan Umum\n"
-                     "- Dokumentasikan dengan foto berkala.\n- Jaga kebersihan, hindari trauma.\n- Konsultasi jika perubahan menetap/berkembang.")
-        parts.append("## Disclaimer\n"
-                     "Informasi ini untuk edukasi umum dan **bukan** diagnosis medis; penilaian tenaga kesehatan tetap diperlukan.")
-        if ref_list:
-            parts.append("## Sumber\n" + "\n".join(f"- {r}" for r in ref_list))
-        parts.append("\n---\n**Konteks (ringkas):**\n" + context_md)
-        return _normalize_sections("\n\n".join(parts))
+    def _finalize(resp) -> str:
+        text, llm_ok = _finalize_llm_text(resp, pred_label, conf, user_prompt, on_domain, ref_list)
+        if cache_key is not None and llm_ok:
+            # hanya jawaban asli LLM yang disimpan, bukan fallback
+            entry = {"md": _conf_template(text, conf), "selected": selected, "refs": ref_list}
+            _semantic_cache.put(cache_key, entry, cache_version, (time.perf_counter() - t_start) * 1000.0)
+        return text
 
     try:
-        resp = cli.models.generate_content(
-            model=model_name,
-            contents=[{"role": "user", "parts": [{"text": final_prompt}]}],
-            config={"response_mime_type": "text/plain"},
-        )
-        text = (_extract_text_safe(resp) or "").strip()
-        if not text:
-            log.warning("Gemini return empty text; using fallback minimal.")
-            mismatch_note = ""
-            if not on_domain and user_prompt:
-                mismatch_note = ("Catatan: prompt yang Anda masukkan tampaknya tidak terkait dengan domain kuku; "
-                                 "jawaban berikut difokuskan pada hasil analisis kuku.\n\n")
-
-            text = (
-                "# Penjelasan\n\n"
-                "## Ringkasan\n" + mismatch_note +
-                "Tidak ada respons dari model. Ini bukan diagnosis.\n\n"
-                "## Hasil Prediksi\n"
-                f"- **Label:** *{pred_label}*\n- **Keyakinan model:** **{_percent_id(conf)}**\n"
-                "- **Deskripsi singkat:** (tidak tersedia)\n\n"
-                "## Mengapa Model Memperkirakan Ini\n(tidak tersedia)\n\n"
-                "## Catatan Kemungkinan Terkait (*bukan diagnosis*)\n(tidak tersedia)\n\n"
-                "## Saran Pemantauan & Perawatan Umum\n"
-                "- Dokumentasikan perubahan, jaga kebersihan, konsultasi bila perlu.\n\n"
-                "## Disclaimer\nInformasi ini edukasi umum dan bukan diagnosis medis.\n"
-            )
-        if ref_list:
-            if "## Sumber" not in text:
-                text = text.rstrip() + "\n\n## Sumber\n"
-            text = text.rstrip() + "\n" + "\n".join(f"- {r}" for r in ref_list)
+        flight_key = make_key(model_name, _prefix_cache.digest, final_prompt)
+        resp = _llm_flight.do(flight_key, lambda: _resilient.call(lambda: _prefix_cache.generate(
+            cli, model_name, final_prompt, config={"response_mime_type": "text/plain"},
+        )))
+        return _finalize(resp)
+
+    except CircuitOpen:
+        log.warning("LLM circuit breaker open; using deterministic fallback.")
+        return _local_fallback(pred_label, conf, user_prompt, on_domain, ref_list, context_md)
 
-        return _normalize_sections(text)
+    except LLMBudgetExceeded as e:
+        log.warning("LLM melewati anggaran %.0f ms; using deterministic fallback.", settings.LLM_LATENCY_BUDGET_MS)
+        # jawaban yang datang terlambat tetap diproses → cache semantik + handle follow-up
+        handle = _followups.register(e.future, _finalize)
+        if followup is not None:
+            followup["handle"] = handle
+        return _local_fallback(pred_label, conf, user_prompt, on_domain, ref_list, context_md)
 
     except Exception as e:
         log.exception("Gemini generate_content error: %s", e)
@@ -182,3 +295,76 @@ def explain_prediction(pred_label: str, conf: float, probs: dict, user_prompt: s
             fb += "\n## Sumber\n" + "\n".join(f"- {r}" for r in ref_list)
         fb += "\n\n---\n**Konteks (ringkas):**\n" + context_md
         return _normalize_sections(fb)
+
+def explain_followup_turn(
+    pred_label: str,
+    conf: float,
+    question: str,
+    history: List[Tuple[str, str]],
+    seen_ids: set,
+    l_start: int,
+    s_start: int,
+) -> Tuple[str, List[Dict], List[str]]:
+    """
+    Satu giliran lanjutan percakapan: retrieve untuk pertanyaan baru, buang passage
+    yang sudah pernah dikirim (seen_ids berisi (bucket, id)), lalu kirim hanya
+    KONTEN BARU + riwayat ringkas + pertanyaan.
+    Return (jawaban markdown, passage baru terpilih, referensi baru).
+    """
+    base_query = (question or "") + f" | label: {pred_label}"
+    passages = retrieve_multi_smart(
+        prompt=base_query,
+        prefer_label=pred_label,
+        k_local_each=2,
+        k_sch_each=3,
+        max_total=8,
+    )
+    fresh = [p for p in passages if (p.get("bucket") or "L", p.get("id") or "") not in seen_ids]
+    selected: List[Dict] = []
+    context_md, ref_list = _format_context_dual(
+        fresh, max_tokens=max(200, CONTEXT_TOKEN_BUDGET // 2),
+        l_start=l_start, s_start=s_start, selected=selected,
+    )
+    if not selected:
+        context_md = "(tidak ada konten baru; gunakan riwayat)"
+
+    on_domain = _is_nail_domain(question, [pred_label])
+    user_struct = {
+        "label": pred_label,
+        "confidence_str": _percent_id(conf),
+        "question": question or "",
+        "prompt_on_domain": bool(on_domain),
+    }
+    hist_md = "\n".join(f"- T: {q}\n  J: {a}" for q, a in history) or "(kosong)"
+    suffix = (
+        "=== RIWAYAT RINGKAS ===\n" + hist_md
+        + "\n\n=== KONTEN BARU ===\n" + context_md
+        + "\n\n=== USER ===\n" + json.dumps(user_struct, ensure_ascii=False)
+        + "\n\n=== INTENT TERDETEKSI ===\n"
+        f"- intent: {_detect_intent(question or '')}\n"
+    )
+
+    def _fallback() -> str:
+        note = "Penjelasan lengkap tidak tersedia saat ini. Ini bukan diagnosis."
+        if selected:
+            note += "\n\n**Konteks terkait:**\n" + context_md
+        return note
+
+    model_name = (settings.GEMINI_MODEL or os.getenv("GEMINI_MODEL") or "gemini-2.5-flash").strip()
+    cli = _client()
+    if cli is None:
+        return _fallback(), selected, ref_list
+    try:
+        resp = _resilient.call(lambda: _followup_prefix_cache.generate(
+            cli, model_name, suffix, config={"response_mime_type": "text/plain"},
+        ))
+        text = (_extract_text_safe(resp) or "").strip() or _fallback()
+    except LLMBudgetExceeded:
+        log.warning("LLM follow-up melewati anggaran; using fallback.")
+        text = _fallback()
+    except Exception as e:
+        log.warning("LLM follow-up error: %s", e)
+        text = _fallback()
+    if ref_list:
+        text = text.rstrip() + "\n\n**Sumber baru:**\n" + "\n".join(f"- {r}" for r in ref_list)
+    return text, selected, ref_list
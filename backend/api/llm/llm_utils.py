@@ -1,9 +1,9 @@
 # api/llm/llm_utils.py
 from __future__ import annotations
-import os, logging
+import os, re, logging
+from functools import lru_cache
 from typing import List, Dict, Tuple, Optional
 from django.conf import settings
-from google import genai  # pip install google-genai
 
 log = logging.getLogger(__name__)
 
@@ -29,42 +29,95 @@ def _extract_text_safe(resp) -> str:
     return ""
 
 def _client():
+    if (settings.LLM_BACKEND or "").lower() == "fake":
+        from .fake_client import FakeGenaiClient
+        return FakeGenaiClient()
     api_key = settings.GEMINI_API_KEY or os.getenv("GEMINI_API_KEY")
     if not api_key:
         return None
+    return _genai_client(api_key)
+
+@lru_cache(maxsize=4)
+def _genai_client(api_key: str):
+    # satu Client per API key per proses (dulu dibuat per panggilan → pool HTTP menumpuk di RSS)
+    from google import genai  # pip install google-genai (diimpor lazy: berat saat startup)
     return genai.Client(api_key=api_key)
 
-def _format_context_dual(passages: List[Dict], max_chars: int = 3600) -> Tuple[str, List[str]]:
+# Anggaran konteks dalam token (≈ 4 karakter/token; 900 ≈ max_chars lama 3600)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKENS", "900"))
+SCHOLAR_PASSAGE_TOKENS = int(os.getenv("RAG_SCHOLAR_PASSAGE_TOKENS", "300"))
+
+_SENT_SPLIT = re.compile(r"(?<=[.!?])\s+")
+
+def _approx_tokens(text: str) -> int:
+    """Perkiraan jumlah token bila metadata n_tokens belum ada (index lama)."""
+    return max(1, (len(text) + 3) // 4)
+
+def _truncate_sentences(text: str, n_tokens: int, max_tokens: int) -> Tuple[str, int]:
+    """Potong di batas kalimat agar muat max_tokens (skala token ∝ karakter)."""
+    if n_tokens <= max_tokens:
+        return text, n_tokens
+    per_char = n_tokens / max(1, len(text))
+    out: List[str] = []
+    used = 0.0
+    for sent in _SENT_SPLIT.split(text):
+        cost = len(sent) * per_char
+        if out and used + cost > max_tokens:
+            break
+        out.append(sent)
+        used += cost
+    short = " ".join(out)
+    if len(out) == 1 and used > max_tokens:
+        # satu kalimat pun terlalu panjang → potong karakter
+        short = short[: int(max_tokens / per_char)].rstrip()
+    return short.rstrip() + "…", int(min(used, max_tokens)) + 1
+
+@lru_cache(maxsize=4096)
+def _render_passage(bucket: str, text: str, src: str, n_tokens: int) -> Tuple[str, int]:
+    """
+    Render badan blok (tanpa tag) + jumlah token; di-memo per passage
+    karena passage yang sama berulang kali terpilih lintas request.
+    """
+    if bucket == "S":
+        text, n_tokens = _truncate_sentences(text, n_tokens, SCHOLAR_PASSAGE_TOKENS)
+    body = f"{text}\n(Sumber: {src})"
+    return body, n_tokens + _approx_tokens(src) + 4
+
+def _format_context_dual(
+    passages: List[Dict],
+    max_tokens: int = CONTEXT_TOKEN_BUDGET,
+    l_start: int = 0,
+    s_start: int = 0,
+    selected: Optional[List[Dict]] = None,
+) -> Tuple[str, List[str]]:
+    """
+    Packing konteks berbasis token: greedy sesuai urutan relevansi retriever,
+    passage yang tidak muat dilewati (bukan menghentikan loop) agar sisa anggaran
+    tetap terisi oleh passage yang lebih pendek. Tag [Lx]/[Sx] diberikan setelah seleksi.
+    - l_start/s_start: offset penomoran tag (percakapan lanjutan melanjutkan nomor sebelumnya)
+    - selected: bila diberikan, diisi {id, bucket, tag, source} untuk passage yang terpilih
+    """
     L_blocks: List[str] = []
     S_blocks: List[str] = []
     refs: List[str] = []
     used = 0
-    l_idx = s_idx = 0
-
-    def _add_block(target_list: List[str], text: str) -> bool:
-        nonlocal used
-        if used + len(text) + 2 > max_chars:
-            remain = max_chars - used - 2
-            if remain > 50:
-                target_list.append(text[:remain].rstrip() + "…")
-                used = max_chars
-            return False
-        target_list.append(text)
-        used += len(text) + 2
-        return True
 
     for p in passages:
         txt = (p.get("text") or "").strip()
         if not txt:
             continue
         src = (p.get("source") or "unknown").strip()
-        bucket = p.get("bucket", "L")
+        bucket = "S" if p.get("bucket") == "S" else "L"
+        n_tok = p.get("n_tokens") or _approx_tokens(txt)
+
+        body, cost = _render_passage(bucket, txt, src, int(n_tok))
+        if used + cost > max_tokens:
+            continue
+        used += cost
 
         if bucket == "S":
-            s_idx += 1
-            tag = f"[S{s_idx}]"
-            short = txt if len(txt) <= 1200 else (txt[:1200].rstrip() + "…")
-            block = f"{tag} {short}\n(Sumber: {src})"
+            tag = f"[S{s_start + len(S_blocks) + 1}]"
+            S_blocks.append(f"{tag} {body}")
             cit = (p.get("citation") or "").strip()
             if src and cit:
                 refs.append(f"{tag} [{cit}]({src})")
@@ -72,17 +125,11 @@ def _format_context_dual(passages: List[Dict], max_chars: int = 3600) -> Tuple[s
                 refs.append(f"{tag} {cit}")
             else:
                 refs.append(f"{tag} {src}")
-            if not _add_block(S_blocks, block):
-                break
         else:
-            l_idx += 1
-            tag = f"[L{l_idx}]"
-            block = f"{tag} {txt}\n(Sumber: {src})"
-            if not _add_block(L_blocks, block):
-                break
-
-        if used >= max_chars:
-            break
+            tag = f"[L{l_start + len(L_blocks) + 1}]"
+            L_blocks.append(f"{tag} {body}")
+        if selected is not None:
+            selected.append({"id": p.get("id") or "", "bucket": bucket, "tag": tag, "source": src})
 
     ctx_parts: List[str] = []
     if L_blocks:
@@ -176,10 +223,12 @@ __all__ = [
     "_extract_text_safe",
     "_client",
     "_format_context_dual",
+    "_approx_tokens",
     "_detect_intent",
     "_has_user_question",
     "_percent_id",
     "_normalize_sections",
     "_is_nail_domain",
     "NAIL_KEYWORDS",
+    "CONTEXT_TOKEN_BUDGET",
 ]
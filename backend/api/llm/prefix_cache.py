@@ -0,0 +1,165 @@
+# api/llm/prefix_cache.py
+"""
+Cache prefix prompt statis (SYSTEM_PROMPT + panduan intent + aturan).
+
+Prefix didaftarkan sekali per proses (per model) sebagai cached content di sisi
+provider; request berikutnya hanya mengirim suffix dinamis (konteks + JSON user).
+Bila provider menolak (mis. prefix di bawah minimum token cache), prefix dikirim
+sebagai system_instruction sehingga implicit caching provider tetap bisa bekerja.
+Cached content yang digantikan/di-invalidate dihapus di provider (caches.delete) agar
+tidak terus ditagih sampai TTL habis.
+"""
+from __future__ import annotations
+import hashlib, logging, threading, time
+from typing import Dict, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+# setelah registrasi gagal, jangan coba lagi sebelum jeda ini (detik)
+_RETRY_AFTER_S = 600.0
+
+
+def _cache_missing(e: Exception) -> bool:
+    """Error provider untuk cached content yang sudah tidak ada / kedaluwarsa."""
+    code = getattr(e, "code", None) or getattr(e, "status_code", None)
+    if isinstance(code, int) and code not in (400, 403, 404):
+        return False
+    msg = str(e).lower()
+    if not any(k in msg for k in ("cached content", "cachedcontent", "cached_content")):
+        return False
+    return code == 404 or "not found" in msg or "expired" in msg
+
+
+def _delete(cli, name: str) -> None:
+    try:
+        cli.caches.delete(name=name)
+    except Exception as e:
+        log.info("Gagal menghapus cached content %s: %s", name, e)
+
+
+class PrefixCache:
+    def __init__(self, prefix: str, ttl_s: int = 3600, enabled: bool = True):
+        self.prefix = prefix
+        self.ttl_s = ttl_s
+        self.enabled = enabled
+        self.digest = hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:16]
+        self._handles: Dict[str, Tuple[str, float]] = {}  # model → (nama cache, kedaluwarsa)
+        self._failed_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        # registrasi (panggilan jaringan) di luar _lock; request konkuren per model menunggu
+        # Event milik satu pendaftar saja, bukan ikut memanggil caches.create
+        self._registering: Dict[str, threading.Event] = {}
+        self.stats = {
+            "registrations": 0,
+            "registration_errors": 0,
+            "hits": 0,                 # request yang memakai cached content
+            "misses": 0,               # request yang mengirim prefix sebagai system_instruction
+            "cached_tokens": 0,        # dari usage_metadata provider
+            "prompt_tokens": 0,
+        }
+
+    def _handle(self, cli, model_name: str) -> Optional[str]:
+        if not self.enabled or not hasattr(cli, "caches"):
+            return None
+        now = time.monotonic()
+        with self._lock:
+            h = self._handles.get(model_name)
+            if h and h[1] > now:
+                return h[0]
+            if self._failed_until.get(model_name, 0.0) > now:
+                return None
+            done = self._registering.get(model_name)
+            leader = done is None
+            if leader:
+                done = self._registering[model_name] = threading.Event()
+        if not leader:
+            done.wait()
+            with self._lock:
+                h = self._handles.get(model_name)
+                return h[0] if h and h[1] > time.monotonic() else None
+        try:
+            return self._register(cli, model_name)
+        finally:
+            with self._lock:
+                self._registering.pop(model_name, None)
+            done.set()
+
+    def _register(self, cli, model_name: str) -> Optional[str]:
+        now = time.monotonic()
+        try:
+            cache = cli.caches.create(
+                model=model_name,
+                config={
+                    "system_instruction": self.prefix,
+                    "display_name": f"nailbot-prefix-{self.digest}",
+                    "ttl": f"{self.ttl_s}s",
+                },
+            )
+        except Exception as e:
+            with self._lock:
+                self.stats["registration_errors"] += 1
+                self._failed_until[model_name] = now + _RETRY_AFTER_S
+            log.info("Prefix cache tidak tersedia untuk %s (%s); pakai system_instruction.", model_name, e)
+            return None
+        with self._lock:
+            self.stats["registrations"] += 1
+            old = self._handles.get(model_name)
+            # sisakan margin agar tidak memakai cache yang hampir kedaluwarsa
+            self._handles[model_name] = (cache.name, now + self.ttl_s * 0.9)
+        if old:
+            _delete(cli, old[0])  # masih hidup di provider selama sisa TTL
+        return cache.name
+
+    def invalidate(self, model_name: Optional[str] = None, cli=None, delete: bool = True) -> None:
+        """Lupakan handle; bila cli diberikan (dan delete), hapus juga cached content-nya di provider."""
+        with self._lock:
+            if model_name is None:
+                dropped = list(self._handles.values())
+                self._handles.clear()
+            else:
+                h = self._handles.pop(model_name, None)
+                dropped = [h] if h else []
+        if cli is not None and delete:
+            for name, _ in dropped:
+                _delete(cli, name)
+
+    def generate(self, cli, model_name: str, suffix: str, config: Optional[dict] = None):
+        """Panggil generate_content dengan prefix dari cache + suffix dinamis."""
+        cfg = dict(config or {})
+        contents = [{"role": "user", "parts": [{"text": suffix}]}]
+        handle = self._handle(cli, model_name)
+        if handle:
+            try:
+                resp = cli.models.generate_content(
+                    model=model_name, contents=contents, config={**cfg, "cached_content": handle},
+                )
+                self._record(resp, hit=True)
+                return resp
+            except Exception as e:
+                # hanya cache yang hilang/kedaluwarsa di provider yang di-fallback; 429/5xx/timeout
+                # diteruskan ke pemanggil (retry/breaker) tanpa menggandakan panggilan & membuang cache
+                if not _cache_missing(e):
+                    raise
+                log.warning("Cached content %s tidak ada lagi (%s); fallback system_instruction.", handle, e)
+                self.invalidate(model_name, delete=False)
+        resp = cli.models.generate_content(
+            model=model_name, contents=contents, config={**cfg, "system_instruction": self.prefix},
+        )
+        self._record(resp, hit=False)
+        return resp
+
+    def _record(self, resp, hit: bool) -> None:
+        usage = getattr(resp, "usage_metadata", None)
+        with self._lock:
+            self.stats["hits" if hit else "misses"] += 1
+            if usage is not None:
+                self.stats["cached_tokens"] += int(getattr(usage, "cached_content_token_count", 0) or 0)
+                self.stats["prompt_tokens"] += int(getattr(usage, "prompt_token_count", 0) or 0)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            s = dict(self.stats)
+        total = s["hits"] + s["misses"]
+        s["hit_rate"] = (s["hits"] / total) if total else 0.0
+        s["prefix_digest"] = self.digest
+        return s
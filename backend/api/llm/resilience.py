@@ -0,0 +1,221 @@
+# api/llm/resilience.py
+"""
+Pelindung latensi untuk panggilan LLM:
+  - anggaran latensi per request (lewat batas → caller memakai fallback deterministik)
+  - hedged request: kirim panggilan kedua bila yang pertama melewati p95 historis
+  - circuit breaker: berhenti memanggil provider yang terus gagal, coba lagi setelah jeda
+
+Panggilan provider tidak bisa dibatalkan; yang kalah balapan dibiarkan selesai di
+thread pool, hasilnya tetap bisa dipakai lewat handle follow-up.
+"""
+from __future__ import annotations
+import logging, threading, time, uuid
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Deque, Dict, Optional
+
+log = logging.getLogger(__name__)
+
+
+class LLMBudgetExceeded(TimeoutError):
+    """Anggaran latensi habis; .future tetap berjalan dan akan selesai di background."""
+    def __init__(self, future: Future):
+        super().__init__("LLM latency budget exceeded")
+        self.future = future
+
+
+class CircuitOpen(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """closed → (gagal beruntun ≥ threshold) → open → (setelah reset_after_s) → half-open (1 percobaan)."""
+
+    def __init__(self, failure_threshold: int = 5, reset_after_s: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_after_s = reset_after_s
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "rejected": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_after_s:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_after_s and not self._probing:
+                self._probing = True  # satu request percobaan
+                return True
+            self.stats["rejected"] += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._probing:
+                    self.stats["opened"] += 1
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+class LatencyTracker:
+    """Ring buffer latensi sukses terakhir untuk estimasi p95."""
+
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float, min_samples: int = 20) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            xs = sorted(self._samples)
+        return xs[min(len(xs) - 1, int(q * len(xs)))]
+
+
+class ResilientCaller:
+    def __init__(
+        self,
+        budget_ms: float = 15000.0,
+        hedge: bool = False,
+        hedge_min_samples: int = 20,
+        breaker: Optional[CircuitBreaker] = None,
+        max_workers: int = 8,
+    ):
+        self.budget_s = budget_ms / 1000.0 if budget_ms and budget_ms > 0 else None
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "timeouts": 0, "hedged": 0, "hedge_wins": 0, "errors": 0}
+
+    def _bump(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def _submit(self, fn: Callable) -> Future:
+        # hanya ukur latensi; hasil breaker dicatat sekali per call() (bukan per future, yang bisa
+        # selesai terlambat setelah timeout dan mereset breaker)
+        def _timed():
+            t0 = time.perf_counter()
+            out = fn()
+            self.latency.add(time.perf_counter() - t0)
+            return out
+        return self._pool.submit(_timed)
+
+    def call(self, fn: Callable):
+        """
+        Jalankan fn dengan anggaran latensi.
+        Raise CircuitOpen, LLMBudgetExceeded, atau exception asli dari fn.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpen("LLM circuit breaker open")
+        self._bump("calls")
+        deadline = (time.monotonic() + self.budget_s) if self.budget_s else None
+
+        primary = self._submit(fn)
+        hedge: Optional[Future] = None
+        pending = {primary}
+
+        hedge_after = self.latency.quantile(0.95, self.hedge_min_samples) if self.hedge else None
+        if hedge_after is not None:
+            wait_s = hedge_after if deadline is None else min(hedge_after, max(0.0, deadline - time.monotonic()))
+            done, _ = wait(pending, timeout=wait_s)
+            if not done and (deadline is None or time.monotonic() < deadline):
+                self._bump("hedged")
+                hedge = self._submit(fn)
+                pending.add(hedge)
+
+        last_exc: Optional[BaseException] = None
+        while pending:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for f in done:
+                if f.exception() is None:
+                    if f is not primary:
+                        self._bump("hedge_wins")
+                    self.breaker.record_success()
+                    return f.result()
+                last_exc = f.exception()
+
+        self.breaker.record_failure()
+        if pending:
+            self._bump("timeouts")
+            # follow-up memakai hedge (dikirim paling akhir) bila masih berjalan, selain itu primary
+            raise LLMBudgetExceeded(hedge if hedge in pending else primary)
+        self._bump("errors")
+        raise last_exc  # type: ignore[misc]
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            s = dict(self.stats)
+        s["breaker_state"] = self.breaker.state
+        s.update({f"breaker_{k}": v for k, v in self.breaker.stats.items()})
+        p95 = self.latency.quantile(0.95, 1)
+        s["p95_ms"] = round(p95 * 1000.0, 1) if p95 is not None else None
+        return s
+
+
+class FollowupRegistry:
+    """Handle → hasil penjelasan yang selesai terlambat (dibatasi jumlah & umur)."""
+
+    def __init__(self, max_items: int = 256, ttl_s: float = 600.0):
+        self.max_items = max_items
+        self.ttl_s = ttl_s
+        self._items: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, future: Future, finalize: Callable) -> str:
+        handle = uuid.uuid4().hex
+        with self._lock:
+            self._items[handle] = {"status": "pending", "explanation_md": None, "ts": time.time()}
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+        def _done(f: Future):
+            item = {"status": "error", "explanation_md": None, "ts": time.time()}
+            try:
+                md = finalize(f.result())
+                if md:
+                    item = {"status": "done", "explanation_md": md, "ts": time.time()}
+            except Exception as e:
+                log.warning("Follow-up LLM %s gagal: %s", handle, e)
+            with self._lock:
+                if handle in self._items:
+                    self._items[handle] = item
+
+        future.add_done_callback(_done)
+        return handle
+
+    def get(self, handle: str) -> Optional[Dict]:
+        with self._lock:
+            item = self._items.get(handle)
+            if item and time.time() - item["ts"] > self.ttl_s and item["status"] != "pending":
+                del self._items[handle]
+                return None
+            return dict(item) if item else None
@@ -0,0 +1,129 @@
+# api/llm/semantic_cache.py
+"""
+Cache semantik untuk penjelasan LLM.
+
+Kunci = embedding MiniLM dari "(label | bucket confidence | intent | pertanyaan)".
+Lookup hanya membandingkan entri dengan label & bucket confidence yang sama
+(aman secara medis), lalu memilih cosine tertinggi di atas ambang.
+Entri ditandai versi index RAG + prefix prompt; bila versi berubah, entri dianggap basi.
+"""
+from __future__ import annotations
+import threading, time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+
+def confidence_bucket(conf: float, width: float = 0.1) -> int:
+    """0.83 → 8 (lebar bucket default 10 poin persen)."""
+    return int(min(max(conf, 0.0), 0.9999) / width)
+
+
+class SemanticCache:
+    """
+    Vektor disimpan sebagai satu matriks per grup (label, bucket) → lookup = satu matmul di luar
+    lock. Matriks diganti utuh (copy-on-write) saat put/evict sehingga pembaca tidak perlu lock.
+    Nilai entri bebas (mis. dict markdown + metadata); disimpan apa adanya.
+    """
+
+    def __init__(self, embed_fn, threshold: float = 0.92, ttl_s: float = 86400.0, max_entries: int = 1024):
+        self._embed = embed_fn
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        # id → (grup, nilai, waktu simpan, biaya ms)
+        self._entries: "OrderedDict[int, Tuple[Tuple[str, int], Any, float, float]]" = OrderedDict()
+        # grup → (ids (n,), matriks (n, D))
+        self._groups: Dict[Tuple[str, int], Tuple[np.ndarray, np.ndarray]] = {}
+        self._version: Optional[str] = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "stale": 0, "saved_ms": 0.0}
+
+    @staticmethod
+    def _key_text(label: str, bucket: int, intent: str, question: str) -> str:
+        return f"{label} | conf{bucket} | {intent} | {(question or '').strip().lower()}"
+
+    def make_key(self, label: str, conf: float, intent: str, question: str) -> Tuple[Tuple[str, int], np.ndarray]:
+        bucket = confidence_bucket(conf)
+        vec = np.asarray(self._embed([self._key_text(label, bucket, intent, question)])[0], dtype=np.float32)
+        return (label, bucket), vec
+
+    def _check_version(self, version: str) -> None:
+        """Versi index/prefix berubah → semua entri basi (dipanggil dengan _lock)."""
+        if version != self._version:
+            self.stats["stale"] += len(self._entries)
+            self._entries.clear()
+            self._groups.clear()
+            self._version = version
+
+    def _drop(self, eid: int) -> None:
+        """Hapus entri + barisnya dari matriks grup (dipanggil dengan _lock)."""
+        group = self._entries.pop(eid)[0]
+        ids, mat = self._groups[group]
+        keep = ids != eid
+        if keep.any():
+            self._groups[group] = (ids[keep], mat[keep])
+        else:
+            del self._groups[group]
+
+    def get(self, key: Tuple[Tuple[str, int], np.ndarray], version: str) -> Optional[Any]:
+        group, vec = key
+        with self._lock:
+            self._check_version(version)
+            ids, mat = self._groups.get(group, (None, None))
+        if ids is None:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        sims = mat @ vec  # embedding sudah ternormalisasi
+        order = np.argsort(-sims)
+        now = time.time()
+        with self._lock:
+            for j in order:
+                if sims[j] < self.threshold:
+                    break
+                eid = int(ids[j])
+                entry = self._entries.get(eid)
+                if entry is None:  # dihapus thread lain setelah snapshot matriks
+                    continue
+                if now - entry[2] > self.ttl_s:
+                    self._drop(eid)
+                    self.stats["stale"] += 1
+                    continue
+                self._entries.move_to_end(eid)  # LRU
+                self.stats["hits"] += 1
+                self.stats["saved_ms"] += entry[3]
+                return entry[1]
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: Tuple[Tuple[str, int], np.ndarray], value: Any, version: str, cost_ms: float) -> None:
+        group, vec = key
+        with self._lock:
+            self._check_version(version)
+            eid = self._next_id
+            self._next_id += 1
+            self._entries[eid] = (group, value, time.time(), cost_ms)
+            ids, mat = self._groups.get(group, (np.zeros(0, dtype=np.int64), np.zeros((0, vec.shape[0]), np.float32)))
+            self._groups[group] = (np.append(ids, eid), np.vstack([mat, vec[None, :]]))
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            s = dict(self.stats)
+            s["entries"] = len(self._entries)
+            s["groups"] = len(self._groups)
+        total = s["hits"] + s["misses"]
+        s["hit_rate"] = (s["hits"] / total) if total else 0.0
+        return s
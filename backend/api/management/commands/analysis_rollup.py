@@ -0,0 +1,66 @@
+# api/management/commands/analysis_rollup.py
+import json
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from api.models import AnalysisEvent
+
+
+def _pct(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))] if xs else float("nan")
+
+
+class Command(BaseCommand):
+    help = "Rollup harian log analisis: jumlah & latensi (p50/p95) per endpoint, serta distribusi label."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=7, help="Jumlah hari ke belakang (default 7).")
+        parser.add_argument("--endpoint", default=None, help="Filter endpoint (analyze/classify/explain/job).")
+        parser.add_argument("--json", action="store_true", help="Keluarkan JSON.")
+
+    def handle(self, *args, **opts):
+        since = timezone.now() - timedelta(days=opts["days"])
+        qs = AnalysisEvent.objects.filter(created_at__gte=since)
+        if opts["endpoint"]:
+            qs = qs.filter(endpoint=opts["endpoint"])
+        qs = qs.annotate(day=TruncDate("created_at"))
+
+        # latensi: persentil dihitung di Python (SQLite tidak punya fungsi percentile)
+        lat = defaultdict(list)
+        errors = defaultdict(int)
+        for day, endpoint, ms, ok in qs.values_list("day", "endpoint", "latency_ms", "ok").iterator():
+            lat[(day, endpoint)].append(ms)
+            errors[(day, endpoint)] += not ok
+        latency = [
+            {
+                "day": str(day), "endpoint": ep, "count": len(xs), "errors": errors[(day, ep)],
+                "p50_ms": _pct(xs, 0.5), "p95_ms": _pct(xs, 0.95), "max_ms": max(xs),
+            }
+            for (day, ep), xs in sorted(lat.items())
+        ]
+
+        labels = defaultdict(dict)
+        for row in (qs.exclude(label="").values("day", "label").annotate(n=Count("id")).order_by("day", "-n")):
+            labels[str(row["day"])][row["label"]] = row["n"]
+
+        if opts["json"]:
+            self.stdout.write(json.dumps({"latency": latency, "labels": labels}, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write(f"{'hari':<11} {'endpoint':<9} {'n':>6} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} {'maks ms':>8}")
+        for r in latency:
+            self.stdout.write(
+                f"{r['day']:<11} {r['endpoint']:<9} {r['count']:>6} {r['errors']:>4} "
+                f"{r['p50_ms']:>8.0f} {r['p95_ms']:>8.0f} {r['max_ms']:>8.0f}"
+            )
+        self.stdout.write("\nDistribusi label per hari:")
+        for day, dist in sorted(labels.items()):
+            total = sum(dist.values())
+            parts = ", ".join(f"{lab} {n / total:.0%}" for lab, n in dist.items())
+            self.stdout.write(f"  {day} (n={total}): {parts}")
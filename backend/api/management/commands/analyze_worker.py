@@ -0,0 +1,33 @@
+# api/management/commands/analyze_worker.py
+import threading
+
+from django.core.management.base import BaseCommand
+
+from api.jobs import worker_loop
+
+
+class Command(BaseCommand):
+    help = "Jalankan worker antrean /analyze (mode async) sebagai proses terpisah."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=1, help="Jumlah thread worker.")
+        parser.add_argument("--poll", type=float, default=0.5, help="Interval polling antrean (detik).")
+
+    def handle(self, *args, **opts):
+        stop = threading.Event()
+        threads = [
+            threading.Thread(target=worker_loop, args=(stop, opts["poll"], True), name=f"analyze-worker-{i}", daemon=True)
+            for i in range(max(1, opts["threads"]))
+        ]
+        for t in threads:
+            t.start()
+        self.stdout.write(f"analyze_worker: {len(threads)} thread aktif (Ctrl+C untuk berhenti)")
+        try:
+            while any(t.is_alive() for t in threads):
+                for t in threads:
+                    t.join(timeout=1.0)
+        except KeyboardInterrupt:
+            stop.set()
+            self.stdout.write("Menunggu job berjalan selesai...")
+            for t in threads:
+                t.join()
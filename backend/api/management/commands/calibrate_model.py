@@ -0,0 +1,121 @@
+# api/management/commands/calibrate_model.py
+import json
+from pathlib import Path
+
+import numpy as np
+import torch
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.inference import _build_tfms
+from api.model_loader import get_model_and_meta, model_status
+
+_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+def _softmax(z: np.ndarray) -> np.ndarray:
+    z = z - z.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+def _nll(logits: np.ndarray, y: np.ndarray, T: float) -> float:
+    p = _softmax(logits / T)
+    return float(-np.log(np.clip(p[np.arange(len(y)), y], 1e-12, None)).mean())
+
+
+class Command(BaseCommand):
+    help = (
+        "Fit temperature scaling & ambang early-exit dari folder validasi berlabel "
+        "(<data>/<nama_kelas>/*.jpg), simpan ke CALIBRATION_PATH."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--data", required=True, help="Folder validasi: satu subfolder per kelas.")
+        parser.add_argument("--max-drop", type=float, default=0.005,
+                            help="Penurunan akurasi maksimum vs TTA penuh yang diizinkan (default 0.5%%).")
+        parser.add_argument("--margin", type=float, default=0.0, help="Margin top1-top2 minimum untuk exit.")
+        parser.add_argument("--batch", type=int, default=32)
+        parser.add_argument("--out", default=None, help="Path output (default: settings.CALIBRATION_PATH).")
+
+    @torch.inference_mode()
+    def _logits(self, model, device, tfms, paths, batch):
+        lo, lf = [], []
+        for i in range(0, len(paths), batch):
+            imgs = [Image.open(p).convert("RGB") for p in paths[i:i + batch]]
+            x = torch.stack([tfms(im) for im in imgs]).to(device)
+            x_hf = torch.stack([tfms(ImageOps.mirror(im)) for im in imgs]).to(device)
+            lo.append(model(x).float().cpu().numpy())
+            lf.append(model(x_hf).float().cpu().numpy())
+        return np.concatenate(lo), np.concatenate(lf)
+
+    def handle(self, *args, **opts):
+        model, class_names, img_size, device = get_model_and_meta()
+        root = Path(opts["data"])
+        paths, ys = [], []
+        for ci, name in enumerate(class_names):
+            d = root / name
+            if not d.is_dir():
+                self.stderr.write(f"Peringatan: folder kelas {d} tidak ada, dilewati.")
+                continue
+            for p in sorted(d.iterdir()):
+                if p.suffix.lower() in _EXTS:
+                    paths.append(p)
+                    ys.append(ci)
+        if len(paths) < 20:
+            raise CommandError(f"Butuh >= 20 gambar berlabel, ditemukan {len(paths)}.")
+        y = np.asarray(ys)
+
+        lo, lf = self._logits(model, device, _build_tfms(img_size), paths, opts["batch"])
+
+        # 1) temperature: grid search log-space minimasi NLL (single pass)
+        grid = np.exp(np.linspace(np.log(0.25), np.log(8.0), 241))
+        nlls = [_nll(lo, y, T) for T in grid]
+        T = float(grid[int(np.argmin(nlls))])
+
+        # 2) ambang early-exit terendah yang akurasinya masih dalam max_drop dari TTA penuh
+        po = _softmax(lo / T)
+        ptta = (po + _softmax(lf / T)) / 2.0
+        pred_o, pred_tta = po.argmax(1), ptta.argmax(1)
+        acc_tta = float((pred_tta == y).mean())
+        top2 = np.sort(po, axis=1)[:, -2:]
+        margin_ok = (top2[:, 1] - top2[:, 0]) >= opts["margin"]
+
+        chosen = None
+        for thr in np.round(np.arange(0.50, 0.995, 0.01), 2):
+            early = (top2[:, 1] >= thr) & margin_ok
+            acc = float((np.where(early, pred_o, pred_tta) == y).mean())
+            if acc >= acc_tta - opts["max_drop"]:
+                chosen = (float(thr), float(early.mean()), acc)
+                break
+        if chosen is None:
+            chosen = (1.01, 0.0, acc_tta)  # tidak ada ambang aman → selalu TTA
+
+        thr, exit_rate, acc_adapt = chosen
+        out = {
+            "ckpt_version": model_status()["version"],
+            "temperature": T,
+            "exit_threshold": thr,
+            "exit_margin": opts["margin"],
+            "report": {
+                "samples": len(paths),
+                "nll_before": _nll(lo, y, 1.0),
+                "nll_after": _nll(lo, y, T),
+                "acc_single": float((pred_o == y).mean()),
+                "acc_tta": acc_tta,
+                "acc_adaptive": acc_adapt,
+                "accuracy_delta": acc_adapt - acc_tta,
+                "early_exit_rate": exit_rate,
+            },
+        }
+        dest = Path(opts["out"] or settings.CALIBRATION_PATH)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        dest.write_text(json.dumps(out, indent=2), encoding="utf-8")
+
+        r = out["report"]
+        self.stdout.write(f"T={T:.3f}  NLL {r['nll_before']:.4f} → {r['nll_after']:.4f}")
+        self.stdout.write(f"Ambang exit={thr:.2f} margin={opts['margin']:.2f}: "
+                          f"early-exit {exit_rate:.1%}, akurasi adaptif {acc_adapt:.2%} vs TTA {acc_tta:.2%} "
+                          f"(Δ {100 * r['accuracy_delta']:+.2f} pt)")
+        self.stdout.write(f"Tersimpan: {dest}")
@@ -0,0 +1,56 @@
+# api/management/commands/mem_report.py
+import json
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import memwatch
+
+
+class Command(BaseCommand):
+    help = "Diff snapshot tracemalloc (MEM_SNAPSHOT_DIR): situs alokasi yang paling tumbuh per worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dir", default=None, help="Folder snapshot (default MEM_SNAPSHOT_DIR).")
+        parser.add_argument("--pid", type=int, default=None, help="Hanya worker dengan pid ini.")
+        parser.add_argument("--base", default=None, help="File snapshot awal (default: tertua per pid).")
+        parser.add_argument("--head", default=None, help="File snapshot akhir (default: terbaru per pid).")
+        parser.add_argument("--key", choices=["lineno", "filename", "traceback"], default="lineno")
+        parser.add_argument("--limit", type=int, default=15)
+        parser.add_argument("--json", action="store_true", help="Keluarkan JSON.")
+
+    def handle(self, *args, **opts):
+        if opts["base"] or opts["head"]:
+            if not (opts["base"] and opts["head"]):
+                raise CommandError("--base dan --head harus diberikan bersama.")
+            pairs = {"manual": (Path(opts["base"]), Path(opts["head"]))}
+        else:
+            d = Path(opts["dir"]) if opts["dir"] else memwatch.snapshot_dir()
+            by_pid = defaultdict(list)
+            pattern = f"{opts['pid']}-*.tmsnap" if opts["pid"] else "*.tmsnap"
+            for p in sorted(d.glob(pattern), key=lambda p: p.stat().st_mtime):
+                by_pid[p.name.split("-", 1)[0]].append(p)
+            pairs = {pid: (snaps[0], snaps[-1]) for pid, snaps in by_pid.items() if len(snaps) >= 2}
+            if not pairs:
+                raise CommandError(f"Butuh ≥2 snapshot per worker di {d} (aktifkan MEM_TRACE_ENABLED).")
+
+        report = {}
+        for pid, (base_p, head_p) in pairs.items():
+            base, head = tracemalloc.Snapshot.load(str(base_p)), tracemalloc.Snapshot.load(str(head_p))
+            total = lambda s: sum(t.size for t in s.traces) / 1e6
+            report[pid] = {
+                "base": base_p.name, "head": head_p.name,
+                "traced_mb": [round(total(base), 1), round(total(head), 1)],
+                "top": memwatch.top_diff(base, head, opts["limit"], opts["key"]),
+            }
+
+        if opts["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for pid, r in report.items():
+            self.stdout.write(f"\n[{pid}] {r['base']} → {r['head']}  traced {r['traced_mb'][0]} → {r['traced_mb'][1]} MB")
+            self.stdout.write(f"  {'Δ KB':>10} {'total KB':>10} {'Δ blok':>8}  situs")
+            for t in r["top"]:
+                self.stdout.write(f"  {t['size_diff_kb']:>10.1f} {t['size_kb']:>10.1f} {t['count_diff']:>8}  {t['site']}")
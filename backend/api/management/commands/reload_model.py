@@ -0,0 +1,52 @@
+# api/management/commands/reload_model.py
+import os
+import shutil
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.model_loader import validate_checkpoint
+
+
+class Command(BaseCommand):
+    help = (
+        "Validasi checkpoint (load + smoke forward pass) lalu picu hot-reload di semua worker "
+        "dengan menyentuh mtime CKPT_PATH (butuh MODEL_WATCH_S > 0 di worker)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ckpt", default=None, help="Path checkpoint (default: settings.CKPT_PATH).")
+        parser.add_argument("--check-only", action="store_true", help="Hanya validasi, jangan picu reload.")
+
+    def handle(self, *args, **opts):
+        path = opts["ckpt"] or settings.CKPT_PATH
+        try:
+            info = validate_checkpoint(path)
+        except Exception as e:
+            raise CommandError(f"Checkpoint tidak valid: {e}")
+        self.stdout.write(f"OK: versi {info['version']}, {info['classes']} kelas, img_size {info['img_size']}")
+
+        if opts["check_only"]:
+            return
+        if os.path.abspath(path) != os.path.abspath(settings.CKPT_PATH):
+            # salin ke file sementara di folder tujuan lalu ganti atomik: worker tidak pernah membaca
+            # file setengah tersalin, dan file sumber milik operator tetap utuh
+            tmp = f"{settings.CKPT_PATH}.tmp"
+            try:
+                shutil.copyfile(path, tmp)
+                os.replace(tmp, settings.CKPT_PATH)
+            except OSError as e:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise CommandError(f"Gagal menyalin checkpoint: {e}")
+            self.stdout.write(f"Checkpoint disalin ke {settings.CKPT_PATH}")
+        else:
+            os.utime(settings.CKPT_PATH, None)
+        if settings.MODEL_WATCH_S <= 0:
+            # tanpa watcher tidak ada worker yang memperhatikan perubahan file
+            self.stderr.write(self.style.WARNING(
+                "MODEL_WATCH_S <= 0: worker TIDAK memuat ulang otomatis. Panggil POST /api/model/reload "
+                "di tiap worker atau restart worker agar checkpoint baru aktif."
+            ))
+            return
+        self.stdout.write("Reload dipicu; worker akan menukar model dalam ~2x MODEL_WATCH_S.")
@@ -0,0 +1,179 @@
+# api/management/commands/score_images.py
+import csv
+import os
+import time
+from pathlib import Path
+
+import torch
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.inference import _build_tfms, _forward_logits, get_calibration
+from api.model_loader import get_model_and_meta, model_status
+from api.roi import crop_nail_roi
+from api.uploads import decode_image
+
+_EXTS = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+class _ImageDataset(torch.utils.data.Dataset):
+    """Decode seperti jalur upload (decode_image + crop ROI bila aktif) → tensor; gagal → pesan error."""
+
+    def __init__(self, paths, img_size):
+        self.paths = paths
+        self.img_size = img_size
+        self.tfms = None
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, i):
+        if self.tfms is None:  # dibangun di proses worker DataLoader
+            self.tfms = _build_tfms(self.img_size)
+        try:
+            pil = decode_image(Path(self.paths[i]).read_bytes())
+            if settings.ROI_CROP:
+                pil, _ = crop_nail_roi(pil)
+            return i, self.tfms(pil), ""
+        except Exception as e:
+            return i, None, f"{type(e).__name__}: {e}"
+
+
+def _init_worker(_):
+    import django
+    django.setup()  # no-op saat fork; perlu bila start method = spawn
+    torch.set_num_threads(1)  # paralelisme lewat jumlah worker, bukan thread intra-op
+
+
+def _collate(items):
+    ok = [(i, x) for i, x, err in items if x is not None]
+    failed = [(i, err) for i, x, err in items if x is None]
+    x = torch.stack([x for _, x in ok]) if ok else None
+    return [i for i, _ in ok], x, failed
+
+
+def _read_manifest(path: Path):
+    if path.suffix.lower() == ".csv":
+        with path.open(newline="", encoding="utf-8") as f:
+            rows = [r["path"] for r in csv.DictReader(f)]
+    else:
+        rows = [ln.strip() for ln in path.read_text(encoding="utf-8").splitlines()]
+    return [str(p if Path(p).is_absolute() else path.parent / p) for p in rows if p and not p.startswith("#")]
+
+
+class Command(BaseCommand):
+    help = (
+        "Skor massal gambar dari folder/manifest dengan model aktif (tanpa LLM/RAG): decode paralel, "
+        "forward batch besar, hasil ditulis bertahap ke CSV dan bisa dilanjutkan bila terputus."
+    )
+
+    def add_arguments(self, parser):
+        src = parser.add_mutually_exclusive_group(required=True)
+        src.add_argument("--input", help="Folder gambar (rekursif).")
+        src.add_argument("--manifest", help="Daftar path: .txt satu per baris atau .csv dengan kolom 'path'.")
+        parser.add_argument("--out", required=True, help="CSV hasil; baris yang sudah ada dilewati (resume).")
+        parser.add_argument("--batch", type=int, default=64)
+        parser.add_argument("--workers", type=int, default=4, help="Proses decode paralel.")
+        parser.add_argument("--tta", choices=["auto", "always", "never"], default=None,
+                            help="Default: settings.INFERENCE_TTA (sama dengan endpoint).")
+        parser.add_argument("--retry-errors", action="store_true", help="Ulangi path yang sebelumnya gagal.")
+        parser.add_argument("--report-every", type=int, default=20, help="Cetak throughput tiap N batch.")
+
+    def handle(self, *args, **opts):
+        if opts["input"]:
+            root = Path(opts["input"])
+            if not root.is_dir():
+                raise CommandError(f"Folder {root} tidak ada.")
+            paths = sorted(str(p) for p in root.rglob("*") if p.suffix.lower() in _EXTS)
+        else:
+            paths = _read_manifest(Path(opts["manifest"]))
+
+        model, class_names, img_size, device = get_model_and_meta()
+        version = model_status()["version"] or ""
+        tta = opts["tta"] or settings.INFERENCE_TTA
+        calib = get_calibration()  # temperature di semua mode, sama dengan endpoint
+        T = float(calib["temperature"])
+
+        out = Path(opts["out"])
+        header = ["path", "label", "confidence", "tta", "model_version", "error"] + [f"p_{c}" for c in class_names]
+        done, failed_before = set(), set()
+        if out.exists() and out.stat().st_size:
+            with out.open(newline="", encoding="utf-8") as f:
+                reader = csv.DictReader(f)
+                if reader.fieldnames != header:
+                    raise CommandError(f"Kolom {out} berbeda (model/label lain?); pakai --out baru.")
+                for r in reader:
+                    (failed_before if opts["retry_errors"] and r["error"] else done).add(r["path"])
+        # baris error yang akan diulang (atau yang sudah punya baris sukses) dibuang dulu: satu baris per path
+        drop = failed_before & (set(paths) | done)
+        if drop:
+            self._drop_error_rows(out, header, drop)
+        todo = [p for p in paths if p not in done]
+        self.stdout.write(f"{len(paths)} gambar, {len(paths) - len(todo)} sudah ada di {out}, {len(todo)} diproses "
+                          f"(tta={tta}, batch={opts['batch']}, workers={opts['workers']}, device={device})")
+        if not todo:
+            return
+
+        loader = torch.utils.data.DataLoader(
+            _ImageDataset(todo, img_size), batch_size=opts["batch"], num_workers=opts["workers"],
+            collate_fn=_collate, worker_init_fn=_init_worker, pin_memory=device.type == "cuda",
+            prefetch_factor=4 if opts["workers"] > 0 else None, persistent_workers=False,
+        )
+        new_file = not out.exists() or not out.stat().st_size
+        out.parent.mkdir(parents=True, exist_ok=True)
+        n_ok = n_err = 0
+        t0 = time.perf_counter()
+        with out.open("a", newline="", encoding="utf-8") as f, torch.inference_mode():
+            w = csv.writer(f)
+            if new_file:
+                w.writerow(header)
+            for b, (idx, x, failed) in enumerate(loader, 1):
+                rows = [[todo[i], "", "", "", version, err] + [""] * len(class_names) for i, err in failed]
+                if x is not None:
+                    rows += self._score(model, device, x, idx, todo, tta, T, calib, class_names, version)
+                w.writerows(rows)
+                f.flush()  # baris per batch langsung di disk → aman di-resume
+                n_ok += len(idx)
+                n_err += len(failed)
+                if b % opts["report_every"] == 0:
+                    rate = (n_ok + n_err) / (time.perf_counter() - t0)
+                    self.stdout.write(f"  {n_ok + n_err}/{len(todo)}  {rate:.1f} gambar/detik  ({n_err} gagal)")
+
+        wall = time.perf_counter() - t0
+        self.stdout.write(f"Selesai: {n_ok} dinilai, {n_err} gagal dalam {wall:.1f} dtk "
+                          f"→ {(n_ok + n_err) / wall:.1f} gambar/detik. Hasil: {out}")
+
+    @staticmethod
+    def _drop_error_rows(out: Path, header, paths) -> None:
+        """Tulis ulang CSV tanpa baris error untuk `paths` (file sementara + os.replace, atomik)."""
+        tmp = out.with_name(out.name + ".tmp")
+        with out.open(newline="", encoding="utf-8") as src, tmp.open("w", newline="", encoding="utf-8") as dst:
+            w = csv.DictWriter(dst, fieldnames=header)
+            w.writeheader()
+            w.writerows(r for r in csv.DictReader(src) if not (r["error"] and r["path"] in paths))
+        os.replace(tmp, out)
+
+    def _score(self, model, device, x, idx, todo, tta, T, calib, class_names, version):
+        x = x.to(device, non_blocking=True)
+        probs = torch.softmax(_forward_logits(model, x, device).float() / T, dim=1)
+        if tta == "never":
+            used = torch.zeros(len(idx), dtype=torch.bool)
+        elif tta == "always":
+            used = torch.ones(len(idx), dtype=torch.bool)
+        else:  # sama dengan inference._run_adaptive: flip hanya untuk baris yang belum yakin
+            top2 = probs.topk(2, dim=1).values
+            used = ~((top2[:, 0] >= calib["exit_threshold"]) & (top2[:, 0] - top2[:, 1] >= calib["exit_margin"]))
+            used = used.cpu()
+        if used.any():
+            sel = used.nonzero().squeeze(1).to(device)
+            x_hf = torch.flip(x.index_select(0, sel), dims=[3])  # mirror horizontal = ImageOps.mirror
+            probs_hf = torch.softmax(_forward_logits(model, x_hf, device).float() / T, dim=1)
+            probs[sel] = (probs[sel] + probs_hf) / 2.0
+
+        probs = probs.cpu().numpy()
+        top = probs.argmax(1)
+        rows = []
+        for r, i in enumerate(idx):
+            rows.append([todo[i], class_names[top[r]], f"{probs[r, top[r]]:.6f}", int(used[r]), version, ""]
+                        + [f"{p:.6f}" for p in probs[r]])
+        return rows
@@ -0,0 +1,78 @@
+# api/management/commands/shadow_report.py
+import json
+import statistics
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import shadow
+
+
+def _pct(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))] if xs else float("nan")
+
+
+class Command(BaseCommand):
+    help = "Ringkas log inferensi shadow: agreement rate, confusion per kelas & selisih latensi."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--log", default=None, help="Path log shadow (default: SHADOW_LOG_PATH).")
+        parser.add_argument("--json", action="store_true", help="Keluarkan JSON.")
+
+    def handle(self, *args, **opts):
+        log_path = Path(opts["log"]) if opts["log"] else shadow.log_path()
+        try:
+            meta = json.loads(shadow.meta_path(log_path).read_text(encoding="utf-8"))
+            records = list(shadow.read_records(log_path))
+        except FileNotFoundError:
+            raise CommandError(f"Log shadow tidak ditemukan: {log_path}")
+        if not records:
+            raise CommandError("Log shadow kosong.")
+
+        p_cls, s_cls = meta["primary_classes"], meta["shadow_classes"]
+        confusion = {}
+        agree = 0
+        p_ms, s_ms = [], []
+        for _, pi, si, _, _, pms, sms in records:
+            pl, sl = p_cls[pi], (s_cls[si] if si < len(s_cls) else str(si))
+            confusion.setdefault(pl, {}).setdefault(sl, 0)
+            confusion[pl][sl] += 1
+            agree += int(pl == sl)
+            p_ms.append(pms)
+            s_ms.append(sms)
+
+        deltas = [b - a for a, b in zip(p_ms, s_ms)]
+        report = {
+            "primary_version": meta["primary_version"],
+            "shadow_version": meta["shadow_version"],
+            "samples": len(records),
+            "agreement_rate": agree / len(records),
+            "per_class_agreement": {
+                k: row.get(k, 0) / sum(row.values()) for k, row in sorted(confusion.items())
+            },
+            "confusion": confusion,
+            "latency_ms": {
+                "primary_p50": statistics.median(p_ms), "primary_p95": _pct(p_ms, 0.95),
+                "shadow_p50": statistics.median(s_ms), "shadow_p95": _pct(s_ms, 0.95),
+                "delta_mean": statistics.mean(deltas), "delta_p95": _pct(deltas, 0.95),
+            },
+        }
+        if opts["json"]:
+            self.stdout.write(json.dumps(report, indent=2, ensure_ascii=False))
+            return
+
+        lat = report["latency_ms"]
+        self.stdout.write(f"Primer {report['primary_version']} vs shadow {report['shadow_version']}")
+        self.stdout.write(f"Sampel: {report['samples']}  agreement: {report['agreement_rate']:.1%}")
+        self.stdout.write("\nAgreement per kelas (label primer):")
+        for k, v in report["per_class_agreement"].items():
+            self.stdout.write(f"  {k:<30} {v:6.1%}  n={sum(confusion[k].values())}")
+        self.stdout.write("\nConfusion (primer → shadow):")
+        for k, row in sorted(confusion.items()):
+            self.stdout.write(f"  {k:<30} " + ", ".join(f"{s}:{n}" for s, n in sorted(row.items())))
+        self.stdout.write(
+            f"\nLatensi ms  primer p50={lat['primary_p50']:.1f} p95={lat['primary_p95']:.1f} | "
+            f"shadow p50={lat['shadow_p50']:.1f} p95={lat['shadow_p95']:.1f} | "
+            f"Δ mean={lat['delta_mean']:+.1f} Δ p95={lat['delta_p95']:+.1f}"
+        )
@@ -0,0 +1,241 @@
+# api/memwatch.py
+"""
+Observabilitas memori worker (opt-in) + daur ulang worker saat RSS melewati ambang.
+
+- MEM_TRACE_ENABLED: tracemalloc aktif terus sepanjang umur proses (dimulai pada request pertama)
+  agar snapshot baseline vs snapshot berikutnya benar-benar menunjukkan pertumbuhan/kebocoran
+  lintas request. Overhead tracemalloc ditanggung semua request selama fitur ini aktif — nyalakan
+  hanya saat investigasi. MEM_TRACE_SAMPLE_RATE hanya menyampel pencatatan per tahap & snapshot:
+  pada request tersampel, mark(stage) mencatat delta memori Python (tracemalloc) & RSS per tahap
+  (decode → classify → explain → response). Delta bersifat perkiraan: tracemalloc menghitung
+  alokasi seluruh proses, termasuk thread lain.
+- Di akhir request tersampel snapshot disimpan paling sering tiap MEM_SNAPSHOT_INTERVAL_S ke
+  MEM_SNAPSHOT_DIR (snapshot pertama = baseline). `manage.py mem_report` / GET /api/debug/memory
+  membandingkan snapshot terbaru (atau live) dengan baseline itu.
+- gauges(): RSS proses, puncak RSS, memori torch (CUDA allocated/reserved), tracemalloc, gc.
+- MEM_RECYCLE_RSS_MB > 0: bila RSS melewati ambang, worker berhenti menerima kerja baru
+  (MemoryWatchMiddleware membalas 503 + Retry-After selama is_recycling()),
+  menunggu request in-flight selesai lalu mengirim SIGTERM ke dirinya sendiri (gunicorn/uwsgi
+  me-respawn worker). `manage.py analyze_worker` keluar dari loop dan diharapkan di-restart supervisor.
+"""
+from __future__ import annotations
+import gc, logging, os, random, resource, signal, sys, threading, time, tracemalloc
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+log = logging.getLogger(__name__)
+
+_local = threading.local()
+_lock = threading.Lock()
+_stages: Dict[str, Dict[str, float]] = {}
+_inflight = 0
+_recycling = False
+_last_snapshot = 0.0
+
+_SNAP_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+def rss_mb() -> float:
+    """RSS proses saat ini (MB); 0 bila /proc tidak tersedia."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except Exception:
+        return 0.0
+
+
+def _ensure_tracing() -> None:
+    """Mulai tracemalloc sekali; tidak pernah dihentikan per request (baseline harus tetap berlaku)."""
+    if tracemalloc.is_tracing():
+        return
+    with _lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(settings.MEM_TRACE_FRAMES)
+
+
+# ===== Sampling per request / per tahap =====
+
+def begin_request() -> None:
+    global _inflight
+    with _lock:
+        _inflight += 1
+    _local.mark = None
+    if not settings.MEM_TRACE_ENABLED:
+        return
+    _ensure_tracing()
+    if random.random() < settings.MEM_TRACE_SAMPLE_RATE:
+        _local.mark = (tracemalloc.get_traced_memory()[0], rss_mb())
+
+
+def mark(stage: str) -> None:
+    """Catat delta memori sejak mark sebelumnya (no-op bila request tidak disampel)."""
+    prev = getattr(_local, "mark", None)
+    if prev is None:
+        return
+    traced, rss = tracemalloc.get_traced_memory()[0], rss_mb()
+    d_traced_kb, d_rss_kb = (traced - prev[0]) / 1024.0, (rss - prev[1]) * 1e6 / 1024.0
+    with _lock:
+        s = _stages.setdefault(stage, {"n": 0, "traced_kb_sum": 0.0, "traced_kb_max": 0.0, "rss_kb_sum": 0.0})
+        s["n"] += 1
+        s["traced_kb_sum"] += d_traced_kb
+        s["traced_kb_max"] = max(s["traced_kb_max"], d_traced_kb)
+        s["rss_kb_sum"] += d_rss_kb
+    _local.mark = (traced, rss)
+
+
+def end_request() -> None:
+    global _inflight
+    sampled = getattr(_local, "mark", None) is not None
+    mark("response")
+    _local.mark = None
+    with _lock:
+        _inflight -= 1
+    if sampled:
+        _maybe_snapshot()
+    maybe_recycle()
+
+
+def stage_stats() -> Dict[str, Dict[str, float]]:
+    with _lock:
+        out = {}
+        for name, s in _stages.items():
+            n = s["n"] or 1
+            out[name] = {
+                "samples": s["n"],
+                "traced_kb_avg": s["traced_kb_sum"] / n,
+                "traced_kb_max": s["traced_kb_max"],
+                "rss_kb_avg": s["rss_kb_sum"] / n,
+            }
+        return out
+
+
+# ===== Snapshot & diff =====
+
+def snapshot_dir() -> Path:
+    return Path(settings.MEM_SNAPSHOT_DIR)
+
+
+def _maybe_snapshot() -> None:
+    global _last_snapshot
+    now = time.monotonic()
+    with _lock:
+        if now - _last_snapshot < settings.MEM_SNAPSHOT_INTERVAL_S:
+            return
+        _last_snapshot = now
+    try:
+        d = snapshot_dir()
+        d.mkdir(parents=True, exist_ok=True)
+        snap = tracemalloc.take_snapshot().filter_traces(_SNAP_FILTERS)
+        snap.dump(str(d / f"{os.getpid()}-{time.strftime('%Y%m%d%H%M%S')}.tmsnap"))
+        mine = sorted(d.glob(f"{os.getpid()}-*.tmsnap"))
+        for old in mine[1:-max(1, settings.MEM_SNAPSHOT_KEEP - 1)]:  # simpan yang pertama sebagai baseline
+            old.unlink(missing_ok=True)
+    except Exception as e:
+        log.warning("Gagal menyimpan snapshot tracemalloc: %s", e)
+
+
+def list_snapshots(pid: Optional[int] = None) -> List[Path]:
+    pattern = f"{pid}-*.tmsnap" if pid else "*.tmsnap"
+    return sorted(snapshot_dir().glob(pattern), key=lambda p: p.stat().st_mtime)
+
+
+def top_diff(base: tracemalloc.Snapshot, head: tracemalloc.Snapshot, limit: int = 15, key: str = "lineno") -> List[Dict]:
+    """Situs alokasi dengan pertumbuhan terbesar dari base → head."""
+    out = []
+    for st in head.compare_to(base, key)[:limit]:
+        frame = st.traceback[0]
+        out.append({
+            "site": f"{frame.filename}:{frame.lineno}",
+            "size_kb": round(st.size / 1024.0, 1),
+            "size_diff_kb": round(st.size_diff / 1024.0, 1),
+            "count_diff": st.count_diff,
+        })
+    return out
+
+
+def live_diff(limit: int = 15) -> List[Dict]:
+    """
+    Snapshot live proses ini (tracemalloc aktif) atau yang terakhir disimpan vs snapshot
+    tersimpan tertua miliknya (baseline).
+    """
+    snaps = list_snapshots(os.getpid())
+    if not snaps:
+        return []
+    base = tracemalloc.Snapshot.load(str(snaps[0]))
+    if tracemalloc.is_tracing():
+        head = tracemalloc.take_snapshot().filter_traces(_SNAP_FILTERS)
+    elif len(snaps) > 1:
+        head = tracemalloc.Snapshot.load(str(snaps[-1]))
+    else:
+        return []
+    return top_diff(base, head, limit)
+
+
+# ===== Gauge =====
+
+def gauges() -> Dict:
+    out = {
+        "pid": os.getpid(),
+        "rss_mb": round(rss_mb(), 1),
+        # ru_maxrss: KiB di Linux
+        "rss_peak_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 / 1e6, 1),
+        "threads": threading.active_count(),
+        "gc_counts": gc.get_count(),
+        "inflight": _inflight,
+        "recycling": _recycling,
+        "recycle_rss_mb": settings.MEM_RECYCLE_RSS_MB,
+    }
+    if tracemalloc.is_tracing():
+        cur, peak = tracemalloc.get_traced_memory()
+        out["tracemalloc_mb"] = round(cur / 1e6, 1)
+        out["tracemalloc_peak_mb"] = round(peak / 1e6, 1)
+    torch = sys.modules.get("torch")  # jangan impor torch hanya untuk gauge
+    if torch is not None:
+        out["torch_threads"] = torch.get_num_threads()
+        if torch.cuda.is_available():
+            out["torch_cuda_allocated_mb"] = round(torch.cuda.memory_allocated() / 1e6, 1)
+            out["torch_cuda_reserved_mb"] = round(torch.cuda.memory_reserved() / 1e6, 1)
+    return out
+
+
+# ===== Daur ulang worker =====
+
+def should_recycle() -> bool:
+    limit = settings.MEM_RECYCLE_RSS_MB
+    return limit > 0 and rss_mb() > limit
+
+
+def maybe_recycle() -> None:
+    global _recycling
+    if _recycling or not should_recycle():
+        return
+    with _lock:
+        if _recycling:
+            return
+        _recycling = True
+    log.warning("RSS %.0f MB > %s MB; worker %d akan didaur ulang setelah request in-flight selesai.",
+                rss_mb(), settings.MEM_RECYCLE_RSS_MB, os.getpid())
+    threading.Thread(target=_drain_and_exit, name="mem-recycle", daemon=True).start()
+
+
+def _drain_and_exit() -> None:
+    deadline = time.monotonic() + settings.MEM_RECYCLE_DRAIN_S
+    while _inflight > 0 and time.monotonic() < deadline:
+        time.sleep(0.1)
+    try:
+        from . import events
+        events.flush()  # jangan hilangkan log analisis yang masih di buffer
+    except Exception:
+        pass
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+def is_recycling() -> bool:
+    """True sejak daur ulang dipicu: request baru ditolak (503) sampai proses keluar."""
+    return _recycling
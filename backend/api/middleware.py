@@ -0,0 +1,26 @@
+from django.http import JsonResponse
+
+from . import memwatch
+
+
+class MemoryWatchMiddleware:
+    """
+    Hitung request in-flight, sampel memori per tahap (MEM_TRACE_ENABLED) dan daur ulang
+    worker bila RSS melewati MEM_RECYCLE_RSS_MB (lihat api/memwatch.py). Selama worker
+    menunggu in-flight selesai untuk didaur ulang, request baru langsung dibalas 503 sehingga
+    load balancer / klien mengulang ke worker lain.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if memwatch.is_recycling():
+            resp = JsonResponse({"detail": "Worker sedang didaur ulang, coba lagi sebentar."}, status=503)
+            resp["Retry-After"] = "1"
+            return resp
+        memwatch.begin_request()
+        try:
+            return self.get_response(request)
+        finally:
+            memwatch.end_request()
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalysisEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('endpoint', models.CharField(max_length=16)),
+                ('label', models.CharField(blank=True, db_index=True, default='', max_length=64)),
+                ('confidence', models.FloatField(null=True)),
+                ('latency_ms', models.FloatField()),
+                ('ok', models.BooleanField(default=True)),
+                ('prompt', models.TextField(blank=True, default='')),
+                ('model_version', models.CharField(blank=True, default='', max_length=32)),
+                ('created_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
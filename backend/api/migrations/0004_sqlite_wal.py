@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def _journal_mode(schema_editor, mode: str) -> None:
+    conn = schema_editor.connection
+    if conn.vendor != "sqlite":
+        return
+    with conn.cursor() as cur:
+        cur.execute("PRAGMA journal_mode;")
+        if (cur.fetchone() or [""])[0].lower() != mode.lower():
+            cur.execute(f"PRAGMA journal_mode={mode};")
+
+
+def enable_wal(apps, schema_editor):
+    # journal_mode=WAL tersimpan di file DB: cukup diset sekali di sini, bukan tiap koneksi
+    if settings.SQLITE_WAL:
+        _journal_mode(schema_editor, "WAL")
+
+
+def disable_wal(apps, schema_editor):
+    _journal_mode(schema_editor, "DELETE")
+
+
+class Migration(migrations.Migration):
+    # PRAGMA journal_mode tidak bisa diubah di dalam transaksi
+    atomic = False
+
+    dependencies = [
+        ("api", "0003_analysisjob_owner_heartbeat"),
+    ]
+
+    operations = [
+        migrations.RunPython(enable_wal, disable_wal),
+    ]
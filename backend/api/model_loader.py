@@ -1,18 +1,48 @@
 # api/model_loader.py (potongan pengganti fungsi _build_efficientnet_b0 & load)
-import json, os, torch, torch.nn as nn
-from torchvision import models
+"""
+Registry model klasifikasi dengan hot-reload tanpa downtime.
+
+- get_model_and_meta(): kembalikan snapshot aktif (model, class_names, img_size, device).
+  Request yang sedang berjalan memegang referensi snapshot lama sampai selesai.
+- reload_model(): muat checkpoint baru di thread pemanggil (background), smoke test forward
+  pass, lalu tukar snapshot aktif dengan satu assignment. Memori model lama dilepas setelah
+  referensi terakhir hilang (gc + empty_cache).
+- Watcher (MODEL_WATCH_S > 0) memantau mtime/size CKPT_PATH; `manage.py reload_model`
+  memvalidasi checkpoint lalu menyentuh mtime-nya agar semua worker memuat ulang.
+"""
+from __future__ import annotations
+import gc, hashlib, json, logging, os, threading, time
+from typing import TYPE_CHECKING
 from django.conf import settings
 
-_device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-_model = None
-_class_names = None
-_img_size = 224
+if TYPE_CHECKING:  # torch/torchvision diimpor saat model pertama kali dimuat (startup cepat)
+    import torch.nn as nn
+
+log = logging.getLogger(__name__)
+
+_device = None
+
+# snapshot aktif: (model, class_names, img_size, device, version)
+_active = None
+_load_lock = threading.RLock()
+_watcher_started = False
+_last_swap: dict = {}
+
+def _get_device():
+    global _device
+    if _device is None:
+        import torch
+        _device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    return _device
 
 def _build_efficientnet_b0_variant(num_classes: int, nested_head: bool) -> nn.Module:
     """
     nested_head=True  -> cocok utk checkpoint dg key 'classifier.1.1.weight' (double-dropout head)
     nested_head=False -> head klasik: Sequential(Dropout, Linear) langsung di classifier
     """
+    import torch.nn as nn
+    from torchvision import models
+
     m = models.efficientnet_b0(weights=None)
     in_feats = m.classifier[1].in_features
     if nested_head:
@@ -29,43 +59,200 @@ def _build_efficientnet_b0_variant(num_classes: int, nested_head: bool) -> nn.Mo
         )
     return m
 
-def get_model_and_meta():
-    global _model, _class_names, _img_size
-    if _model is not None:
-        return _model, _class_names, _img_size, _device
+def _file_version(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()[:12]
+
+def _rss_mb() -> float:
+    """RSS proses saat ini (MB); 0 bila /proc tidak tersedia."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except Exception:
+        return 0.0
 
-    ckpt_path = settings.CKPT_PATH
-    labels_json = settings.LABELS_JSON
+def _load_checkpoint(ckpt_path: str, labels_json: str):
+    """Muat checkpoint → (model eval di device, class_names, img_size). Tidak menyentuh state global."""
+    import torch
 
     # Gunakan weights_only=False eksplisit (sesuai warning PyTorch)
-    ckpt = torch.load(ckpt_path, map_location=_device, weights_only=False)
+    ckpt = torch.load(ckpt_path, map_location=_get_device(), weights_only=False)
 
     if isinstance(ckpt, dict) and "model_state" in ckpt:
         state = ckpt["model_state"]
-        _class_names = ckpt.get("class_names")
-        if _class_names is None and labels_json and os.path.exists(labels_json):
+        class_names = ckpt.get("class_names")
+        if class_names is None and labels_json and os.path.exists(labels_json):
             with open(labels_json, "r", encoding="utf-8") as f:
-                _class_names = json.load(f)
-        if _class_names is None:
+                class_names = json.load(f)
+        if class_names is None:
             raise RuntimeError("class_names tidak ditemukan di ckpt dan labels.json.")
 
-        _img_size = int(ckpt.get("img_size", 224))
+        img_size = int(ckpt.get("img_size", 224))
 
         # DETEKSI pola key
         has_nested = any(k.startswith("classifier.1.1.") for k in state.keys())
-        _model = _build_efficientnet_b0_variant(len(_class_names), nested_head=has_nested)
+        model = _build_efficientnet_b0_variant(len(class_names), nested_head=has_nested)
 
         # Muat state_dict secara strict (cocokkan arsitektur)
-        _model.load_state_dict(state, strict=True)
+        model.load_state_dict(state, strict=True)
 
     elif hasattr(ckpt, "state_dict"):
         # full-model
-        _model = ckpt
+        model = ckpt
         with open(labels_json, "r", encoding="utf-8") as f:
-            _class_names = json.load(f)
-        _img_size = getattr(_model, "img_size", 224)
+            class_names = json.load(f)
+        img_size = getattr(model, "img_size", 224)
     else:
         raise RuntimeError("Format checkpoint tidak dikenali.")
 
-    _model = _model.to(_device).eval()
-    return _model, _class_names, _img_size, _device
+    return model.to(_get_device()).eval(), class_names, img_size
+
+def _smoke_test(model: nn.Module, num_classes: int, img_size: int) -> None:
+    """Forward pass dummy: bentuk output harus (1, num_classes) & semua nilai finite."""
+    import torch
+
+    with torch.inference_mode():
+        out = model(torch.zeros(1, 3, img_size, img_size, device=_get_device()))
+    if tuple(out.shape) != (1, num_classes):
+        raise RuntimeError(f"Smoke test gagal: output {tuple(out.shape)} != (1, {num_classes})")
+    if not torch.isfinite(out).all():
+        raise RuntimeError("Smoke test gagal: output mengandung NaN/Inf.")
+
+def validate_checkpoint(ckpt_path: str = None) -> dict:
+    """Muat + smoke test tanpa mengaktifkan (dipakai management command)."""
+    ckpt_path = ckpt_path or settings.CKPT_PATH
+    model, class_names, img_size = _load_checkpoint(ckpt_path, settings.LABELS_JSON)
+    _smoke_test(model, len(class_names), img_size)
+    return {"version": _file_version(ckpt_path), "classes": len(class_names), "img_size": img_size}
+
+def reload_model(ckpt_path: str = None) -> dict:
+    """
+    Muat checkpoint baru & tukar secara atomik. Jika gagal, model lama tetap aktif
+    dan exception diteruskan. Return metrik swap (waktu & memori).
+    """
+    global _active, _last_swap
+    import torch
+
+    ckpt_path = ckpt_path or settings.CKPT_PATH
+    device = _get_device()
+    rss_before = _rss_mb()
+    if device.type == "cuda":
+        torch.cuda.reset_peak_memory_stats()
+    t0 = time.perf_counter()
+
+    with _load_lock:
+        version = _file_version(ckpt_path)
+        model, class_names, img_size = _load_checkpoint(ckpt_path, settings.LABELS_JSON)
+        _smoke_test(model, len(class_names), img_size)
+        load_ms = (time.perf_counter() - t0) * 1000.0
+        rss_peak = _rss_mb()  # model lama + baru hidup bersamaan di titik ini
+
+        old = _active
+        t_swap = time.perf_counter()
+        _active = (model, class_names, img_size, device, version)
+        swap_ms = (time.perf_counter() - t_swap) * 1000.0
+
+    # lepas referensi model lama; request in-flight masih memegang snapshot-nya sendiri
+    del old
+    gc.collect()
+    if device.type == "cuda":
+        torch.cuda.empty_cache()
+
+    _last_swap = {
+        "version": version,
+        "load_ms": round(load_ms, 1),
+        "swap_ms": round(swap_ms, 3),
+        "rss_before_mb": round(rss_before, 1),
+        "rss_peak_mb": round(rss_peak, 1),
+        "rss_after_mb": round(_rss_mb(), 1),
+    }
+    if device.type == "cuda":
+        _last_swap["cuda_peak_mb"] = round(torch.cuda.max_memory_allocated() / 1e6, 1)
+    log.info("Model aktif: %s %s", version, _last_swap)
+    return dict(_last_swap)
+
+_shadow = None
+_shadow_lock = threading.Lock()
+
+def get_shadow_model():
+    """
+    Model shadow dari SHADOW_CKPT_PATH (lazy, sekali per proses) untuk A/B di background.
+    Return (model, class_names, img_size, device, version) atau None bila tidak dikonfigurasi/gagal.
+    """
+    global _shadow
+    path = settings.SHADOW_CKPT_PATH
+    if not path:
+        return None
+    if _shadow is None:
+        with _shadow_lock:
+            if _shadow is None:
+                try:
+                    model, class_names, img_size = _load_checkpoint(path, settings.LABELS_JSON)
+                    _smoke_test(model, len(class_names), img_size)
+                    _shadow = (model, class_names, img_size, _get_device(), _file_version(path))
+                except Exception as e:
+                    log.error("Gagal memuat shadow model %s: %s", path, e)
+                    _shadow = False  # jangan coba ulang di tiap request
+    return _shadow or None
+
+def loaded_class_names():
+    """Daftar kelas model aktif, atau None bila model belum dimuat (tidak memicu load)."""
+    snap = _active
+    return list(snap[1]) if snap else None
+
+def model_status() -> dict:
+    return {
+        "version": _active[4] if _active else None,
+        "device": str(_active[3]) if _active else None,
+        "last_swap": dict(_last_swap),
+    }
+
+def _ckpt_signature(path: str):
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+def _watch_loop(interval_s: float) -> None:
+    path = settings.CKPT_PATH
+    loaded_sig = _ckpt_signature(path)
+    pending = None
+    while True:
+        time.sleep(interval_s)
+        sig = _ckpt_signature(path)
+        if sig is None or sig == loaded_sig:
+            pending = None
+            continue
+        if sig != pending:
+            # tunggu satu interval lagi: file mungkin masih ditulis
+            pending = sig
+            continue
+        try:
+            reload_model(path)
+        except Exception as e:
+            log.error("Hot-reload checkpoint gagal, tetap pakai model lama: %s", e)
+        loaded_sig = sig
+        pending = None
+
+def _ensure_watcher() -> None:
+    global _watcher_started
+    interval = settings.MODEL_WATCH_S
+    if interval <= 0 or _watcher_started:
+        return
+    _watcher_started = True
+    threading.Thread(target=_watch_loop, args=(interval,), name="ckpt-watcher", daemon=True).start()
+
+def get_model_and_meta():
+    snap = _active
+    if snap is None:
+        with _load_lock:
+            if _active is None:
+                reload_model()
+            snap = _active
+        _ensure_watcher()
+    model, class_names, img_size, device, _ = snap
+    return model, class_names, img_size, device
@@ -1,3 +1,72 @@
+import uuid
+
 from django.db import models
 
-# Create your models here.
+
+class AnalysisJob(models.Model):
+    """Job /analyze mode async; tabel ini sekaligus menjadi antrean lokal (tanpa broker)."""
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_ERROR = "error"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_ERROR, "Error"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+    stage = models.CharField(max_length=32, blank=True, default="")
+    progress = models.FloatField(default=0.0)
+    prompt = models.TextField(blank=True, default="")
+    image = models.BinaryField(null=True)  # dikosongkan setelah selesai
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # worker yang memegang job (host:pid:thread) + detak terakhirnya; job diantrekan ulang hanya
+    # bila detaknya berhenti (worker mati), bukan karena analisisnya lambat
+    owner = models.CharField(max_length=128, blank=True, default="")
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["created_at"]
+
+    def __str__(self):
+        return f"{self.id} [{self.status}]"
+
+    def as_status(self) -> dict:
+        out = {
+            "job_id": str(self.id),
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+        }
+        if self.status == self.STATUS_DONE:
+            out["result"] = self.result
+        elif self.status == self.STATUS_ERROR:
+            out["error"] = self.error
+        return out
+
+
+class AnalysisEvent(models.Model):
+    """Satu baris per analisis (prediksi, latensi, prompt) untuk capacity planning & monitoring model."""
+
+    endpoint = models.CharField(max_length=16)  # analyze | classify | explain | job
+    label = models.CharField(max_length=64, blank=True, default="", db_index=True)
+    confidence = models.FloatField(null=True)
+    latency_ms = models.FloatField()
+    ok = models.BooleanField(default=True)
+    prompt = models.TextField(blank=True, default="")
+    model_version = models.CharField(max_length=32, blank=True, default="")
+    created_at = models.DateTimeField(db_index=True)  # diisi saat event terjadi, bukan saat flush
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.created_at:%Y-%m-%d %H:%M:%S} {self.endpoint} {self.label} {self.latency_ms:.0f}ms"
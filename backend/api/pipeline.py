@@ -0,0 +1,102 @@
+# api/pipeline.py
+"""
+Pipeline analisis yang dipakai bersama oleh endpoint sinkron (/analyze) dan worker job.
+"""
+from __future__ import annotations
+import hashlib, secrets
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from PIL import Image
+
+from . import memwatch
+from .inference import predict_image
+from .roi import crop_nail_roi
+from .llm import explain_prediction
+from .uploads import ImageDecodeError, decode_image  # noqa: F401  (re-export untuk views/jobs)
+
+
+_TTA_MODES = {"always": True, "never": False, "auto": "auto"}
+
+
+def classify_image(pil: Image.Image) -> Dict:
+    roi = None
+    if settings.ROI_CROP:
+        pil, roi = crop_nail_roi(pil)
+    pred = predict_image(pil, tta=_TTA_MODES.get(settings.INFERENCE_TTA, True))
+    out = {"prediction": pred["label"], "confidence": pred["confidence"], "probs": pred["probs"]}
+    if roi is not None:
+        out["roi"] = roi  # box crop di koordinat upload (None = tidak di-crop) + biaya ms
+    memwatch.mark("classify")
+    return out
+
+
+def explain(label: str, conf: float, probs: Dict, user_prompt: str) -> Dict:
+    followup: Dict = {}
+    explanation = explain_prediction(label, conf, probs, user_prompt, followup=followup)
+    out = {"explanation_md": explanation}  # markdown siap render di frontend
+    if followup.get("handle"):
+        # LLM melewati anggaran → explanation_md adalah fallback; jawaban penuh via /api/followup/<handle>
+        out["followup_handle"] = followup["handle"]
+    memwatch.mark("explain")
+    return out
+
+
+# ===== State analisis bersama (classify → explain) =====
+# Disimpan di Django cache (CACHES) agar bisa lintas worker bila backend cache-nya bersama.
+
+def _state_key(token: str) -> str:
+    return f"analysis:{token}"
+
+
+def _explain_key(token: str, user_prompt: str) -> str:
+    digest = hashlib.sha1((user_prompt or "").strip().encode("utf-8")).hexdigest()
+    return f"analysis:{token}:explain:{digest}"
+
+
+def store_analysis(pred: Dict) -> str:
+    """Simpan hasil klasifikasi, return token berumur pendek (ANALYSIS_TOKEN_TTL_S)."""
+    token = secrets.token_urlsafe(16)
+    cache.set(_state_key(token), pred, timeout=settings.ANALYSIS_TOKEN_TTL_S)
+    return token
+
+
+def load_analysis(token: str) -> Optional[Dict]:
+    return cache.get(_state_key(token)) if token else None
+
+
+def explain_stored(token: str, user_prompt: str) -> Optional[Dict]:
+    """
+    Penjelasan untuk hasil klasifikasi yang tersimpan; di-cache per (token, prompt).
+    Return None bila token tidak dikenal/kedaluwarsa.
+    """
+    pred = load_analysis(token)
+    if pred is None:
+        return None
+    key = _explain_key(token, user_prompt)
+    out = cache.get(key)
+    if out is None:
+        out = explain(pred["prediction"], pred["confidence"], pred["probs"], user_prompt)
+        if not out.get("followup_handle"):
+            # jangan cache fallback akibat timeout; pertanyaan ulang sebaiknya mencoba LLM lagi
+            cache.set(key, out, timeout=settings.ANALYSIS_TOKEN_TTL_S)
+    return {**pred, **out}
+
+
+def analyze_image(
+    pil: Image.Image,
+    user_prompt: str,
+    on_stage: Optional[Callable[[str, float], None]] = None,
+) -> Dict:
+    """
+    Klasifikasi + penjelasan. on_stage(stage, progress) dipanggil di tiap tahap
+    (dipakai worker job untuk progress per tahap).
+    """
+    if on_stage:
+        on_stage("classifying", 0.1)
+    pred = classify_image(pil)
+
+    if on_stage:
+        on_stage("explaining", 0.5)
+    return {**pred, **explain(pred["prediction"], pred["confidence"], pred["probs"], user_prompt)}
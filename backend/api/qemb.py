@@ -0,0 +1,197 @@
+# api/qemb.py
+"""
+Embedding terkuantisasi + pencarian dua tahap (kandidat cepat → rescoring float32 eksak).
+
+Disimpan berdampingan dengan embedding asli:
+  - int8 simetris per vektor  : codes (N, D) int8 + scale (N,) float32  → ~4× lebih kecil
+  - biner (tanda tiap dimensi): bits (N, D/8) uint8, jarak Hamming      → ~32× lebih kecil
+Tahap 1 memindai kode (int8 atau Hamming) untuk k × RESCORE_FACTOR kandidat; tahap 2 menghitung
+ulang kosinus eksak hanya untuk kandidat dari matriks float32 (memmap → baris lain tidak
+perlu berada di RAM).
+
+Semua array (termasuk float32) ada dalam satu <koleksi>.qemb.npz tanpa kompresi yang
+dipublikasikan atomik (tmp + replace), sehingga kode & embedding tidak pernah berasal dari
+build yang berbeda; member float32 di-mmap langsung dari dalam arsip.
+
+Dibangun oleh scripts/build_index.py, scripts/build_scholar_index.py (sidecar di rag_index/)
+dan scripts/compile_kb_bundle.py (array di dalam bundle).
+"""
+from __future__ import annotations
+import os, struct, zipfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+MODES = ("off", "int8", "binary")
+
+# mode pencarian dense ("off" = float32 penuh seperti sebelumnya) & kelipatan kandidat tahap 1
+SEARCH_MODE = os.getenv("RAG_QUANT_SEARCH", "off").strip().lower()
+RESCORE_FACTOR = int(os.getenv("RAG_RESCORE_FACTOR", "4"))
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def qemb_path(index_dir: Path, collection: str) -> Path:
+    """Satu arsip .npz: ids, kode terkuantisasi & embedding float32 asli (member "emb")."""
+    return Path(index_dir) / f"{collection}.qemb.npz"
+
+
+def f32_path(index_dir: Path, collection: str) -> Path:
+    """Format lama: embedding float32 di file .npy terpisah (hanya dibaca bila arsip tanpa "emb")."""
+    return Path(index_dir) / f"{collection}.f32.npy"
+
+
+def _npz_memmap(path: Path, member: str) -> np.ndarray:
+    """
+    Member .npy tanpa kompresi di dalam .npz sebagai memmap read-only
+    (np.load mengabaikan mmap_mode untuk .npz). Member terkompresi dibaca biasa.
+    """
+    with zipfile.ZipFile(path) as zf:
+        info = zf.getinfo(member + ".npy")
+        if info.compress_type != zipfile.ZIP_STORED:
+            with zf.open(info) as f:
+                return np.lib.format.read_array(f, allow_pickle=False)
+    with open(path, "rb") as f:
+        f.seek(info.header_offset)
+        local = f.read(30)  # local file header ZIP; nama & extra field mengikuti
+        name_len, extra_len = struct.unpack("<HH", local[26:30])
+        f.seek(info.header_offset + 30 + name_len + extra_len)
+        version = np.lib.format.read_magic(f)
+        read_header = (np.lib.format.read_array_header_1_0 if version == (1, 0)
+                       else np.lib.format.read_array_header_2_0)
+        shape, fortran, dtype = read_header(f)
+        offset = f.tell()
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape, order="F" if fortran else "C")
+
+
+def quantize_int8(emb: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    scale = np.abs(emb).max(axis=1) / 127.0
+    scale[scale == 0] = 1.0
+    codes = np.clip(np.rint(emb / scale[:, None]), -127, 127).astype(np.int8)
+    return codes, scale.astype(np.float32)
+
+
+def binarize(emb: np.ndarray) -> np.ndarray:
+    return np.packbits(emb > 0, axis=1)
+
+
+class QuantizedIndex:
+    def __init__(self, ids: np.ndarray, emb: np.ndarray, codes: np.ndarray, scale: np.ndarray, bits: np.ndarray):
+        self.ids = ids
+        self.emb = emb  # float32 asli (boleh memmap), hanya dibaca untuk kandidat
+        self.codes = codes
+        self.scale = scale
+        self.bits = bits
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, ids, embeddings) -> "QuantizedIndex":
+        emb = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32))
+        codes, scale = quantize_int8(emb)
+        return cls(np.asarray(list(ids), dtype=str), emb, codes, scale, binarize(emb))
+
+    def save(self, index_dir: Path, collection: str) -> None:
+        qp = qemb_path(index_dir, collection)
+        qp.parent.mkdir(parents=True, exist_ok=True)
+        tmp = qp.with_name(qp.name + ".tmp.npz")
+        # np.savez tanpa kompresi → member "emb" bisa di-mmap saat load
+        np.savez(tmp, ids=self.ids, codes=self.codes, scale=self.scale, bits=self.bits,
+                 emb=np.ascontiguousarray(self.emb, dtype=np.float32))
+        tmp.replace(qp)  # atomic: satu file berisi seluruh array
+        f32_path(index_dir, collection).unlink(missing_ok=True)  # sisa format lama
+
+    @classmethod
+    def load(cls, index_dir: Path, collection: str) -> "QuantizedIndex":
+        qp = qemb_path(index_dir, collection)
+        with np.load(str(qp), allow_pickle=False) as z:
+            ids, codes, scale, bits = z["ids"], z["codes"], z["scale"], z["bits"]
+            has_emb = "emb" in z.files
+        if has_emb:
+            emb = _npz_memmap(qp, "emb")
+        else:
+            emb = np.load(str(f32_path(index_dir, collection)), mmap_mode="r")
+        return cls(ids, emb, codes, scale, bits)
+
+    def candidates(self, q: np.ndarray, n: int, mode: str) -> np.ndarray:
+        """Tahap 1: indeks n kandidat teratas menurut kode terkuantisasi (tanpa urutan)."""
+        n = min(n, len(self.ids))
+        if mode == "binary":
+            qbits = np.packbits(q > 0)
+            dist = _POPCOUNT[np.bitwise_xor(self.bits, qbits)].sum(axis=1, dtype=np.int32)
+            return np.argpartition(dist, n - 1)[:n]
+        approx = (self.codes @ q) * self.scale
+        return np.argpartition(-approx, n - 1)[:n]
+
+    def search(self, q, k: int, mode: str = "int8", rescore_factor: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (indeks, kosinus eksak) top-k terurut menurun."""
+        q = np.asarray(q, dtype=np.float32)
+        if len(self.ids) == 0 or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        k = min(k, len(self.ids))
+        if mode == "off":
+            cand = np.arange(len(self.ids))
+        else:
+            cand = np.sort(self.candidates(q, k * max(1, rescore_factor), mode))  # baca memmap berurutan
+        sims = np.asarray(self.emb[cand], dtype=np.float32) @ q
+        top = np.argsort(-sims)[:k]
+        return cand[top], sims[top]
+
+    def memory_report(self) -> Dict[str, float]:
+        return {
+            "n": len(self.ids),
+            "float32_mb": self.emb.nbytes / 1e6,
+            "int8_mb": (self.codes.nbytes + self.scale.nbytes) / 1e6,
+            "binary_mb": self.bits.nbytes / 1e6,
+        }
+
+
+def recall_at_k(index: QuantizedIndex, queries: np.ndarray, k: int, mode: str, rescore_factor: int) -> float:
+    """Porsi top-k eksak (float32 brute force) yang ditemukan kembali oleh pencarian dua tahap."""
+    hit = 0
+    for q in queries:
+        exact, _ = index.search(q, k, mode="off")
+        got, _ = index.search(q, k, mode=mode, rescore_factor=rescore_factor)
+        hit += len(set(exact.tolist()) & set(got.tolist()))
+    return hit / float(len(queries) * min(k, len(index)))
+
+
+class QuantizedCollection:
+    """
+    Adaptor berbentuk koleksi Chroma: query() lewat QuantizedIndex, get() diteruskan ke
+    koleksi Chroma aslinya (teks & metadata tetap satu sumber).
+    """
+
+    def __init__(self, col, index: QuantizedIndex, mode: str = SEARCH_MODE, rescore_factor: int = RESCORE_FACTOR):
+        self.col = col
+        self.index = index
+        self.mode = mode
+        self.rescore_factor = rescore_factor
+
+    def query(self, query_embeddings, n_results: int = 10) -> Dict:
+        idx, sims = self.index.search(query_embeddings[0], n_results, self.mode, self.rescore_factor)
+        ids: List[str] = [str(self.index.ids[i]) for i in idx]
+        got = self.col.get(ids=ids) if ids else {"ids": [], "documents": [], "metadatas": []}
+        pos = {doc_id: i for i, doc_id in enumerate(got.get("ids") or [])}
+        docs, metas = got.get("documents") or [], got.get("metadatas") or []
+        keep = [(doc_id, float(s)) for doc_id, s in zip(ids, sims) if doc_id in pos]
+        return {
+            "ids": [[d for d, _ in keep]],
+            "documents": [[docs[pos[d]] for d, _ in keep]],
+            "metadatas": [[metas[pos[d]] for d, _ in keep]],
+            "distances": [[2.0 - 2.0 * s for _, s in keep]],
+        }
+
+    def get(self, ids: List[str]) -> Dict:
+        return self.col.get(ids=ids)
+
+
+def maybe_load(index_dir: Path, collection: str) -> Optional[QuantizedIndex]:
+    if not qemb_path(index_dir, collection).exists():
+        return None
+    try:
+        return QuantizedIndex.load(index_dir, collection)
+    except FileNotFoundError:  # format lama tanpa .f32.npy pasangannya
+        return None
@@ -1,12 +1,23 @@
 # api/rag.py
 from __future__ import annotations
-import os
+import logging, os
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
 
-import chromadb
 import numpy as np
-from sentence_transformers import SentenceTransformer
+
+from . import infer_pool
+from .bm25 import BM25Index, bm25_path
+from .encoder import build_encoder
+from . import qemb
+from .kb_bundle import EMB_MODEL_NAME, active_bundle
+from .singleflight import SingleFlight, make_key
+
+log = logging.getLogger(__name__)
+
+if TYPE_CHECKING:  # chromadb & sentence_transformers berat → diimpor saat pertama dipakai
+    import chromadb
+    from sentence_transformers import SentenceTransformer
 
 # ===== Konfigurasi dasar =====
 BASE_DIR = Path(__file__).resolve().parents[1]
@@ -18,59 +29,140 @@ INDEX_DIR = Path(os.getenv("RAG_INDEX_DIR", str(BASE_DIR / "rag_index")))
 COLL_LOCAL   = os.getenv("RAG_COLL_LOCAL", "nail_kb")
 COLL_SCHOLAR = os.getenv("RAG_COLL_SCHOLAR", "nail_kb_scholar")
 
-# Model embedding lokal (harus sama saat build index)
-EMB_MODEL_NAME = os.getenv("EMB_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
+# Model embedding lokal (harus sama saat build index): EMB_MODEL_NAME, didefinisikan di kb_bundle
+
+# Backend encoder query: "torch" (default) | "int8" | "onnx" (lihat api/encoder.py)
+EMB_BACKEND = os.getenv("RAG_EMB_BACKEND", "torch").strip().lower()
+ONNX_PATH = Path(os.getenv("RAG_ONNX_PATH", str(BASE_DIR / "models" / "minilm.onnx")))
+
+# Mode retriever: "hybrid" (BM25 + dense, RRF) atau "multi" (ekspansi multi-varian lama)
+RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "hybrid").strip().lower()
+RRF_K = int(os.getenv("RAG_RRF_K", "60"))
 
 # ===== Lazy singletons =====
-_model: Optional[SentenceTransformer] = None
-_client: Optional[chromadb.ClientAPI] = None
+_model: Optional["SentenceTransformer"] = None
+_encoder = None
+_client: Optional["chromadb.ClientAPI"] = None
 _col_local = None
 _col_scholar = None
+_bm25: Dict[str, Optional[BM25Index]] = {}
 
 
-def _get_model() -> SentenceTransformer:
+def _get_model() -> "SentenceTransformer":
     """Lazy-load SentenceTransformer dengan konfigurasi default."""
     global _model
     if _model is None:
+        from sentence_transformers import SentenceTransformer
         _model = SentenceTransformer(EMB_MODEL_NAME)  # otomatis pilih CPU/GPU yang tersedia
     return _model
 
 
-def _get_client() -> chromadb.ClientAPI:
+def _get_encoder():
+    """Encoder query sesuai EMB_BACKEND (fallback ke torch bila backend tidak tersedia)."""
+    global _encoder
+    if _encoder is None:
+        _encoder = build_encoder(EMB_BACKEND, _get_model(), ONNX_PATH)
+    return _encoder
+
+
+def _get_client() -> "chromadb.ClientAPI":
     """Lazy-init Chroma PersistentClient pada INDEX_DIR."""
     global _client
     if _client is None:
+        import chromadb
         INDEX_DIR.mkdir(exist_ok=True, parents=True)
         _client = chromadb.PersistentClient(path=str(INDEX_DIR))
     return _client
 
 
 def _get_collections():
-    """Ambil (local, scholar) collection, dibuat jika belum ada."""
+    """
+    Ambil (local, scholar) collection, dibuat jika belum ada.
+    Bila bundle KB aktif (api/kb_bundle.py), kembalikan adaptor koleksi dari bundle.
+    """
     global _col_local, _col_scholar
+    bundle = active_bundle()
+    if bundle is not None:
+        return bundle.collections[COLL_LOCAL], bundle.collections[COLL_SCHOLAR]
     client = _get_client()
     if _col_local is None:
-        _col_local = client.get_or_create_collection(COLL_LOCAL)
+        _col_local = _maybe_quantized(client.get_or_create_collection(COLL_LOCAL), COLL_LOCAL)
     if _col_scholar is None:
-        _col_scholar = client.get_or_create_collection(COLL_SCHOLAR)
+        _col_scholar = _maybe_quantized(client.get_or_create_collection(COLL_SCHOLAR), COLL_SCHOLAR)
     return _col_local, _col_scholar
 
 
+def _maybe_quantized(col, name: str):
+    """Bungkus koleksi Chroma dengan pencarian dua tahap bila RAG_QUANT_SEARCH aktif & sidecar ada."""
+    if qemb.SEARCH_MODE == "off":
+        return col
+    index = qemb.maybe_load(INDEX_DIR, name)
+    return qemb.QuantizedCollection(col, index) if index is not None else col
+
+
+def _get_bm25(collection: str) -> Optional[BM25Index]:
+    """Lazy-load indeks BM25 milik koleksi; None bila belum dibangun."""
+    bundle = active_bundle()
+    if bundle is not None:
+        return bundle.bm25.get(collection)
+    if collection not in _bm25:
+        path = bm25_path(INDEX_DIR, collection)
+        _bm25[collection] = BM25Index.load(path) if path.exists() else None
+    return _bm25[collection]
+
+
+def _index_snapshot():
+    """
+    (col_local, col_sch, bm25_local, bm25_sch) dari SATU sumber yang sama,
+    agar hot-swap bundle di tengah request tidak mencampur dua versi index.
+    """
+    bundle = active_bundle()
+    if bundle is not None:
+        return (bundle.collections[COLL_LOCAL], bundle.collections[COLL_SCHOLAR],
+                bundle.bm25.get(COLL_LOCAL), bundle.bm25.get(COLL_SCHOLAR))
+    col_local, col_sch = _get_collections()
+    return col_local, col_sch, _get_bm25(COLL_LOCAL), _get_bm25(COLL_SCHOLAR)
+
+
+def index_version() -> str:
+    """
+    Sidik versi index (mtime+size chroma.sqlite3 & file BM25) — berubah setiap rebuild.
+    Dipakai cache hilir untuk membuang hasil yang dibangun dari index lama.
+    """
+    bundle = active_bundle()
+    if bundle is not None:
+        return f"bundle:{bundle.version}"
+    parts: List[str] = []
+    for path in (
+        INDEX_DIR / "chroma.sqlite3",
+        bm25_path(INDEX_DIR, COLL_LOCAL), bm25_path(INDEX_DIR, COLL_SCHOLAR),
+        qemb.qemb_path(INDEX_DIR, COLL_LOCAL), qemb.qemb_path(INDEX_DIR, COLL_SCHOLAR),
+    ):
+        try:
+            st = path.stat()
+            parts.append(f"{st.st_mtime_ns}:{st.st_size}")
+        except OSError:
+            parts.append("-")
+    return "|".join(parts)
+
+
 def reset_index_cache() -> None:
     """Reset cache model/klien/collection (dipakai saat rebuild index)."""
-    global _model, _client, _col_local, _col_scholar
+    global _model, _encoder, _client, _col_local, _col_scholar
     _model = None
+    _encoder = None
     _client = None
     _col_local = None
     _col_scholar = None
+    _bm25.clear()
 
 
 # ===== Embedding & retrieval helpers =====
 def embed(texts: List[str]) -> np.ndarray:
-    """Return normalized embeddings (N, D)."""
-    model = _get_model()
-    vecs = model.encode(texts, batch_size=32, normalize_embeddings=True)
-    return np.asarray(vecs)
+    """Return normalized embeddings (N, D). Di pool proses inferensi bila INFER_POOL_WORKERS > 0."""
+    if infer_pool.enabled():
+        return infer_pool.embed(texts)
+    return _get_encoder().encode(texts, batch_size=32)
 
 
 def _pack_query_result(out: dict, bucket_tag: str) -> List[Dict]:
@@ -93,6 +185,7 @@ def _pack_query_result(out: dict, bucket_tag: str) -> List[Dict]:
             "label": meta.get("label"),
             "citation": meta.get("citation"),  # hanya ada di scholar
             "bucket": bucket_tag,              # "L" lokal, "S" scholar
+            "n_tokens": meta.get("n_tokens"),  # dihitung saat build index
         }
         # Jika Chroma mengembalikan distance, simpan sebagai score (kecil = lebih mirip untuk cosine)
         if i < len(dists):
@@ -107,8 +200,7 @@ def retrieve(query: str, k: int = 4) -> List[Dict]:
     Ambil top-k dari koleksi lokal saja (kompatibel dengan versi sebelumnya).
     Return: list[{text, source, id}]
     """
-    client = _get_client()
-    col = client.get_or_create_collection(COLL_LOCAL)
+    col, _ = _get_collections()  # bundle KB / pencarian terkuantisasi sama seperti retrieve_multi
 
     qvec = embed([query])[0].tolist()
     out = col.query(query_embeddings=[qvec], n_results=k)
@@ -230,6 +322,85 @@ def _merge_hits(*hit_lists: List[List[Dict]]) -> List[Dict]:
     return merged
 
 
+def _rrf_fuse(*rankings: List[str], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """Reciprocal-rank fusion: skor(id) = Σ 1 / (k + rank)."""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda kv: kv[1], reverse=True)
+
+
+def _hybrid_bucket(
+    col,
+    bm25: Optional[BM25Index],
+    bucket_tag: str,
+    dense_vec: List[float],
+    sparse_query: str,
+    k: int,
+) -> List[Dict]:
+    """
+    Satu query dense + satu query BM25 untuk satu koleksi, digabung dengan RRF.
+    Dokumen yang hanya ditemukan BM25 diambil via col.get().
+    """
+    depth = max(k * 3, 8)
+    dense = _pack_query_result(col.query(query_embeddings=[dense_vec], n_results=depth), bucket_tag)
+    by_id: Dict[str, Dict] = {h["id"]: h for h in dense}
+
+    sparse_ids = [doc_id for doc_id, _ in bm25.search(sparse_query, k=depth)] if bm25 else []
+
+    fused = _rrf_fuse([h["id"] for h in dense], sparse_ids)[:k]
+
+    missing = [doc_id for doc_id, _ in fused if doc_id not in by_id]
+    if missing:
+        got = col.get(ids=missing)
+        docs = got.get("documents") or []
+        metas = got.get("metadatas") or []
+        for i, doc_id in enumerate(got.get("ids") or []):
+            meta = (metas[i] if i < len(metas) else None) or {}
+            by_id[doc_id] = {
+                "text": docs[i] if i < len(docs) else "",
+                "source": meta.get("source", "unknown"),
+                "id": doc_id,
+                "label": meta.get("label"),
+                "citation": meta.get("citation"),
+                "bucket": bucket_tag,
+                "n_tokens": meta.get("n_tokens"),
+            }
+
+    results: List[Dict] = []
+    for doc_id, rrf in fused:
+        h = by_id.get(doc_id)
+        if h is None:
+            continue  # id basi (BM25 lebih baru/lama dari koleksi)
+        results.append({**h, "rrf": rrf})
+    return results
+
+
+def _sparse_query(prompt: str, prefer_label: Optional[str]) -> str:
+    """Query BM25: prompt + alias label (alias murah di jalur leksikal, tanpa embed tambahan)."""
+    parts = [(prompt or "").strip()]
+    if prefer_label:
+        bundle = active_bundle()
+        aliases = bundle.aliases.get("label", _LABEL_ALIASES) if bundle is not None else _LABEL_ALIASES
+        parts.extend(aliases.get(prefer_label, []))
+    return " ".join(p for p in parts if p) or "kuku nail"
+
+
+_retrieval_flight = SingleFlight("retrieval")
+_no_bm25_warned: Optional[str] = None
+
+
+def _warn_no_bm25() -> None:
+    """Sekali per versi index."""
+    global _no_bm25_warned
+    version = index_version()
+    if _no_bm25_warned != version:
+        _no_bm25_warned = version
+        log.warning("Indeks BM25 tidak ditemukan di %s; RAG_RETRIEVAL_MODE=hybrid jatuh ke mode multi. "
+                    "Bangun ulang index (build_index.py / build_scholar_index.py).", INDEX_DIR)
+
+
 def retrieve_multi_smart(
     prompt: str,
     prefer_label: Optional[str] = None,
@@ -238,13 +409,68 @@ def retrieve_multi_smart(
     max_total: int = 8,
 ) -> List[Dict]:
     """
-    Retrieval peka terhadap variasi pertanyaan user:
+    Seperti _retrieve_multi_smart, tetapi request konkuren dengan query identik (terhadap
+    versi index yang sama) berbagi satu retrieval yang sedang berjalan (single-flight).
+    """
+    key = make_key(index_version(), RETRIEVAL_MODE, prompt, prefer_label, k_local_each, k_sch_each, max_total)
+    hits = _retrieval_flight.do(
+        key, lambda: _retrieve_multi_smart(prompt, prefer_label, k_local_each, k_sch_each, max_total),
+    )
+    return [dict(h) for h in hits]  # salinan per pemanggil: hasil dibagi antar request
+
+
+def _retrieve_multi_smart(
+    prompt: str,
+    prefer_label: Optional[str],
+    k_local_each: int,
+    k_sch_each: int,
+    max_total: int,
+) -> List[Dict]:
+    """
+    Retrieval peka terhadap variasi pertanyaan user.
+
+    Mode "hybrid" (default, RAG_RETRIEVAL_MODE):
+      - 1x embed query (dense) + 1x BM25 (sparse, diperluas alias label)
+      - per koleksi digabung dengan reciprocal-rank fusion
+    Mode "multi" (lama):
       - bikin beberapa varian query (ID/EN/sinonim/label-aware)
       - untuk tiap varian → ambil top-k lokal & scholar
       - gabungkan & dedup → ambil N teratas
 
-    Return elemen: {text, source, id, label?, citation?, bucket 'L'|'S', score?}
+    Return elemen: {text, source, id, label?, citation?, bucket 'L'|'S', n_tokens?, score?, rrf?}
     """
+    if RETRIEVAL_MODE == "multi":
+        return _retrieve_multi_variants(prompt, prefer_label, k_local_each, k_sch_each, max_total)
+
+    col_local, col_sch, bm25_local, bm25_sch = _index_snapshot()
+    if bm25_local is None or bm25_sch is None:
+        # index lama tanpa *.bm25.npz: hybrid hanya akan jadi satu query dense per koleksi,
+        # lebih buruk dari ekspansi multi-varian → pakai jalur multi sampai index dibangun ulang
+        _warn_no_bm25()
+        return _retrieve_multi_variants(prompt, prefer_label, k_local_each, k_sch_each, max_total)
+    q = (prompt or "").strip() or "kuku nail"
+    qvec = embed([q])[0].tolist()
+    sparse_q = _sparse_query(prompt, prefer_label)
+
+    # kedalaman per bucket setara jumlah unik yang biasanya dihasilkan mode multi
+    local_hits = _hybrid_bucket(col_local, bm25_local, "L", qvec, sparse_q, k_local_each * 2)
+    schol_hits = _hybrid_bucket(col_sch, bm25_sch, "S", qvec, sparse_q, k_sch_each * 2)
+
+    if prefer_label:
+        schol_hits.sort(key=lambda r: (r.get("label") == prefer_label), reverse=True)
+
+    # lokal dulu agar [Lx] konsisten
+    return (local_hits + schol_hits)[:max_total]
+
+
+def _retrieve_multi_variants(
+    prompt: str,
+    prefer_label: Optional[str],
+    k_local_each: int,
+    k_sch_each: int,
+    max_total: int,
+) -> List[Dict]:
+    """Jalur lama: embed tiap varian query (maks 10) lalu merge — dipertahankan untuk pembanding."""
     variants = _build_query_variants(prompt, prefer_label)
 
     col_local, col_sch = _get_collections()
@@ -0,0 +1,121 @@
+# api/roi.py
+"""
+Tahap ROI opsional sebelum klasifikasi: cari area kuku di salinan kecil gambar lalu crop.
+
+Heuristik murah (tanpa model tambahan), dijalankan pada salinan ROI_DOWNSCALE px:
+  1. mask kulit di ruang YCbCr (rentang Cb/Cr klasik),
+  2. kandidat kuku = piksel kulit yang lebih terang & kurang jenuh dari kulit di sekitarnya
+     (lempeng kuku) — bila terlalu sedikit, pakai seluruh mask kulit,
+  3. bounding box persentil (tahan outlier) + padding, dibuat persegi agar Resize ke
+     img_size × img_size tidak mendistorsi rasio aspek.
+Bila tidak yakin (kulit terlalu sedikit / box hampir seluruh frame) gambar tidak di-crop.
+"""
+from __future__ import annotations
+import threading, time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from PIL import Image
+
+_MIN_SKIN_FRAC = 0.02
+_MIN_NAIL_FRAC = 0.005
+_MAX_BOX_FRAC = 0.9
+
+_stats = {"images": 0, "cropped": 0, "total_ms": 0.0}
+_stats_lock = threading.Lock()
+
+Box = Tuple[int, int, int, int]
+
+
+def _masks(small: Image.Image) -> Tuple[np.ndarray, np.ndarray]:
+    ycc = np.asarray(small.convert("YCbCr"), dtype=np.int16)
+    y, cb, cr = ycc[..., 0], ycc[..., 1], ycc[..., 2]
+    skin = (cb >= 77) & (cb <= 127) & (cr >= 133) & (cr <= 173)
+    if not skin.any():
+        return skin, skin
+
+    hsv = np.asarray(small.convert("HSV"), dtype=np.int16)
+    sat = hsv[..., 1]
+    bright = y >= np.percentile(y[skin], 60)
+    pale = sat <= np.median(sat[skin])
+    return skin, skin & bright & pale
+
+
+def _extent(mask: np.ndarray) -> Tuple[float, float, float, float]:
+    """Bounding box persentil 2–98 (tahan outlier) dari mask."""
+    ys, xs = np.nonzero(mask)
+    x0, x1 = np.percentile(xs, [2, 98])
+    y0, y1 = np.percentile(ys, [2, 98])
+    return x0, y0, x1, y1
+
+
+def _coverage(mask: np.ndarray, pad: float) -> float:
+    """Porsi frame yang tertutup extent ber-padding (sebelum dibuat persegi)."""
+    x0, y0, x1, y1 = _extent(mask)
+    h, w = mask.shape
+    px, py = (x1 - x0) * pad, (y1 - y0) * pad
+    bw = min(x1 + px + 1, w) - max(x0 - px, 0.0)
+    bh = min(y1 + py + 1, h) - max(y0 - py, 0.0)
+    return bw * bh / float(w * h)
+
+
+def _bbox(mask: np.ndarray, pad: float) -> Box:
+    x0, y0, x1, y1 = _extent(mask)
+    cx, cy = (x0 + x1) / 2.0, (y0 + y1) / 2.0
+    side = max(x1 - x0, y1 - y0) * (1.0 + 2.0 * pad)
+    h, w = mask.shape
+    side = min(side, min(h, w))  # persegi harus muat di frame, kalau tidak jadi persegi panjang
+    half = side / 2.0
+    # geser box agar tetap di dalam frame (tanpa mengecilkan sisi bila masih muat)
+    x0 = min(max(cx - half, 0.0), max(w - side, 0.0))
+    y0 = min(max(cy - half, 0.0), max(h - side, 0.0))
+    return int(x0), int(y0), int(min(x0 + side, w)), int(min(y0 + side, h))
+
+
+def find_nail_roi(pil: Image.Image) -> Optional[Box]:
+    """Box (left, top, right, bottom) di koordinat gambar asli, atau None bila tidak di-crop."""
+    w, h = pil.size
+    scale = settings.ROI_DOWNSCALE / float(max(w, h))
+    if scale < 1.0:
+        small = pil.resize((max(1, round(w * scale)), max(1, round(h * scale))), Image.BILINEAR)
+    else:
+        small, scale = pil, 1.0
+
+    skin, nail = _masks(small)
+    n = skin.size
+    if skin.sum() < _MIN_SKIN_FRAC * n:
+        return None
+    mask = nail if nail.sum() >= _MIN_NAIL_FRAC * n else skin
+    # dicek sebelum dibuat persegi: persegi dibatasi sisi pendek sehingga di frame non-persegi
+    # tidak pernah mendekati seluruh frame
+    if _coverage(mask, settings.ROI_PAD) >= _MAX_BOX_FRAC:
+        return None
+    x0, y0, x1, y1 = _bbox(mask, settings.ROI_PAD)
+    inv = 1.0 / scale
+    return (
+        int(x0 * inv), int(y0 * inv),
+        min(w, int(round(x1 * inv))), min(h, int(round(y1 * inv))),
+    )
+
+
+def crop_nail_roi(pil: Image.Image) -> Tuple[Image.Image, Dict]:
+    """Crop ke ROI kuku. Return (gambar, info) — info: box (atau None) & biaya ms."""
+    t0 = time.perf_counter()
+    box = find_nail_roi(pil)
+    out = pil.crop(box) if box else pil
+    ms = (time.perf_counter() - t0) * 1000.0
+    with _stats_lock:
+        _stats["images"] += 1
+        _stats["cropped"] += box is not None
+        _stats["total_ms"] += ms
+    return out, {"box": list(box) if box else None, "ms": round(ms, 2)}
+
+
+def roi_stats() -> Dict:
+    with _stats_lock:
+        s = dict(_stats)
+    n = s["images"]
+    s["crop_rate"] = s["cropped"] / n if n else 0.0
+    s["avg_ms"] = s.pop("total_ms") / n if n else 0.0
+    return s
@@ -0,0 +1,122 @@
+# api/shadow.py
+"""
+Inferensi shadow (A/B) untuk membandingkan checkpoint kandidat di trafik nyata.
+
+- Sampel SHADOW_SAMPLE_RATE request dijalankan ulang di model shadow pada satu thread
+  background; respons utama tidak menunggu. Bila antrean shadow penuh, sampel dibuang.
+- Hasil ditulis ke log biner append-only (record struct tetap 28 byte) + file meta JSON
+  berisi daftar kelas & versi kedua model. Ringkasan: `manage.py shadow_report`.
+"""
+from __future__ import annotations
+import json, logging, random, struct, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+from django.conf import settings
+
+log = logging.getLogger(__name__)
+
+# ts, idx primer, idx shadow, conf primer, conf shadow, ms primer, ms shadow
+RECORD = struct.Struct("<dHHffff")
+_MAX_PENDING = 4
+
+_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+_pending = 0
+_lock = threading.Lock()
+_write_lock = threading.Lock()
+_meta_key = None  # (versi primer, versi shadow) yang meta-nya sudah ditulis
+
+
+def log_path() -> Path:
+    return Path(settings.SHADOW_LOG_PATH)
+
+
+def meta_path(log: Path = None) -> Path:
+    p = Path(log or log_path())
+    return p.with_name(p.name + ".meta.json")
+
+
+def _write_meta(primary_version: str, shadow_version: str, primary_classes: List[str], shadow_classes: List[str]) -> None:
+    global _meta_key
+    if _meta_key == (primary_version, shadow_version):
+        return
+    meta = {
+        "primary_version": primary_version,
+        "shadow_version": shadow_version,
+        "primary_classes": primary_classes,
+        "shadow_classes": shadow_classes,
+        "record_format": RECORD.format,
+    }
+    p = meta_path()
+    p.parent.mkdir(parents=True, exist_ok=True)
+    if p.exists():
+        old = json.loads(p.read_text(encoding="utf-8"))
+        if (old.get("primary_version"), old.get("shadow_version")) != (primary_version, shadow_version):
+            # pasangan model berubah → mulai log baru, arsipkan yang lama
+            stamp = time.strftime("%Y%m%d%H%M%S")
+            for src in (log_path(), p):
+                if src.exists():
+                    src.rename(src.with_name(f"{src.name}.{stamp}"))
+    p.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    _meta_key = (primary_version, shadow_version)
+
+
+def _append(rec: bytes) -> None:
+    with _write_lock:
+        with open(log_path(), "ab") as f:
+            f.write(rec)
+
+
+def maybe_submit(pil_img, tta, primary: Dict, primary_ms: float, primary_version: str, run_fn) -> None:
+    """
+    Jadwalkan inferensi shadow untuk sebagian request. run_fn(shadow_snapshot, pil, tta) → (probs, ms);
+    tta diteruskan apa adanya (True/False/"auto") agar shadow dibandingkan dengan mode yang sama.
+    Tidak pernah memblokir / melempar ke jalur utama.
+    """
+    global _pending
+    rate = settings.SHADOW_SAMPLE_RATE
+    if rate <= 0 or random.random() >= rate:
+        return
+    with _lock:
+        if _pending >= _MAX_PENDING:
+            return
+        _pending += 1
+
+    def _job():
+        global _pending
+        try:
+            from .model_loader import get_shadow_model
+            snap = get_shadow_model()
+            if snap is None:
+                return
+            _, shadow_classes, _, _, shadow_version = snap
+            probs, shadow_ms = run_fn(snap, pil_img, tta)
+            s_idx = int(probs.argmax())
+            p_classes = list(primary["probs"].keys())
+            with _write_lock:
+                _write_meta(primary_version, shadow_version, p_classes, list(shadow_classes))
+            _append(RECORD.pack(
+                time.time(),
+                p_classes.index(primary["label"]), s_idx,
+                float(primary["confidence"]), float(probs[s_idx]),
+                float(primary_ms), float(shadow_ms),
+            ))
+        except Exception as e:
+            log.warning("Shadow inference gagal: %s", e)
+        finally:
+            with _lock:
+                _pending -= 1
+
+    _pool.submit(_job)
+
+
+def read_records(path: Path = None) -> Iterator[tuple]:
+    path = Path(path or log_path())
+    with open(path, "rb") as f:
+        while True:
+            buf = f.read(RECORD.size * 4096)
+            if not buf:
+                break
+            usable = len(buf) - len(buf) % RECORD.size  # abaikan record terpotong di ekor
+            yield from RECORD.iter_unpack(buf[:usable])
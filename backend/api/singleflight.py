@@ -0,0 +1,83 @@
+# api/singleflight.py
+"""
+Single-flight in-process: pemanggil konkuren dengan kunci yang sama menunggu SATU komputasi
+yang sedang berjalan dan berbagi hasilnya (atau exception-nya). Tidak menyimpan hasil setelah
+selesai — itu tugas cache; ini hanya meredam lonjakan permintaan identik yang datang bersamaan.
+
+Dipakai untuk retrieval (rag.retrieve_multi_smart) dan panggilan Gemini (llm.explain_prediction).
+"""
+from __future__ import annotations
+import hashlib, threading
+from typing import Any, Callable, Dict, Optional
+
+_registry: Dict[str, "SingleFlight"] = {}
+
+
+def make_key(*parts) -> str:
+    h = hashlib.sha1()
+    for p in parts:
+        h.update(str(p).encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+
+class _Call:
+    __slots__ = ("done", "result", "exc", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.exc: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "upstream": 0, "coalesced": 0, "max_waiters": 0}
+        _registry[name] = self
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            self._stats["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats["upstream"] += 1
+            else:
+                call.waiters += 1
+                self._stats["coalesced"] += 1
+                self._stats["max_waiters"] = max(self._stats["max_waiters"], call.waiters)
+
+        if not leader:
+            call.done.wait()
+            if call.exc is not None:
+                raise call.exc
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.exc = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            s = dict(self._stats)
+            s["in_flight"] = len(self._calls)
+        # setiap pemanggil yang ikut menunggu = satu panggilan upstream yang dihemat
+        s["upstream_saved"] = s["coalesced"]
+        s["coalesce_rate"] = s["coalesced"] / s["calls"] if s["calls"] else 0.0
+        return s
+
+
+def all_stats() -> Dict[str, Dict]:
+    return {name: sf.snapshot() for name, sf in _registry.items()}
@@ -1,3 +1,1634 @@
-from django.test import TestCase
+import importlib.util
+import os
+import subprocess
+import sys
+import unittest
+from pathlib import Path
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase, TestCase
+
+_QUERIES = [
+    "kuku menebal dan berubah warna kekuningan",
+    "apakah cekungan kecil di kuku berbahaya? | label: pitting",
+    "nail clubbing causes",
+    "Jelaskan secara non-diagnostik | label: Healthy_Nail",
+]
+
+
+class QueryEncoderParityTests(SimpleTestCase):
+    """Backend encoder alternatif harus kompatibel dengan embedding index (torch fp32)."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from api import rag
+        from api.encoder import TorchEncoder
+
+        cls.st = rag._get_model()
+        cls.ref = TorchEncoder(cls.st).encode(_QUERIES)
+
+    def _assert_parity(self, enc, min_cos):
+        vecs = enc.encode(_QUERIES)
+        self.assertEqual(vecs.shape, self.ref.shape)
+        np.testing.assert_allclose(np.linalg.norm(vecs, axis=1), 1.0, atol=1e-3)
+        cos = (vecs * self.ref).sum(axis=1)
+        self.assertGreaterEqual(float(cos.min()), min_cos, f"cosine {cos}")
+
+    def test_int8_parity(self):
+        from api.encoder import Int8Encoder
+        self._assert_parity(Int8Encoder(self.st), 0.98)
+
+    @unittest.skipUnless(importlib.util.find_spec("onnxruntime"), "onnxruntime tidak terpasang")
+    def test_onnx_parity(self):
+        import tempfile
+        from pathlib import Path
+        from api.encoder import OnnxEncoder
+
+        with tempfile.TemporaryDirectory() as d:
+            self._assert_parity(OnnxEncoder(self.st, Path(d) / "minilm.onnx"), 0.999)
+
+
+# Modul berat yang tidak boleh ikut terimpor saat startup (hanya saat pertama dipakai)
+_HEAVY = ("torch", "torchvision", "chromadb", "sentence_transformers", "google.genai", "onnxruntime")
+_IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1500"))
+
+
+class StartupImportTimeTests(SimpleTestCase):
+    """django.setup() + urlconf api (views) harus ringan: tanpa torch/chromadb/genai, di bawah anggaran."""
+
+    def test_import_budget(self):
+        code = (
+            "import os; os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nailbot.settings'); "
+            "import django; django.setup(); import api.urls, api.admin"
+        )
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=Path(__file__).resolve().parents[1], capture_output=True, text=True, timeout=120,
+        )
+        self.assertEqual(proc.returncode, 0, proc.stderr[-2000:])
+
+        total_us, loaded = 0, set()
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|", 2)
+            if not name.startswith("  "):  # hanya impor tingkat atas agar tidak dihitung ganda
+                total_us += int(cumulative)
+            loaded.add(name.strip())
+
+        heavy = sorted(m for m in loaded if any(m == h or m.startswith(h + ".") for h in _HEAVY))
+        self.assertEqual(heavy, [], "modul berat terimpor saat startup")
+        self.assertLess(total_us / 1000.0, _IMPORT_BUDGET_MS, f"import {total_us / 1000.0:.0f} ms")
+
+
+class ResilientCallerTests(SimpleTestCase):
+    """Anggaran latensi, hedge & circuit breaker terhadap provider palsu yang lambat (fake_client)."""
+
+    def _slow_call(self, delay_ms):
+        from unittest import mock
+        from api.llm import fake_client
+
+        def fn():
+            with mock.patch.object(fake_client, "FAKE_DELAY_MS", delay_ms):
+                return fake_client.FakeGenaiClient().models.generate_content(model="fake", contents="halo")
+        return fn
+
+    def test_budget_timeout_counts_once(self):
+        from api.llm.resilience import CircuitBreaker, LLMBudgetExceeded, ResilientCaller
+
+        breaker = CircuitBreaker(failure_threshold=3, reset_after_s=60)
+        caller = ResilientCaller(budget_ms=50, breaker=breaker, max_workers=2)
+        with self.assertRaises(LLMBudgetExceeded) as ctx:
+            caller.call(self._slow_call(300))
+        self.assertIsNotNone(ctx.exception.future.result(timeout=5))  # jawaban terlambat tetap datang
+        # sukses terlambat tidak mereset breaker, timeout tidak dihitung dua kali
+        self.assertEqual(breaker._failures, 1)
+        self.assertEqual(caller.snapshot()["timeouts"], 1)
+
+    def test_breaker_opens_after_failures(self):
+        from unittest import mock
+        from api.llm import fake_client
+        from api.llm.resilience import CircuitBreaker, CircuitOpen, ResilientCaller
+
+        caller = ResilientCaller(budget_ms=1000, breaker=CircuitBreaker(failure_threshold=2, reset_after_s=60))
+        with mock.patch.object(fake_client, "FAKE_FAIL_RATE", 1.0):
+            for _ in range(2):
+                with self.assertRaises(RuntimeError):
+                    caller.call(self._slow_call(0))
+            with self.assertRaises(CircuitOpen):
+                caller.call(self._slow_call(0))
+        self.assertEqual(caller.breaker.state, "open")
+
+    def test_hedge_wins_when_primary_is_slow(self):
+        import itertools
+        from api.llm.resilience import ResilientCaller
+
+        caller = ResilientCaller(budget_ms=2000, hedge=True, hedge_min_samples=5, max_workers=4)
+        for _ in range(5):
+            caller.latency.add(0.02)  # p95 historis 20 ms
+        delays = itertools.chain([800], itertools.repeat(0))  # primary lambat, hedge cepat
+        resp = caller.call(lambda: self._slow_call(next(delays))())
+        self.assertIn("Penjelasan", resp.text)
+        s = caller.snapshot()
+        self.assertEqual((s["hedged"], s["hedge_wins"], s["breaker_state"]), (1, 1, "closed"))
+
+
+class ConversationCacheTests(SimpleTestCase):
+    """Giliran pertama dari cache semantik tetap mengisi passage & tag yang sudah terpakai."""
+
+    def test_cached_first_turn_keeps_tags(self):
+        from unittest import mock
+        from django.test import override_settings
+        from api import conversation
+        from api.llm import llm
+
+        selected = [
+            {"id": "a", "bucket": "L", "tag": "L1", "source": "kb"},
+            {"id": "b", "bucket": "S", "tag": "S1", "source": "jurnal"},
+            {"id": "c", "bucket": "S", "tag": "S2", "source": "jurnal"},
+        ]
+        fake_cache = mock.Mock()
+        fake_cache.get.return_value = {
+            "md": "# Penjelasan\n\nKeyakinan: " + llm._CONF_SLOT, "selected": selected, "refs": ["[L1] kb"],
+        }
+        followup = mock.Mock(return_value=("jawaban lanjutan", [], []))
+        with override_settings(SEMANTIC_CACHE_ENABLED=True), \
+                mock.patch.object(llm, "_semantic_cache", fake_cache), \
+                mock.patch.object(llm, "_cache_version", return_value="v"), \
+                mock.patch.object(llm, "retrieve_multi_smart") as retrieve, \
+                mock.patch.object(conversation, "explain_followup_turn", followup):
+            conv = conversation.Conversation("pitting", 0.9, {"pitting": 0.9})
+            conv.ask("apa penyebabnya?")
+            conv.ask("perawatannya?")
+
+        retrieve.assert_not_called()
+        self.assertEqual((conv.l_count, conv.s_count), (1, 2))
+        self.assertEqual(conv.refs, ["[L1] kb"])
+        args = followup.call_args.args
+        self.assertEqual(args[4], {("L", "a"), ("S", "b"), ("S", "c")})
+        self.assertEqual(args[5:7], (1, 2))  # tag berikutnya [L2]/[S3], bukan mulai lagi dari [L1]/[S1]
+
+
+class SingleFlightTests(SimpleTestCase):
+    """Pemanggil konkuren dengan kunci sama berbagi satu komputasi (hasil maupun exception)."""
+
+    def _run_concurrent(self, sf, fn, n=5):
+        import threading
+        import time
+
+        results, gate = [None] * n, threading.Event()
+
+        def worker(i):
+            try:
+                results[i] = sf.do("k", lambda: fn(gate))
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+        for t in threads:
+            t.start()
+        deadline = time.monotonic() + 5
+        while sf.snapshot()["coalesced"] < n - 1 and time.monotonic() < deadline:
+            time.sleep(0.005)
+        gate.set()  # leader baru selesai setelah semua pemanggil lain ikut menunggu
+        for t in threads:
+            t.join(5)
+        return results
+
+    def test_concurrent_calls_coalesce(self):
+        from api.singleflight import SingleFlight
+
+        calls = []
+
+        def fn(gate):
+            calls.append(1)
+            gate.wait(5)
+            return {"answer": 42}
+
+        sf = SingleFlight("test.coalesce")
+        results = self._run_concurrent(sf, fn)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(r is results[0] for r in results))
+        s = sf.snapshot()
+        self.assertEqual((s["calls"], s["upstream"], s["coalesced"], s["in_flight"]), (5, 1, 4, 0))
+
+    def test_exception_reaches_all_waiters(self):
+        from api.singleflight import SingleFlight
+
+        def fn(gate):
+            gate.wait(5)
+            raise ValueError("upstream gagal")
+
+        sf = SingleFlight("test.error")
+        results = self._run_concurrent(sf, fn)
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        # kunci dilepas setelah gagal: panggilan berikutnya menjalankan fn lagi
+        self.assertEqual(sf.do("k", lambda: "ok"), "ok")
+        self.assertEqual(sf.snapshot()["upstream"], 2)
+
+
+class BM25IndexTests(SimpleTestCase):
+    """Skor BM25 sesuai rumus (k1=1.5, b=0.75) dan indeks utuh setelah save/load."""
+
+    _IDS = ["a", "b", "c"]
+    _DOCS = ["Kuku menebal dan kuning", "Kuku rapuh, mudah patah", "Rambut rontok"]
+
+    def test_scores_match_formula(self):
+        import math
+        from api.bm25 import BM25Index
+
+        index = BM25Index.build(self._IDS, self._DOCS)
+        lens = [3, 4, 2]  # setelah tokenisasi: "dan" stopword, tanda baca dibuang
+        np.testing.assert_array_equal(index.doc_len, lens)
+        avgdl = sum(lens) / 3
+
+        def term(df, dl):
+            idf = math.log(1 + (3 - df + 0.5) / (df + 0.5))
+            return idf * 2.5 / (1 + 1.5 * (0.25 + 0.75 * dl / avgdl))
+
+        got = dict(index.search("apakah kuku kuning?", k=3))
+        self.assertEqual(list(got), ["a", "b"])  # "c" tanpa term cocok tidak dikembalikan
+        self.assertAlmostEqual(got["a"], term(2, 3) + term(1, 3), places=5)
+        self.assertAlmostEqual(got["b"], term(2, 4), places=5)
+        self.assertEqual(index.search("yang dan apa"), [])  # hanya stopword
+
+    def test_save_load_roundtrip(self):
+        import tempfile
+        from api.bm25 import BM25Index, bm25_path
+
+        index = BM25Index.build(self._IDS, self._DOCS)
+        with tempfile.TemporaryDirectory() as d:
+            path = bm25_path(Path(d), "nail_kb")
+            index.save(path)
+            loaded = BM25Index.load(path)
+        for name in ("ids", "vocab", "indptr", "doc_idx", "tf", "doc_len"):
+            np.testing.assert_array_equal(getattr(loaded, name), getattr(index, name), name)
+        self.assertEqual(loaded.search("kuku rapuh"), index.search("kuku rapuh"))
+
+
+class _WordTokenizer:
+    """Tokenizer palsu berantarmuka HF fast: satu token per kata (dipisah spasi)."""
+
+    def __call__(self, texts, add_special_tokens=False, return_offsets_mapping=False):
+        import re
+        if isinstance(texts, list):
+            return {"input_ids": [[0] * len(t.split()) for t in texts]}
+        return {"offset_mapping": [(m.start(), m.end()) for m in re.finditer(r"\S+", texts)]}
+
+
+class ChunkerTests(SimpleTestCase):
+    """Jendela token dengan overlap kalimat & pemotongan kalimat yang melebihi max_tokens."""
+
+    def test_windows_overlap_by_tail_sentences(self):
+        from api.chunker import chunk_by_tokens
+
+        text = " ".join(f"kalimat nomor {i} tentang kuku." for i in range(6))  # 5 token/kalimat
+        chunks = chunk_by_tokens(text, _WordTokenizer(), max_tokens=12, overlap_tokens=5)
+
+        self.assertEqual([c["n_tokens"] for c in chunks], [10, 10, 10, 10, 10])
+        for c in chunks:
+            self.assertEqual(c["text"], text[c["start"]:c["end"]])
+        for prev, nxt in zip(chunks, chunks[1:]):
+            # jendela berikutnya mulai dari kalimat terakhir jendela sebelumnya
+            self.assertEqual(nxt["text"].split(" ")[:5], prev["text"].split(" ")[-5:])
+        self.assertEqual((chunks[0]["start"], chunks[-1]["end"]), (0, len(text)))
+
+    def test_long_sentence_split_at_token_boundaries(self):
+        from api.chunker import chunk_by_tokens
+
+        words = [f"w{i}" for i in range(25)]
+        text = "Pendek sekali. " + " ".join(words) + "."
+        chunks = chunk_by_tokens(text, _WordTokenizer(), max_tokens=10, overlap_tokens=0)
+
+        self.assertTrue(all(c["n_tokens"] <= 10 for c in chunks))
+        self.assertEqual([c["text"] for c in chunks], [
+            "Pendek sekali.", " ".join(words[:10]), " ".join(words[10:20]), " ".join(words[20:]) + ".",
+        ])
+
+
+class ContextPackingTests(SimpleTestCase):
+    """Packing konteks: anggaran token tidak terlampaui, passage yang tidak muat dilewati."""
+
+    @staticmethod
+    def _p(pid, n_tokens, bucket="L", **extra):
+        return {"id": pid, "text": f"isi passage {pid}.", "source": "kb", "bucket": bucket,
+                "n_tokens": n_tokens, **extra}
+
+    def test_budget_skips_passages_that_do_not_fit(self):
+        from api.llm.llm_utils import _format_context_dual
+
+        # biaya = n_tokens + token sumber ("kb" → 1) + 4
+        passages = [self._p("p1", 50), self._p("p2", 100), self._p("p3", 20), self._p("p4", 10)]
+        selected = []
+        ctx, refs = _format_context_dual(passages, max_tokens=90, l_start=2, selected=selected)
+
+        self.assertEqual([(s["id"], s["tag"]) for s in selected], [("p1", "[L3]"), ("p3", "[L4]")])
+        self.assertNotIn("p2", ctx)
+        self.assertNotIn("p4", ctx)  # 55 + 25 + 15 > 90
+        self.assertEqual(refs, [])  # referensi hanya untuk literatur [Sx]
+
+    def test_scholar_passage_truncated_to_cap(self):
+        from api.llm import llm_utils
+
+        text = " ".join(f"Kalimat ke-{i} tentang onikomikosis." for i in range(200))
+        p = {"id": "s1", "text": text, "source": "https://doi.org/x", "bucket": "S",
+             "n_tokens": 2000, "citation": "Smith 2020"}
+        selected = []
+        ctx, refs = llm_utils._format_context_dual([p], max_tokens=10_000, selected=selected)
+
+        _, cost = llm_utils._render_passage("S", text, "https://doi.org/x", 2000)
+        self.assertLessEqual(cost, llm_utils.SCHOLAR_PASSAGE_TOKENS + llm_utils._approx_tokens("https://doi.org/x") + 5)
+        self.assertIn("…", ctx)
+        self.assertEqual(refs, ["[S1] [Smith 2020](https://doi.org/x)"])
+        self.assertEqual(selected[0]["tag"], "[S1]")
+
+    def test_nothing_fits(self):
+        from api.llm.llm_utils import _format_context_dual
+
+        ctx, refs = _format_context_dual([self._p("p1", 500)], max_tokens=100)
+        self.assertEqual((ctx, refs), ("Tidak ada konteks yang relevan.", []))
+
+
+class ServesWebTests(SimpleTestCase):
+    """Worker job hanya dinyalakan di proses web, bukan di command lain / proses pool inferensi."""
+
+    def _serves(self, argv, env=None):
+        from unittest import mock
+        from api.apps import _serves_web
+
+        with mock.patch("sys.argv", argv), mock.patch.dict("os.environ", env or {}, clear=False):
+            return _serves_web()
+
+    def test_detection(self):
+        import os
+        from unittest import mock
+
+        with mock.patch.dict("os.environ"):
+            os.environ.pop("NAILBOT_INFER_POOL_WORKER", None)
+            os.environ.pop("RUN_MAIN", None)
+            self.assertTrue(self._serves(["/usr/bin/gunicorn", "nailbot.wsgi"]))
+            self.assertTrue(self._serves(["manage.py", "runserver", "--noreload"]))
+            self.assertFalse(self._serves(["manage.py", "runserver"]))  # proses autoreloader induk
+            self.assertFalse(self._serves(["manage.py", "analyze_worker"]))
+            self.assertFalse(self._serves(["manage.py", "migrate"]))
+            # proses spawn infer_pool mewarisi argv gunicorn
+            self.assertFalse(self._serves(["/usr/bin/gunicorn", "nailbot.wsgi"], {"NAILBOT_INFER_POOL_WORKER": "1"}))
+
+
+class JobQueueTests(TestCase):
+    """Antrean job async: backpressure, klaim atomik, requeue hanya bila detak berhenti, retensi."""
+
+    def _enqueue(self, n=1):
+        from django.test import override_settings
+        from api import jobs
+
+        with override_settings(ANALYZE_JOB_WORKERS=0):
+            return [jobs.enqueue(b"img", "prompt") for _ in range(n)]
+
+    def test_enqueue_and_queue_full(self):
+        from django.test import override_settings
+        from api import jobs
+
+        self._enqueue(2)
+        self.assertEqual(jobs.queue_depth(), 2)
+        with override_settings(ANALYZE_QUEUE_MAX=2), self.assertRaises(jobs.QueueFull):
+            self._enqueue()
+
+    def test_claim_is_exclusive(self):
+        from api import jobs
+        from api.models import AnalysisJob
+
+        (job,) = self._enqueue()
+        got = jobs.claim_next("w1")
+        self.assertEqual((got.pk, got.status, got.owner), (job.pk, AnalysisJob.STATUS_RUNNING, "w1"))
+        self.assertIsNotNone(got.heartbeat_at)
+        self.assertIsNone(jobs.claim_next("w2"))
+
+    def test_requeue_only_without_heartbeat(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from api import jobs
+        from api.models import AnalysisJob
+
+        slow, dead = self._enqueue(2)
+        jobs.claim_next("w1"), jobs.claim_next("w2")
+        old = timezone.now() - timedelta(seconds=3600)
+        # keduanya mulai lama; "slow" masih berdetak, "dead" tidak
+        AnalysisJob.objects.filter(pk=slow.pk).update(started_at=old, heartbeat_at=timezone.now())
+        AnalysisJob.objects.filter(pk=dead.pk).update(started_at=old, heartbeat_at=old)
+
+        self.assertEqual(jobs._requeue_stale(), 1)
+        slow.refresh_from_db(), dead.refresh_from_db()
+        self.assertEqual(slow.status, AnalysisJob.STATUS_RUNNING)
+        self.assertEqual((dead.status, dead.owner), (AnalysisJob.STATUS_QUEUED, ""))
+
+    def test_finish_ignored_after_requeue(self):
+        from api import jobs
+        from api.models import AnalysisJob
+
+        self._enqueue()
+        job = jobs.claim_next("w1")
+        AnalysisJob.objects.filter(pk=job.pk).update(status=AnalysisJob.STATUS_QUEUED, owner="")
+        jobs.claim_next("w2")
+        self.assertFalse(jobs._finish(job, AnalysisJob.STATUS_DONE, result={"x": 1}))  # worker lama
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.owner, job.result), (AnalysisJob.STATUS_RUNNING, "w2", None))
+
+    def test_purge_finished(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from api import jobs
+        from api.models import AnalysisJob
+
+        old, recent, queued = self._enqueue(3)
+        AnalysisJob.objects.filter(pk=old.pk).update(
+            status=AnalysisJob.STATUS_DONE, finished_at=timezone.now() - timedelta(days=30))
+        AnalysisJob.objects.filter(pk=recent.pk).update(status=AnalysisJob.STATUS_ERROR, finished_at=timezone.now())
+        self.assertEqual(jobs._purge_finished(), 1)
+        self.assertEqual(set(AnalysisJob.objects.values_list("pk", flat=True)), {recent.pk, queued.pk})
+
+
+def _png_bytes(size=(8, 8), color=(200, 150, 140)):
+    import io
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, "PNG")
+    return buf.getvalue()
+
+
+class AdmissionTests(SimpleTestCase):
+    """Kuota per klien (429), shedding lane (503) & kunci klien dari proxy tepercaya."""
+
+    def test_token_bucket_refill(self):
+        from unittest import mock
+        from api.admission import TokenBucket
+
+        now = [100.0]
+        with mock.patch("api.admission.time.monotonic", lambda: now[0]):
+            b = TokenBucket(rate_per_s=1.0, burst=2)
+            self.assertEqual((b.take("a"), b.take("a")), (0.0, 0.0))
+            self.assertAlmostEqual(b.take("a"), 1.0)  # habis: tunggu 1 token
+            self.assertEqual(b.take("b"), 0.0)  # klien lain punya bucket sendiri
+            now[0] += 0.5
+            self.assertAlmostEqual(b.take("a"), 0.5)
+            now[0] += 0.5
+            self.assertEqual(b.take("a"), 0.0)
+        self.assertEqual(b.snapshot(), {"allowed": 4, "limited": 2, "clients": 2})
+
+    def test_client_key_uses_trusted_hop(self):
+        from django.test import RequestFactory, override_settings
+        from api.admission import client_key
+
+        rf = RequestFactory()
+        req = rf.get("/", HTTP_X_FORWARDED_FOR="6.6.6.6, 1.2.3.4", REMOTE_ADDR="10.0.0.1")
+        with override_settings(ADMISSION_CLIENT_HEADER="X-Forwarded-For", ADMISSION_TRUSTED_PROXIES=1):
+            self.assertEqual(client_key(req), "1.2.3.4")  # entri awal palsu dari klien diabaikan
+            self.assertEqual(client_key(rf.get("/", REMOTE_ADDR="10.0.0.1")), "10.0.0.1")
+        with override_settings(ADMISSION_CLIENT_HEADER="X-Forwarded-For", ADMISSION_TRUSTED_PROXIES=2):
+            self.assertEqual(client_key(req), "6.6.6.6")
+            self.assertEqual(client_key(rf.get("/", HTTP_X_FORWARDED_FOR="1.2.3.4", REMOTE_ADDR="10.0.0.1")),
+                             "10.0.0.1")
+        with override_settings(ADMISSION_CLIENT_HEADER=""):
+            self.assertEqual(client_key(req), "10.0.0.1")
+
+    def test_rate_limit_returns_429(self):
+        from django.test import override_settings
+
+        with override_settings(ADMISSION_ENABLED=True, ADMISSION_RATE_PER_MIN=1, ADMISSION_BURST=1,
+                               ADMISSION_CLIENT_HEADER="X-Forwarded-For"):
+            first = self.client.post("/api/explain", {"analysis_token": "x"}, HTTP_X_FORWARDED_FOR="9.9.9.1")
+            # entri awal dirotasi klien → tetap bucket yang sama
+            second = self.client.post("/api/explain", {"analysis_token": "x"}, HTTP_X_FORWARDED_FOR="1.1.1.1, 9.9.9.1")
+        self.assertEqual(first.status_code, 410)  # lolos kuota, token tidak valid
+        self.assertEqual(second.status_code, 429)
+        self.assertGreaterEqual(int(second["Retry-After"]), 1)
+
+    def test_full_lane_sheds_with_503(self):
+        from unittest import mock
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.test import override_settings
+        from api import admission
+
+        lane = admission.Lane("inference", slots=1, est_service_s=5.0)
+        lane.acquire(1.0)  # satu-satunya slot sedang dipakai
+        with override_settings(ADMISSION_ENABLED=True, ADMISSION_RATE_PER_MIN=0, ADMISSION_QUEUE_BUDGET_S=1.0), \
+                mock.patch.object(admission, "inference_lane", lane), \
+                mock.patch("api.views.classify_image") as classify:
+            resp = self.client.post("/api/classify", {"image": SimpleUploadedFile("k.png", _png_bytes())})
+        classify.assert_not_called()
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp["Retry-After"], "5")  # perkiraan tunggu = 1 antrean × 5 dtk
+        self.assertEqual(lane.snapshot()["shed"], 1)
+
+
+class HybridFallbackTests(SimpleTestCase):
+    """Tanpa indeks BM25, mode hybrid jatuh ke ekspansi multi-varian (dengan peringatan)."""
+
+    def test_missing_bm25_uses_multi(self):
+        from unittest import mock
+        from api import rag
+
+        with mock.patch.object(rag, "RETRIEVAL_MODE", "hybrid"), mock.patch.object(rag, "_no_bm25_warned", None), \
+                mock.patch.object(rag, "_index_snapshot", return_value=(object(), object(), None, None)), \
+                mock.patch.object(rag, "_retrieve_multi_variants", return_value=[{"id": "x"}]) as multi, \
+                mock.patch.object(rag, "embed") as embed, \
+                self.assertLogs("api.rag", level="WARNING"):
+            hits = rag._retrieve_multi_smart("kuku kuning", "onychomycosis", 2, 3, 8)
+        self.assertEqual(hits, [{"id": "x"}])
+        multi.assert_called_once_with("kuku kuning", "onychomycosis", 2, 3, 8)
+        embed.assert_not_called()
+
+
+class AnalysisEventLogTests(TestCase):
+    """Log event: record() tidak memblokir (buang saat penuh), flush per batch, flush saat exit."""
+
+    def _patched(self):
+        from collections import deque
+        from unittest import mock
+        from api import events
+
+        stats = {k: 0 for k in events._stats}
+        return (mock.patch.object(events, "_buf", deque()), mock.patch.object(events, "_stats", stats),
+                mock.patch.object(events, "_ensure_writer"))
+
+    def test_drop_when_buffer_full(self):
+        from contextlib import ExitStack
+        from django.test import override_settings
+        from api import events
+
+        with ExitStack() as st, override_settings(ANALYSIS_LOG_BUFFER=3, ANALYSIS_LOG_BATCH=100):
+            for p in self._patched():
+                st.enter_context(p)
+            for i in range(5):
+                events.record("/api/analyze/", {"prediction": "healthy", "confidence": 0.9}, 10.0, f"p{i}")
+            s = events.event_stats()
+        self.assertEqual((s["recorded"], s["dropped"], s["buffered"]), (3, 2, 3))
+
+    def test_flush_in_batches(self):
+        from contextlib import ExitStack
+        from django.test import override_settings
+        from api import events
+        from api.models import AnalysisEvent
+
+        with ExitStack() as st, override_settings(ANALYSIS_LOG_BUFFER=100, ANALYSIS_LOG_BATCH=4):
+            for p in self._patched():
+                st.enter_context(p)
+            for i in range(10):
+                events.record("/api/analyze/", {"prediction": "healthy"}, 5.0, "x" * 1000)
+            self.assertEqual(events.flush(), 10)
+            s = events.event_stats()
+        self.assertEqual((s["batches"], s["flushed"], s["buffered"]), (3, 10, 0))  # 4 + 4 + 2
+        self.assertEqual(AnalysisEvent.objects.count(), 10)
+        self.assertLessEqual(len(AnalysisEvent.objects.first().prompt), 500)
+
+    def test_writer_registers_flush_at_exit(self):
+        from unittest import mock
+        from api import events
+
+        with mock.patch.object(events, "_writer", None), mock.patch.object(events.threading, "Thread") as thread, \
+                mock.patch.object(events.atexit, "register") as register:
+            events._ensure_writer()
+            events._ensure_writer()  # writer sudah ada: tidak didaftarkan dua kali
+        thread.return_value.start.assert_called_once_with()
+        register.assert_called_once_with(events.flush)
+
+
+class ConversationStoreTests(SimpleTestCase):
+    """Sesi percakapan di cache Django: giliran lanjutan bisa dilayani worker lain; satu giliran per sesi."""
+
+    def test_followup_resumes_from_cache(self):
+        from unittest import mock
+        from api import conversation
+
+        selected = [{"id": "a", "bucket": "L", "tag": "L1"}, {"id": "b", "bucket": "S", "tag": "S1"}]
+
+        def first(label, conf, probs, question, trace=None):
+            trace.update(selected=selected, refs=["[L1] kb"])
+            return "# Penjelasan\n\nawal"
+
+        seen = []
+
+        def followup(label, conf, question, history, seen_ids, l_count, s_count):
+            seen.append((history, set(seen_ids), l_count, s_count))  # salinan: set diperbarui setelah giliran
+            return "lanjutan", [{"id": "c", "bucket": "S", "tag": "S2"}], ["[S2] j"]
+
+        with mock.patch.object(conversation, "explain_prediction", side_effect=first), \
+                mock.patch.object(conversation, "explain_followup_turn", followup):
+            conv = conversation.store.create("pitting", 0.9, {"pitting": 0.9})
+            conv.ask("")
+            # worker lain: objek baru dari cache, bukan objek yang sama di memori
+            other = conversation.ConversationStore().get(conv.id)
+            self.assertIsNot(other, conv)
+            other.ask("perawatannya?")
+            again = conversation.store.get(conv.id)
+
+        self.assertEqual(seen, [([("(penjelasan awal)", "awal")], {("L", "a"), ("S", "b")}, 1, 1)])
+        self.assertEqual((again.turns, again.s_count, again.refs), (2, 2, ["[L1] kb", "[S2] j"]))
+
+    def test_missing_session(self):
+        from api import conversation
+
+        self.assertIsNone(conversation.store.get("tidak-ada"))
+
+    def test_concurrent_turn_is_rejected(self):
+        from unittest import mock
+        from django.core.cache import cache
+        from django.test import override_settings
+        from api import conversation
+
+        conv = conversation.store.create("pitting", 0.9, {"pitting": 0.9})
+        cache.add(f"chat:{conv.id}:lock", "giliran-lain", timeout=60)
+        try:
+            with override_settings(CHAT_LOCK_WAIT_S=0), \
+                    mock.patch.object(conversation, "explain_prediction") as explain, \
+                    self.assertRaises(conversation.ConversationBusy):
+                conv.ask("apa?")
+        finally:
+            cache.delete(f"chat:{conv.id}:lock")
+        explain.assert_not_called()
+        self.assertEqual(conversation.store.get(conv.id).turns, 0)
+
+
+def _png_header_only(width, height):
+    """PNG dengan IHDR berdimensi sembarang tanpa data piksel (bom dekompresi buatan)."""
+    import struct
+    import zlib
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IEND", b"")
+
+
+class UploadLimitTests(SimpleTestCase):
+    """Upload di luar batas ditolak 4xx dari header/stream, sebelum decode & klasifikasi."""
+
+    def _post(self, name, payload, **overrides):
+        from unittest import mock
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.test import override_settings
+        from api import views
+
+        with override_settings(**overrides), mock.patch.object(views, "classify_image") as classify:
+            resp = self.client.post("/api/classify", {"image": SimpleUploadedFile(name, payload)})
+        classify.assert_not_called()
+        return resp
+
+    def _rejected(self, reason):
+        from api.uploads import upload_stats
+
+        return upload_stats()["rejected"].get(reason, 0)
+
+    def test_over_limit_body(self):
+        before = self._rejected("bytes")
+        resp = self._post("k.png", _png_bytes() + b"\0" * 4096, UPLOAD_MAX_BYTES=1024)
+        self.assertEqual(resp.status_code, 413)
+        self.assertEqual(self._rejected("bytes"), before + 1)
+
+    def test_pixel_bomb_header(self):
+        before = self._rejected("pixels")
+        resp = self._post("bom.png", _png_header_only(60_000, 60_000))  # 3.6 Gpx, beberapa puluh byte
+        self.assertEqual(resp.status_code, 413)
+        self.assertEqual(self._rejected("pixels"), before + 1)
+
+    def test_side_bomb_header(self):
+        resp = self._post("garis.png", _png_header_only(50_000, 4), UPLOAD_MAX_SIDE=10_000)
+        self.assertEqual(resp.status_code, 413)
+        self.assertIn("50000", resp.json()["detail"])
+
+    def test_animated_gif(self):
+        import io
+        from PIL import Image
+
+        frames = [Image.new("RGB", (8, 8), c) for c in ((255, 0, 0), (0, 255, 0))]
+        buf = io.BytesIO()
+        frames[0].save(buf, "GIF", save_all=True, append_images=frames[1:], duration=50)
+        before = self._rejected("frames")
+        resp = self._post("anim.gif", buf.getvalue(), UPLOAD_FORMATS=["JPEG", "PNG", "WEBP", "GIF"])
+        self.assertEqual(resp.status_code, 413)
+        self.assertEqual(self._rejected("frames"), before + 1)
+
+    def test_disallowed_format(self):
+        import io
+        from PIL import Image
+
+        buf = io.BytesIO()
+        Image.new("RGB", (8, 8)).save(buf, "BMP")
+        before = self._rejected("format")
+        resp = self._post("k.bmp", buf.getvalue())
+        self.assertEqual(resp.status_code, 413)
+        self.assertEqual(self._rejected("format"), before + 1)
+
+    def test_garbage_is_bad_request(self):
+        resp = self._post("k.png", b"bukan gambar")
+        self.assertEqual(resp.status_code, 400)
+
+
+class MemWatchTests(SimpleTestCase):
+    """tracemalloc tetap aktif lintas request; daur ulang worker saat RSS melewati ambang (503)."""
+
+    def setUp(self):
+        import tracemalloc
+
+        self.addCleanup(lambda: tracemalloc.stop())
+
+    def test_tracing_survives_request(self):
+        import tempfile
+        import tracemalloc
+        from django.test import override_settings
+        from api import memwatch
+
+        with tempfile.TemporaryDirectory() as d, override_settings(
+                MEM_TRACE_ENABLED=True, MEM_TRACE_SAMPLE_RATE=1.0, MEM_SNAPSHOT_DIR=d, MEM_SNAPSHOT_INTERVAL_S=0):
+            memwatch.begin_request()
+            leak = [bytearray(1024) for _ in range(200)]
+            memwatch.mark("classify")
+            memwatch.end_request()
+            self.assertTrue(tracemalloc.is_tracing())  # baseline tetap berlaku untuk diff berikutnya
+            self.assertEqual(len(memwatch.list_snapshots(os.getpid())), 1)
+            self.assertIn("classify", memwatch.stage_stats())
+            del leak
+
+    def test_disabled_does_not_trace(self):
+        import tracemalloc
+        from django.test import override_settings
+        from api import memwatch
+
+        with override_settings(MEM_TRACE_ENABLED=False):
+            memwatch.begin_request()
+            memwatch.end_request()
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_recycle_threshold(self):
+        from unittest import mock
+        from django.test import override_settings
+        from api import memwatch
+
+        with mock.patch.object(memwatch, "_recycling", False), mock.patch.object(memwatch, "rss_mb", return_value=900.0), \
+                mock.patch.object(memwatch.threading, "Thread") as thread:
+            with override_settings(MEM_RECYCLE_RSS_MB=0):
+                memwatch.maybe_recycle()  # 0 = mati
+                self.assertFalse(memwatch.is_recycling())
+            with override_settings(MEM_RECYCLE_RSS_MB=1000):
+                memwatch.maybe_recycle()
+                self.assertFalse(memwatch.is_recycling())
+            with override_settings(MEM_RECYCLE_RSS_MB=800):
+                memwatch.maybe_recycle()
+                memwatch.maybe_recycle()  # sekali saja
+                self.assertTrue(memwatch.is_recycling())
+        thread.return_value.start.assert_called_once_with()
+        self.assertIs(thread.call_args.kwargs["target"], memwatch._drain_and_exit)
+
+    def test_recycling_worker_returns_503(self):
+        from unittest import mock
+        from api import memwatch
+
+        with mock.patch.object(memwatch, "_recycling", True), mock.patch.object(memwatch, "begin_request") as begin:
+            resp = self.client.get("/api/health")
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp["Retry-After"], "1")
+        begin.assert_not_called()
+
+
+def _tiny_classifier(num_classes, img_size=4):
+    import torch.nn as nn
+
+    return nn.Sequential(nn.Flatten(), nn.Linear(3 * img_size * img_size, num_classes)).eval()
+
+
+class ModelReloadTests(SimpleTestCase):
+    """Hot-reload: smoke test gagal → model lama tetap; snapshot aktif selalu konsisten; model shadow."""
+
+    def setUp(self):
+        import tempfile
+        from unittest import mock
+        from api import model_loader
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.ckpt = os.path.join(tmp.name, "model.pt")
+        with open(self.ckpt, "wb") as f:
+            f.write(b"ckpt-1")
+        for name, value in (("_active", None), ("_last_swap", {}), ("_shadow", None)):
+            p = mock.patch.object(model_loader, name, value)
+            p.start()
+            self.addCleanup(p.stop)
+
+    def _loader(self, *specs):
+        """_load_checkpoint palsu: tiap pemanggilan memakai (jumlah output, jumlah kelas) berikutnya."""
+        from itertools import cycle
+
+        specs = cycle(specs)
+
+        def load(path, labels_json):
+            n_out, n_cls = next(specs)
+            return _tiny_classifier(n_out), [f"k{i}" for i in range(n_cls)], 4
+        return load
+
+    def test_failed_smoke_test_keeps_old_model(self):
+        from unittest import mock
+        from api import model_loader
+
+        with mock.patch.object(model_loader, "_load_checkpoint", side_effect=self._loader((3, 3), (2, 3))), \
+                self.assertLogs("api.model_loader", level="INFO"):
+            model_loader.reload_model(self.ckpt)
+            before, swap = model_loader._active, model_loader.model_status()["last_swap"]
+            with self.assertRaisesRegex(RuntimeError, "Smoke test gagal"):
+                model_loader.reload_model(self.ckpt)  # output 2 kelas, label 3
+        self.assertIs(model_loader._active, before)
+        self.assertEqual(model_loader.model_status()["last_swap"], swap)
+
+    def test_swap_is_atomic_for_readers(self):
+        import threading
+        import torch
+        from unittest import mock
+        from api import model_loader
+
+        bad = []
+        stop = threading.Event()
+
+        def reader():
+            while not stop.is_set():
+                model, classes, img_size, _ = model_loader.get_model_and_meta()
+                with torch.inference_mode():
+                    out = model(torch.zeros(1, 3, img_size, img_size))
+                if out.shape[1] != len(classes):
+                    bad.append((out.shape[1], len(classes)))
+
+        with mock.patch.object(model_loader, "_load_checkpoint", side_effect=self._loader((3, 3), (5, 5))), \
+                self.assertLogs("api.model_loader", level="INFO"):
+            model_loader.reload_model(self.ckpt)
+            threads = [threading.Thread(target=reader) for _ in range(3)]
+            for t in threads:
+                t.start()
+            for _ in range(12):
+                model_loader.reload_model(self.ckpt)
+            stop.set()
+            for t in threads:
+                t.join()
+        self.assertEqual(bad, [])
+
+    def test_shadow_model(self):
+        from django.test import override_settings
+        from unittest import mock
+        from api import model_loader
+
+        with override_settings(SHADOW_CKPT_PATH=""):
+            self.assertIsNone(model_loader.get_shadow_model())
+
+        with override_settings(SHADOW_CKPT_PATH=self.ckpt), \
+                mock.patch.object(model_loader, "_load_checkpoint", side_effect=self._loader((3, 3))) as load:
+            snap = model_loader.get_shadow_model()
+            self.assertIs(model_loader.get_shadow_model(), snap)  # dimuat sekali per proses
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual((snap[1], snap[2], snap[4]), (["k0", "k1", "k2"], 4, model_loader._file_version(self.ckpt)))
+
+    def test_broken_shadow_is_not_retried(self):
+        from django.test import override_settings
+        from unittest import mock
+        from api import model_loader
+
+        with override_settings(SHADOW_CKPT_PATH=self.ckpt), \
+                mock.patch.object(model_loader, "_load_checkpoint", side_effect=self._loader((2, 3))) as load, \
+                self.assertLogs("api.model_loader", level="ERROR"):
+            self.assertIsNone(model_loader.get_shadow_model())
+            self.assertIsNone(model_loader.get_shadow_model())
+        self.assertEqual(load.call_count, 1)
+
+    def test_command_warns_without_watcher(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from django.test import override_settings
+        from unittest import mock
+
+        info = {"version": "abc", "classes": 3, "img_size": 4}
+        out, err = StringIO(), StringIO()
+        with override_settings(CKPT_PATH=self.ckpt, MODEL_WATCH_S=0), \
+                mock.patch("api.management.commands.reload_model.validate_checkpoint", return_value=info):
+            call_command("reload_model", stdout=out, stderr=err)
+        self.assertIn("MODEL_WATCH_S <= 0", err.getvalue())
+        self.assertNotIn("Reload dipicu", out.getvalue())
+
+
+class PrefixCacheTests(SimpleTestCase):
+    """Prefix cache di atas klien Gemini palsu: hit, miss, cache hilang → fallback, error lain diteruskan."""
+
+    def _cache(self, **kw):
+        from api.llm.prefix_cache import PrefixCache
+
+        return PrefixCache("SYSTEM " * 200, ttl_s=60, **kw)
+
+    def test_hit_registers_once(self):
+        from api.llm.fake_client import FakeGenaiClient
+
+        pc, cli = self._cache(), FakeGenaiClient()
+        pc.generate(cli, "m", "suffix 1")
+        pc.generate(cli, "m", "suffix 2")
+        s = pc.snapshot()
+        self.assertEqual((s["registrations"], s["hits"], s["misses"]), (1, 2, 0))
+        self.assertGreater(s["cached_tokens"], 0)
+
+    def test_miss_without_cache_support(self):
+        from types import SimpleNamespace
+        from unittest import mock
+        from api.llm.fake_client import FakeGenaiClient
+
+        pc = self._cache()
+        models = mock.Mock(wraps=FakeGenaiClient().models)
+        pc.generate(SimpleNamespace(models=models), "m", "suffix")
+        self.assertEqual(models.generate_content.call_args.kwargs["config"]["system_instruction"], pc.prefix)
+        self.assertEqual((pc.snapshot()["hits"], pc.snapshot()["misses"]), (0, 1))
+
+    def test_failed_registration_backs_off(self):
+        from unittest import mock
+        from api.llm.fake_client import FakeGenaiClient
+
+        pc, cli = self._cache(), FakeGenaiClient()
+        with mock.patch.object(cli.caches, "create", side_effect=RuntimeError("min token count")) as create:
+            pc.generate(cli, "m", "a")
+            pc.generate(cli, "m", "b")
+        create.assert_called_once()
+        s = pc.snapshot()
+        self.assertEqual((s["registration_errors"], s["misses"]), (1, 2))
+
+    def test_expired_cache_falls_back_and_reregisters(self):
+        from api.llm import fake_client
+        from api.llm.fake_client import FakeGenaiClient
+
+        pc, cli = self._cache(), FakeGenaiClient()
+        pc.generate(cli, "m", "a")
+        handle = pc._handles["m"][0]
+        fake_client._caches.pop(handle)  # kedaluwarsa di sisi provider
+        with self.assertLogs("api.llm.prefix_cache", level="WARNING"):
+            resp = pc.generate(cli, "m", "b")
+        self.assertIn("Penjelasan", resp.text)
+        self.assertNotIn("m", pc._handles)
+        pc.generate(cli, "m", "c")
+        s = pc.snapshot()
+        self.assertEqual((s["registrations"], s["hits"], s["misses"]), (2, 2, 1))
+        self.assertNotEqual(pc._handles["m"][0], handle)
+
+    def test_cache_missing_classifier(self):
+        from api.llm.prefix_cache import _cache_missing
+
+        def err(msg, code=None):
+            e = RuntimeError(msg)
+            e.code = code
+            return e
+
+        self.assertTrue(_cache_missing(err("cached content not found: x")))
+        self.assertTrue(_cache_missing(err("CachedContent has expired", 403)))
+        self.assertFalse(_cache_missing(err("cached content not found", 429)))
+        self.assertFalse(_cache_missing(err("resource exhausted", 404)))
+        self.assertFalse(_cache_missing(TimeoutError("timeout")))
+
+    def test_other_errors_are_reraised(self):
+        from unittest import mock
+        from api.llm.fake_client import FakeGenaiClient
+
+        pc, cli = self._cache(), FakeGenaiClient()
+        pc.generate(cli, "m", "a")
+        handle = pc._handles["m"][0]
+        quota = RuntimeError("429 RESOURCE_EXHAUSTED")
+        quota.code = 429
+        with mock.patch.object(cli.models, "generate_content", side_effect=quota) as gen, \
+                self.assertRaises(RuntimeError):
+            pc.generate(cli, "m", "b")
+        gen.assert_called_once()  # tanpa panggilan fallback kedua
+        self.assertEqual(pc._handles["m"][0], handle)  # cache tetap dipakai
+
+    def test_concurrent_requests_register_once(self):
+        import threading
+        import time
+        from unittest import mock
+        from api.llm.fake_client import FakeGenaiClient
+
+        pc, cli = self._cache(), FakeGenaiClient()
+        real_create = cli.caches.create
+
+        def slow_create(**kw):
+            time.sleep(0.05)
+            return real_create(**kw)
+
+        with mock.patch.object(cli.caches, "create", side_effect=slow_create) as create:
+            threads = [threading.Thread(target=pc.generate, args=(cli, "m", f"q{i}")) for i in range(6)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        create.assert_called_once()
+        self.assertEqual(pc.snapshot()["hits"], 6)
+
+
+class SemanticCacheTests(SimpleTestCase):
+    """Cache semantik: ambang cosine, TTL, LRU, invalidasi versi, render ulang ⟦CONF⟧."""
+
+    # pertanyaan → arah embedding; cos(a, a2) = 0.96, cos(a, b) = 0.6
+    _VECS = {"a": (1.0, 0.0), "a2": (0.96, 0.28), "b": (0.6, 0.8), "c": (0.0, 1.0)}
+
+    def _embed(self, texts):
+        return [np.asarray(self._VECS[t.rsplit("| ", 1)[1]], dtype=np.float32) for t in texts]
+
+    def _cache(self, **kw):
+        from api.llm.semantic_cache import SemanticCache
+
+        return SemanticCache(self._embed, **{"threshold": 0.9, "ttl_s": 60.0, "max_entries": 16, **kw})
+
+    def test_threshold_and_group(self):
+        sc = self._cache()
+        sc.put(sc.make_key("pitting", 0.83, "umum", "a"), "A", "v1", 100.0)
+        self.assertEqual(sc.get(sc.make_key("pitting", 0.86, "umum", "a2"), "v1"), "A")  # cos 0.96, bucket 8
+        self.assertIsNone(sc.get(sc.make_key("pitting", 0.83, "umum", "b"), "v1"))        # cos 0.6 < ambang
+        self.assertIsNone(sc.get(sc.make_key("pitting", 0.93, "umum", "a"), "v1"))        # bucket lain
+        self.assertIsNone(sc.get(sc.make_key("psoriasis", 0.83, "umum", "a"), "v1"))      # label lain
+        s = sc.snapshot()
+        self.assertEqual((s["hits"], s["misses"], s["saved_ms"]), (1, 3, 100.0))
+
+    def test_ttl_expiry(self):
+        from unittest import mock
+        from api.llm import semantic_cache
+
+        sc = self._cache(ttl_s=60.0)
+        key = sc.make_key("pitting", 0.8, "umum", "a")
+        with mock.patch.object(semantic_cache.time, "time", return_value=1000.0):
+            sc.put(key, "A", "v1", 1.0)
+        with mock.patch.object(semantic_cache.time, "time", return_value=1059.0):
+            self.assertEqual(sc.get(key, "v1"), "A")
+        with mock.patch.object(semantic_cache.time, "time", return_value=1061.0):
+            self.assertIsNone(sc.get(key, "v1"))
+        self.assertEqual((sc.snapshot()["stale"], sc.snapshot()["entries"]), (1, 0))
+
+    def test_lru_eviction(self):
+        sc = self._cache(max_entries=2)
+        ka, kb, kc = (sc.make_key("pitting", 0.8, "umum", q) for q in ("a", "b", "c"))
+        sc.put(ka, "A", "v1", 1.0)
+        sc.put(kb, "B", "v1", 1.0)
+        self.assertEqual(sc.get(ka, "v1"), "A")  # A jadi terbaru → B yang dibuang
+        sc.put(kc, "C", "v1", 1.0)
+        self.assertEqual((sc.get(ka, "v1"), sc.get(kb, "v1"), sc.get(kc, "v1")), ("A", None, "C"))
+        self.assertEqual(sc.snapshot()["evictions"], 1)
+
+    def test_version_change_invalidates(self):
+        from unittest import mock
+        from api.llm import llm
+
+        with mock.patch.object(llm, "index_version", return_value="idx1"):
+            v1 = llm._cache_version()
+        with mock.patch.object(llm, "index_version", return_value="idx2"):
+            v2 = llm._cache_version()
+        with mock.patch.object(llm, "index_version", return_value="idx1"), \
+                mock.patch.object(llm._prefix_cache, "digest", "prefix-lain"):
+            v3 = llm._cache_version()
+        self.assertEqual(len({v1, v2, v3}), 3)  # index RAG atau prefix prompt berubah → versi baru
+
+        sc = self._cache()
+        key = sc.make_key("pitting", 0.8, "umum", "a")
+        sc.put(key, "A", v1, 1.0)
+        self.assertIsNone(sc.get(key, v2))
+        self.assertIsNone(sc.get(key, v1))  # entri lama sudah dibuang, tidak hidup lagi
+        self.assertEqual(sc.snapshot()["stale"], 1)
+
+    def test_conf_rerendered_on_hit(self):
+        from unittest import mock
+        from django.test import override_settings
+        from api.llm import llm
+        from api.llm.fake_client import FakeGenaiClient
+
+        sc = self._cache()
+        with override_settings(SEMANTIC_CACHE_ENABLED=True), mock.patch.object(llm, "_semantic_cache", sc), \
+                mock.patch.object(llm, "_cache_version", return_value="v"), \
+                mock.patch.object(llm, "_detect_intent", return_value="umum"), \
+                mock.patch.object(llm, "retrieve_multi_smart", return_value=[]) as retrieve, \
+                mock.patch.object(llm, "_client", return_value=FakeGenaiClient()):
+            first = llm.explain_prediction("pitting", 0.831, {"pitting": 0.831}, "a")
+            second = llm.explain_prediction("pitting", 0.867, {"pitting": 0.867}, "a2")
+        retrieve.assert_called_once()  # giliran kedua dari cache
+        self.assertIn("83,1%", first)
+        self.assertIn("**Keyakinan model:** **86,7%**", second)
+        self.assertNotIn("83,1%", second)
+        self.assertNotIn(llm._CONF_SLOT, second)
+
+
+class ScoreImagesTests(SimpleTestCase):
+    """score_images --retry-errors: path yang diulang hanya punya satu baris di CSV."""
+
+    def test_retry_errors_rewrites_csv(self):
+        import csv
+        import tempfile
+        from io import StringIO
+        from pathlib import Path
+        from unittest import mock
+        import torch
+        from django.core.management import call_command
+        from django.test import override_settings
+
+        with tempfile.TemporaryDirectory() as d:
+            d = Path(d)
+            for name in ("a.png", "b.png"):
+                (d / "img" / name).parent.mkdir(exist_ok=True)
+                (d / "img" / name).write_bytes(_png_bytes((4, 4)))
+            a, b = str(d / "img" / "a.png"), str(d / "img" / "b.png")
+            gone = str(d / "lama" / "c.png")  # bukan bagian input kali ini: baris error-nya dibiarkan
+            classes = ["k0", "k1", "k2"]
+            header = ["path", "label", "confidence", "tta", "model_version", "error"] + [f"p_{c}" for c in classes]
+            out = d / "skor.csv"
+            with out.open("w", newline="", encoding="utf-8") as f:
+                w = csv.writer(f)
+                w.writerow(header)
+                w.writerow([a, "k0", "0.9", 0, "v", "", "0.9", "0.05", "0.05"])
+                w.writerow([b, "", "", "", "v", "OSError: rusak", "", "", ""])
+                w.writerow([gone, "", "", "", "v", "OSError: rusak", "", "", ""])
+
+            snap = (_tiny_classifier(3), classes, 4, torch.device("cpu"))
+            with override_settings(ROI_CROP=False), \
+                    mock.patch("api.management.commands.score_images.get_model_and_meta", return_value=snap):
+                call_command("score_images", input=str(d / "img"), out=str(out), workers=0, tta="never",
+                             retry_errors=True, stdout=StringIO())
+
+            with out.open(newline="", encoding="utf-8") as f:
+                rows = list(csv.DictReader(f))
+            self.assertFalse((d / "skor.csv.tmp").exists())
+        by_path = {}
+        for r in rows:
+            by_path.setdefault(r["path"], []).append(r)
+        self.assertEqual(sorted(len(v) for v in by_path.values()), [1, 1, 1])
+        self.assertEqual(by_path[a][0]["confidence"], "0.9")  # baris lama tidak disentuh
+        self.assertEqual(by_path[b][0]["error"], "")
+        self.assertIn(by_path[b][0]["label"], classes)
+        self.assertEqual(by_path[gone][0]["error"], "OSError: rusak")
+
+
+class _FixedLogits:
+    """Model palsu: logits tetap untuk input asli, logits lain untuk input ter-flip (dideteksi dari piksel)."""
+
+    def __init__(self, logits, flipped_logits=None):
+        import torch
+
+        self.logits = torch.tensor([logits], dtype=torch.float32)
+        self.flipped = torch.tensor([flipped_logits or logits], dtype=torch.float32)
+        self.calls = 0
+
+    def __call__(self, x):
+        self.calls += 1
+        # gambar uji: kolom kiri terang, kanan gelap → setelah mirror terbalik
+        return self.logits if x[0, 0, 0, 0] > x[0, 0, 0, -1] else self.flipped
+
+
+def _half_bright(size=8):
+    from PIL import Image
+
+    im = Image.new("RGB", (size, size), (0, 0, 0))
+    im.paste((255, 255, 255), (0, 0, size // 2, size))
+    return im
+
+
+class CalibratedInferenceTests(SimpleTestCase):
+    """Early-exit adaptif, temperature di semua mode TTA, kalibrasi per versi model."""
+
+    _CALIB = {"temperature": 1.0, "exit_threshold": 0.9, "exit_margin": 0.5}
+
+    def _softmax(self, logits, T=1.0):
+        z = np.asarray(logits, dtype=np.float64) / T
+        e = np.exp(z - z.max())
+        return e / e.sum()
+
+    def test_adaptive_exits_when_confident(self):
+        import torch
+        from api.inference import _run_adaptive
+
+        model = _FixedLogits([8.0, 0.0, 0.0])
+        probs, early = _run_adaptive(model, 8, torch.device("cpu"), _half_bright(), self._CALIB)
+        self.assertTrue(early)
+        self.assertEqual(model.calls, 1)
+        np.testing.assert_allclose(probs, self._softmax([8.0, 0.0, 0.0]), rtol=1e-5)
+
+    def test_adaptive_flips_when_unsure(self):
+        import torch
+        from api.inference import _run_adaptive
+
+        model = _FixedLogits([1.0, 0.8, 0.0], flipped_logits=[0.0, 2.0, 0.0])
+        probs, early = _run_adaptive(model, 8, torch.device("cpu"), _half_bright(), self._CALIB)
+        self.assertFalse(early)
+        self.assertEqual(model.calls, 2)
+        expect = (self._softmax([1.0, 0.8, 0.0]) + self._softmax([0.0, 2.0, 0.0])) / 2
+        np.testing.assert_allclose(probs, expect, rtol=1e-5)
+
+    def test_temperature_decides_exit(self):
+        import torch
+        from api.inference import _run_adaptive
+
+        # T=1: p_max ≈ 0.96 → exit; T=3: p_max ≈ 0.66 → flip
+        _, early = _run_adaptive(_FixedLogits([4.0, 0.0, 0.0]), 8, torch.device("cpu"), _half_bright(), self._CALIB)
+        self.assertTrue(early)
+        _, early = _run_adaptive(_FixedLogits([4.0, 0.0, 0.0]), 8, torch.device("cpu"), _half_bright(),
+                                 {**self._CALIB, "temperature": 3.0})
+        self.assertFalse(early)
+
+    def test_temperature_applies_without_auto(self):
+        import torch
+        from unittest import mock
+        from api import inference
+
+        snap = (_FixedLogits([2.0, 0.0, 0.0]), ["a", "b", "c"], 8, torch.device("cpu"))
+        for tta in (False, True):
+            with mock.patch.object(inference, "get_model_and_meta", return_value=snap), \
+                    mock.patch.object(inference, "get_calibration", return_value={**self._CALIB, "temperature": 2.0}), \
+                    mock.patch.object(inference.shadow, "maybe_submit"):
+                out, early = inference._predict_local(_half_bright(), tta)
+            self.assertIsNone(early)
+            self.assertAlmostEqual(out["confidence"], self._softmax([2.0, 0.0, 0.0], T=2.0)[0], places=5)
+
+    def test_calibration_keyed_by_version(self):
+        import json
+        import tempfile
+        from unittest import mock
+        from django.test import override_settings
+        from api import inference
+
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "calibration.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"ckpt_version": "v1", "temperature": 1.7, "exit_threshold": 0.8}, f)
+            with override_settings(CALIBRATION_PATH=path, EARLY_EXIT_THRESHOLD=0.95, EARLY_EXIT_MARGIN=0.3), \
+                    mock.patch.object(inference, "_calib", {}):
+                v1 = inference.get_calibration("v1")
+                with self.assertLogs("api.inference", level="WARNING"):
+                    v2 = inference.get_calibration("v2")  # kalibrasi milik checkpoint lain
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump({"ckpt_version": "v1", "temperature": 9.0}, f)
+                again = inference.get_calibration("v1")  # di-cache per versi
+                with mock.patch.object(inference, "model_status", return_value={"version": "v2"}):
+                    active = inference.get_calibration()
+        self.assertEqual((v1["temperature"], v1["exit_threshold"], v1["exit_margin"], v1["source"]), (1.7, 0.8, 0.3, path))
+        self.assertEqual((v2["temperature"], v2["exit_threshold"], v2["source"]), (1.0, 0.95, "default"))
+        self.assertIs(again, v1)
+        self.assertIs(active, v2)
+
+
+def _unit_rows(n, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.standard_normal((n, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+class KBBundleTests(SimpleTestCase):
+    """Bundle KB: round-trip write/baca, checksum & model embedding, hot-swap yang menolak bundle rusak."""
+
+    _LABELS = ["healthy", "pitting", "onychomycosis"]
+
+    def setUp(self):
+        import tempfile
+        from pathlib import Path
+        from unittest import mock
+        from api import kb_bundle
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        for name, value in (("BUNDLE_DIR", self.dir), ("POLL_S", 0.0), ("_active", None),
+                            ("_pointer_sig", None), ("_last_check", 0.0)):
+            p = mock.patch.object(kb_bundle, name, value)
+            p.start()
+            self.addCleanup(p.stop)
+
+    def _write(self, name="kb-1.nkb", labels=None, emb_model="emb-test"):
+        from api.kb_bundle import write_bundle
+
+        coll = {
+            "ids": ["d0", "d1", "d2"],
+            "documents": ["kuku rapuh dan kering", "jamur kuku kuning tebal", "bintik cekung pada kuku"],
+            "metadatas": [{"label": "healthy"}, {"label": "onychomycosis"}, None],
+            "embeddings": _unit_rows(3),
+        }
+        version = write_bundle(self.dir / name, {"local": coll}, {"jamur": ["onikomikosis"]},
+                               self._LABELS if labels is None else labels, emb_model)
+        return self.dir / name, version, coll
+
+    def test_round_trip(self):
+        from api.kb_bundle import KBBundle
+
+        path, version, coll = self._write()
+        b = KBBundle(path, emb_model="emb-test")
+        self.assertEqual((b.version, b.labels, b.aliases), (version, self._LABELS, {"jamur": ["onikomikosis"]}))
+        c = b.collections["local"]
+        got = c.get(["d2", "d0", "x"])
+        self.assertEqual(got["ids"], ["d2", "d0"])
+        self.assertEqual(got["documents"], ["bintik cekung pada kuku", "kuku rapuh dan kering"])
+        self.assertEqual(got["metadatas"], [{}, {"label": "healthy"}])
+        np.testing.assert_array_equal(c.emb, coll["embeddings"])
+        res = c.query([coll["embeddings"][1]], n_results=1)
+        self.assertEqual(res["ids"], [["d1"]])
+        self.assertAlmostEqual(res["distances"][0][0], 0.0, places=5)
+        self.assertIn("d1", [d for d, _ in b.bm25["local"].search("jamur kuning", 2)])
+
+    def test_checksum_and_model_rejected(self):
+        from api.kb_bundle import KBBundle
+
+        path, _, _ = self._write()
+        with self.assertRaisesRegex(ValueError, "model embedding"):
+            KBBundle(path, emb_model="model-lain")
+        raw = bytearray(path.read_bytes())
+        raw[-70] ^= 0xFF  # payload rusak
+        path.write_bytes(bytes(raw))
+        with self.assertRaisesRegex(ValueError, "Checksum"):
+            KBBundle(path, emb_model="emb-test")
+
+    def test_bad_pointer_keeps_old_bundle(self):
+        from functools import partial
+        from unittest import mock
+        from api import kb_bundle
+
+        _, good_version, _ = self._write("kb-1.nkb")
+        self._write("kb-2.nkb", labels=["healthy", "lain"])
+        real = kb_bundle.KBBundle
+
+        def swap_to(name):
+            kb_bundle.publish(self.dir / name)
+            kb_bundle._last_check = 0.0
+            return kb_bundle.active_bundle()
+
+        with mock.patch.object(kb_bundle, "KBBundle", partial(real, emb_model="emb-test")), \
+                mock.patch("api.model_loader.loaded_class_names", return_value=list(self._LABELS)):
+            self.assertEqual(swap_to("kb-1.nkb").version, good_version)
+            with self.assertLogs("api.kb_bundle", level="ERROR"):
+                self.assertEqual(swap_to("tidak-ada.nkb").version, good_version)
+            with self.assertLogs("api.kb_bundle", level="ERROR") as logs:
+                self.assertEqual(swap_to("kb-2.nkb").version, good_version)  # label beda dari model
+        self.assertIn("tidak cocok", logs.output[0])
+
+
+class QuantizedSearchTests(SimpleTestCase):
+    """Pencarian dua tahap int8/biner vs brute force float32, arsip tunggal, pemetaan jarak koleksi."""
+
+    def _index(self, n=200, dim=32):
+        from api.qemb import QuantizedIndex
+
+        return QuantizedIndex.build([f"d{i}" for i in range(n)], _unit_rows(n, dim, seed=1))
+
+    def test_search_matches_exact_with_rescoring(self):
+        index = self._index()
+        q = _unit_rows(1, 32, seed=2)[0]
+        exact_idx, exact_sims = index.search(q, 5, mode="off")
+        np.testing.assert_allclose(exact_sims, np.sort(index.emb @ q)[::-1][:5], rtol=1e-5)
+        for mode in ("int8", "binary"):
+            idx, sims = index.search(q, 5, mode=mode, rescore_factor=40)  # kandidat = seluruh index
+            np.testing.assert_array_equal(idx, exact_idx)
+            np.testing.assert_allclose(sims, exact_sims, rtol=1e-5)  # skor akhir float32 eksak
+        self.assertEqual(len(index.search(q, 999, mode="int8")[0]), 200)
+        self.assertEqual(len(index.search(q, 0, mode="int8")[0]), 0)
+
+    def test_recall_at_k(self):
+        from api.qemb import recall_at_k
+
+        index = self._index()
+        queries = _unit_rows(20, 32, seed=3)
+        self.assertEqual(recall_at_k(index, queries, 5, "int8", rescore_factor=40), 1.0)
+        r_int8 = recall_at_k(index, queries, 5, "int8", rescore_factor=4)
+        r_bin = recall_at_k(index, queries, 5, "binary", rescore_factor=1)
+        self.assertGreaterEqual(r_int8, 0.8)
+        self.assertTrue(0.0 <= r_bin <= 1.0)
+
+    def test_save_load_single_archive(self):
+        import tempfile
+        from pathlib import Path
+        from api import qemb
+
+        index = self._index(n=50)
+        with tempfile.TemporaryDirectory() as d:
+            np.save(qemb.f32_path(d, "kb"), np.zeros((1, 1), np.float32))  # sisa format lama
+            index.save(Path(d), "kb")
+            self.assertEqual(sorted(p.name for p in Path(d).iterdir()), ["kb.qemb.npz"])
+            loaded = qemb.maybe_load(Path(d), "kb")
+            self.assertIsInstance(loaded.emb, np.memmap)
+            np.testing.assert_array_equal(loaded.emb, index.emb)
+            np.testing.assert_array_equal(loaded.codes, index.codes)
+            np.testing.assert_array_equal(loaded.ids, index.ids)
+            del loaded
+            self.assertIsNone(qemb.maybe_load(Path(d), "lain"))
+
+    def test_collection_distance_mapping(self):
+        from api.qemb import QuantizedCollection
+
+        index = self._index(n=20)
+
+        class _Chroma:
+            def get(self, ids):
+                keep = [i for i in reversed(ids) if i != "d3"]  # urutan lain + satu id hilang
+                return {"ids": keep, "documents": [f"teks {i}" for i in keep], "metadatas": [{"id": i} for i in keep]}
+
+        q = index.emb[3]
+        out = QuantizedCollection(_Chroma(), index, mode="int8", rescore_factor=20).query([q], n_results=4)
+        idx, sims = index.search(q, 4, "int8", 20)
+        want = [(f"d{i}", s) for i, s in zip(idx, sims) if i != 3]
+        self.assertEqual(out["ids"], [[d for d, _ in want]])
+        self.assertEqual(out["documents"], [[f"teks {d}" for d, _ in want]])
+        self.assertEqual(out["metadatas"], [[{"id": d} for d, _ in want]])
+        np.testing.assert_allclose(out["distances"][0], [2.0 - 2.0 * s for _, s in want], rtol=1e-5)
+        self.assertTrue(all(0.0 <= x <= 4.0 for x in out["distances"][0]))
+
+    def test_retrieve_uses_active_collections(self):
+        from unittest import mock
+        from api import rag
+
+        col = mock.Mock()
+        col.query.return_value = {"ids": [["a"]], "documents": [["teks"]], "metadatas": [[{"source": "kb"}]]}
+        with mock.patch.object(rag, "_get_collections", return_value=(col, mock.Mock())), \
+                mock.patch.object(rag, "embed", return_value=np.zeros((1, 4), np.float32)), \
+                mock.patch.object(rag, "_get_client") as client:
+            self.assertEqual(rag.retrieve("kuku", k=1), [{"text": "teks", "source": "kb", "id": "a"}])
+        client.assert_not_called()
+
+
+def _asymmetric_image(size=48):
+    """Gambar tidak simetris (gradien + kotak) agar salah susun/flip piksel terlihat di probs."""
+    from PIL import Image
+
+    arr = np.zeros((size, size + 8, 3), dtype=np.uint8)
+    arr[..., 0] = np.linspace(0, 255, size + 8, dtype=np.uint8)[None, :]
+    arr[..., 1] = np.linspace(255, 0, size, dtype=np.uint8)[:, None]
+    arr[4:12, 6:30, 2] = 255
+    return Image.fromarray(arr, "RGB")
+
+
+class InferPoolTests(SimpleTestCase):
+    """Pool proses inferensi: gating enabled(), retry sekali saat pool rusak, round trip shared memory."""
+
+    def test_enabled_gates_embed_and_predict(self):
+        from unittest import mock
+        from django.test import override_settings
+        from api import inference, infer_pool, rag
+
+        pred = ({"label": "a", "confidence": 1.0, "probs": {"a": 1.0}}, None)
+        with mock.patch.object(infer_pool, "embed", return_value="pool") as pool_embed, \
+                mock.patch.object(infer_pool, "predict", return_value=pred) as pool_predict, \
+                mock.patch.object(rag, "_get_encoder") as encoder, \
+                mock.patch.object(inference, "_predict_local", return_value=pred) as local:
+            encoder.return_value.encode.return_value = "lokal"
+            with override_settings(INFER_POOL_WORKERS=0):
+                self.assertEqual(rag.embed(["x"]), "lokal")
+                inference.predict_image(object(), tta=False)
+            with override_settings(INFER_POOL_WORKERS=1):
+                self.assertEqual(rag.embed(["x"]), "pool")
+                inference.predict_image(object(), tta=False)
+                with mock.patch.object(infer_pool, "_in_worker", True):  # di dalam proses pool: inline
+                    self.assertFalse(infer_pool.enabled())
+                    self.assertEqual(rag.embed(["x"]), "lokal")
+        self.assertEqual((pool_embed.call_count, pool_predict.call_count, local.call_count), (1, 1, 1))
+
+    def test_broken_pool_is_replaced_and_retried_once(self):
+        from concurrent.futures.process import BrokenProcessPool
+        from unittest import mock
+        from api import infer_pool
+
+        broken, fresh = mock.Mock(), mock.Mock()
+        broken.submit.return_value.result.side_effect = BrokenProcessPool("worker mati")
+        fresh.submit.return_value.result.return_value = "ok"
+        pools = iter([broken, fresh])
+
+        def get_pool():
+            if infer_pool._pool is None:
+                infer_pool._pool = next(pools)
+            return infer_pool._pool
+
+        with mock.patch.object(infer_pool, "_pool", None), mock.patch.object(infer_pool, "_get_pool", side_effect=get_pool), \
+                self.assertLogs("api.infer_pool", level="WARNING"):
+            self.assertEqual(infer_pool._submit(len, "abc"), "ok")
+            self.assertIs(infer_pool._pool, fresh)
+        broken.shutdown.assert_called_once_with(wait=False, cancel_futures=True)
+        fresh.submit.assert_called_once_with(len, "abc")
+
+    def test_second_failure_propagates(self):
+        from concurrent.futures.process import BrokenProcessPool
+        from unittest import mock
+        from api import infer_pool
+
+        pool = mock.Mock()
+        pool.submit.return_value.result.side_effect = BrokenProcessPool("worker mati")
+        with mock.patch.object(infer_pool, "_pool", None), mock.patch.object(infer_pool, "_get_pool", return_value=pool), \
+                self.assertLogs("api.infer_pool", level="WARNING"), self.assertRaises(BrokenProcessPool):
+            infer_pool._submit(len, "abc")
+        self.assertEqual(pool.submit.call_count, 2)
+
+    def test_single_worker_process_round_trip(self):
+        """INFER_POOL_WORKERS=1 sungguhan: hasil via shared memory = inferensi inline; worker dibunuh → pool baru."""
+        import signal
+        import tempfile
+        import torch
+        from unittest import mock
+        from django.test import override_settings
+        from api import infer_pool, inference, model_loader
+
+        classes = ["healthy", "pitting", "onychomycosis"]
+        with tempfile.TemporaryDirectory() as d:
+            ckpt = os.path.join(d, "model.pt")
+            torch.manual_seed(0)
+            net = model_loader._build_efficientnet_b0_variant(len(classes), nested_head=False)
+            torch.save({"model_state": net.state_dict(), "class_names": classes, "img_size": 64}, ckpt)
+            env = {"CKPT_PATH": ckpt, "INFER_POOL_WORKERS": "1", "INFER_POOL_THREADS": "1",
+                   "INFER_POOL_AFFINITY": "0", "MODEL_WATCH_S": "0", "SHADOW_CKPT_PATH": ""}
+            pil = _asymmetric_image()
+            with mock.patch.dict(os.environ, env), \
+                    override_settings(CKPT_PATH=ckpt, INFER_POOL_WORKERS=1, INFER_POOL_THREADS=1,
+                                      INFER_POOL_AFFINITY=False, MODEL_WATCH_S=0, SHADOW_SAMPLE_RATE=0.0), \
+                    mock.patch.object(infer_pool, "_pool", None), \
+                    mock.patch.object(model_loader, "_active", None), \
+                    mock.patch.object(model_loader, "_last_swap", {}), \
+                    mock.patch.object(inference, "_calib", {}), \
+                    self.assertLogs("api", level="INFO"):
+                try:
+                    local, _ = inference._predict_local(pil, False)
+                    remote, early = infer_pool.predict(pil, False)
+                    self.assertIsNone(early)
+                    self.assertEqual(remote["label"], local["label"])
+                    for k in classes:
+                        self.assertAlmostEqual(remote["probs"][k], local["probs"][k], places=4)
+
+                    (pid,) = list(infer_pool._pool._processes)
+                    os.kill(pid, signal.SIGKILL)
+                    again, _ = infer_pool.predict(pil, False)  # pool rusak → pool baru, request diulang
+                    self.assertAlmostEqual(again["confidence"], local["confidence"], places=4)
+                    self.assertNotIn(pid, infer_pool._pool._processes)
+                finally:
+                    if infer_pool._pool is not None:
+                        infer_pool._pool.shutdown(wait=True, cancel_futures=True)
+
+
+_NAIL, _BACKGROUND = (245, 215, 200), (30, 60, 160)
+# kulit bergradasi kiri→kanan: makin terang makin jenuh, sehingga hanya lempeng kuku yang terang & pucat
+_SKIN_DARK, _SKIN_BRIGHT = (190, 150, 130), (235, 170, 130)
+
+
+def _hand_image(w=256, h=192, skin=(60, 40, 200, 180), nail=(100, 60, 140, 100)):
+    """Latar biru, area kulit, dan lempeng kuku sebagai kotak (koordinat untuk lebar 256, ikut diskalakan)."""
+    from PIL import Image
+
+    k = w / 256.0
+    arr = np.empty((h, w, 3), dtype=np.uint8)
+    arr[:] = _BACKGROUND
+    if skin:
+        x0, y0, x1, y1 = (round(v * k) for v in skin)
+        t = np.linspace(0.0, 1.0, x1 - x0)[:, None]
+        arr[y0:y1, x0:x1] = (np.array(_SKIN_DARK) * (1 - t) + np.array(_SKIN_BRIGHT) * t).astype(np.uint8)[None]
+    if nail:
+        x0, y0, x1, y1 = (round(v * k) for v in nail)
+        arr[y0:y1, x0:x1] = _NAIL
+    return Image.fromarray(arr, "RGB")
+
+
+class NailRoiTests(SimpleTestCase):
+    """ROI kuku pada gambar sintetis: mask, kasus tanpa crop, skala koordinat, box persegi di dalam frame."""
+
+    def test_masks(self):
+        from api.roi import _masks
+
+        skin, nail = _masks(_hand_image(128, 96))  # tanpa downscale: koordinat /2
+        self.assertTrue(skin[50, 60] and skin[30, 90])  # kulit & kuku sama-sama kulit
+        self.assertFalse(skin[5, 5])                    # latar
+        ys, xs = np.nonzero(nail)
+        self.assertTrue(len(ys))
+        # lempeng kuku di x 50..70, y 30..50; toleransi 1 px untuk tepi
+        self.assertEqual((xs.min() >= 49, ys.min() >= 29, xs.max() <= 71, ys.max() <= 51), (True,) * 4)
+
+    def test_box_around_nail(self):
+        from django.test import override_settings
+        from api.roi import crop_nail_roi
+
+        with override_settings(ROI_DOWNSCALE=128, ROI_PAD=0.15):
+            out, info = crop_nail_roi(_hand_image())
+        x0, y0, x1, y1 = info["box"]
+        self.assertTrue(x0 <= 100 and y0 <= 60 and x1 >= 140 and y1 >= 100)  # kuku utuh di dalam box
+        self.assertTrue(x0 >= 60 and y0 >= 30 and x1 <= 200 and y1 <= 180)   # jauh lebih kecil dari kulit
+        self.assertLessEqual(abs((x1 - x0) - (y1 - y0)), 2)                  # persegi
+        self.assertEqual(out.size, (x1 - x0, y1 - y0))
+
+    def test_no_crop_cases(self):
+        from django.test import override_settings
+        from api.roi import find_nail_roi
+
+        with override_settings(ROI_DOWNSCALE=128, ROI_PAD=0.15):
+            self.assertIsNone(find_nail_roi(_hand_image(skin=None, nail=None)))   # tidak ada kulit
+            self.assertIsNone(find_nail_roi(_hand_image(skin=(0, 0, 256, 192), nail=None)))  # box ≈ seluruh frame
+
+    def test_box_scales_to_original_coordinates(self):
+        from django.test import override_settings
+        from api.roi import find_nail_roi
+
+        with override_settings(ROI_DOWNSCALE=128, ROI_PAD=0.15):
+            small = find_nail_roi(_hand_image(256, 192))
+            big = find_nail_roi(_hand_image(1024, 768))
+        for a, b in zip(small, big):
+            self.assertLessEqual(abs(a * 4 - b), 8)
+        self.assertTrue(0 <= big[0] < big[2] <= 1024 and 0 <= big[1] < big[3] <= 768)
+
+    def test_bbox_square_fits_frame(self):
+        from api.roi import _bbox
+
+        mask = np.zeros((20, 100), dtype=bool)
+        mask[5:15, 2:98] = True  # objek lebar di frame pendek
+        x0, y0, x1, y1 = _bbox(mask, pad=0.15)
+        self.assertEqual((y0, y1), (0, 20))
+        self.assertEqual(x1 - x0, y1 - y0)
+        self.assertTrue(0 <= x0 and x1 <= 100)
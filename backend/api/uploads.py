@@ -0,0 +1,172 @@
+# api/uploads.py
+"""
+Validasi & decode upload gambar dengan sumber daya terbatas.
+
+1. read_upload(): stream chunk upload ke buffer per-thread yang dipakai ulang (tanpa
+   alokasi bytes baru per request); berhenti begitu melewati UPLOAD_MAX_BYTES.
+2. inspect_image(): baca header saja (PIL lazy open) → format, dimensi, jumlah frame;
+   ditolak sebelum decode penuh bila di luar batas (bom dekompresi, resolusi raksasa, animasi).
+3. decode_image(): decode terbatas — JPEG memakai draft() (skala DCT 1/2..1/8) sehingga
+   decode gambar besar langsung ke ~UPLOAD_DECODE_MAX_SIDE; hasil akhir dibatasi sisi terpanjangnya.
+   Waktu decode & memori piksel per request dicatat (upload_stats()).
+"""
+from __future__ import annotations
+import io, logging, threading, time
+from typing import Dict, Tuple, Union
+
+from django.conf import settings
+from PIL import Image
+
+from . import memwatch
+
+log = logging.getLogger(__name__)
+
+_stats = {
+    "accepted": 0, "presized": 0, "rejected": {}, "bytes_total": 0,
+    "decode_ms_total": 0.0, "decode_ms_max": 0.0, "pixel_mb_max": 0.0,
+}
+_stats_lock = threading.Lock()
+_local = threading.local()
+
+
+class ImageDecodeError(ValueError):
+    status = 400
+
+
+class UploadRejected(ImageDecodeError):
+    """Upload valid secara format tapi melewati batas sumber daya."""
+    status = 413
+
+    def __init__(self, detail: str, reason: str):
+        super().__init__(detail)
+        self.reason = reason
+
+
+def _reject(detail: str, reason: str) -> UploadRejected:
+    with _stats_lock:
+        _stats["rejected"][reason] = _stats["rejected"].get(reason, 0) + 1
+    return UploadRejected(detail, reason)
+
+
+class _ViewReader(io.RawIOBase):
+    """File-like read-only di atas memoryview (BytesIO akan menyalin buffer)."""
+
+    def __init__(self, view: memoryview):
+        self._v = view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = max(0, min(len(b), len(self._v) - self._pos))
+        b[:n] = self._v[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._v)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+
+def _buffer() -> bytearray:
+    buf = getattr(_local, "buf", None)
+    if buf is None or len(buf) < settings.UPLOAD_MAX_BYTES:
+        buf = _local.buf = bytearray(settings.UPLOAD_MAX_BYTES)
+    return buf
+
+
+def read_upload(f) -> memoryview:
+    """
+    Salin UploadedFile ke buffer thread ini. View hanya valid sampai read_upload berikutnya
+    di thread yang sama — salin (bytes(view)) bila perlu disimpan.
+    """
+    limit = settings.UPLOAD_MAX_BYTES
+    if f.size and f.size > limit:
+        raise _reject(f"Ukuran file > {limit // (1024 * 1024)}MB.", "bytes")
+    buf = _buffer()
+    n = 0
+    for chunk in f.chunks():
+        end = n + len(chunk)
+        if end > limit:
+            raise _reject(f"Ukuran file > {limit // (1024 * 1024)}MB.", "bytes")
+        buf[n:end] = chunk
+        n = end
+    return memoryview(buf)[:n]
+
+
+def _open(data: Union[bytes, memoryview]) -> Image.Image:
+    fp = _ViewReader(memoryview(data)) if not isinstance(data, bytes) else io.BytesIO(data)
+    try:
+        # Image.MAX_IMAGE_PIXELS global tidak diubah (dipakai juga oleh kode lain di proses ini);
+        # batas UPLOAD_MAX_PIXELS diperiksa dari header di _check() sebelum decode
+        return Image.open(fp)
+    except Image.DecompressionBombError as e:
+        raise _reject("Resolusi gambar terlalu besar.", "pixels") from e
+    except Exception as e:
+        raise ImageDecodeError("Gagal membaca gambar. Pastikan format valid (JPG/PNG).") from e
+
+
+def _check(im: Image.Image) -> Tuple[str, Tuple[int, int], int]:
+    fmt = (im.format or "").upper()
+    w, h = im.size
+    frames = int(getattr(im, "n_frames", 1))
+    if fmt not in settings.UPLOAD_FORMATS:
+        raise _reject(f"Format {fmt or 'tidak dikenal'} tidak didukung.", "format")
+    if w * h > settings.UPLOAD_MAX_PIXELS or max(w, h) > settings.UPLOAD_MAX_SIDE:
+        raise _reject(f"Resolusi gambar terlalu besar ({w}×{h}).", "pixels")
+    if frames > 1:
+        raise _reject("Gambar animasi/multi-frame tidak didukung.", "frames")
+    return fmt, (w, h), frames
+
+
+def inspect_image(data: Union[bytes, memoryview]) -> Dict:
+    """Header saja, tanpa decode piksel."""
+    fmt, size, frames = _check(_open(data))
+    return {"format": fmt, "size": size, "frames": frames}
+
+
+def decode_image(data: Union[bytes, memoryview]) -> Image.Image:
+    im = _open(data)
+    _check(im)
+    target = settings.UPLOAD_DECODE_MAX_SIDE
+    # sudah di-downscale klien (lihat /api/model/meta) → decode apa adanya, tanpa draft/thumbnail
+    presized = max(im.size) <= target
+    t0 = time.perf_counter()
+    try:
+        if im.format == "JPEG" and not presized:
+            im.draft("RGB", (target, target))  # decode langsung di skala DCT yang cukup
+        im = im.convert("RGB")
+        if not presized:
+            im.thumbnail((target, target), Image.BILINEAR)
+    except Exception as e:
+        raise ImageDecodeError("Gagal membaca gambar. Pastikan format valid (JPG/PNG).") from e
+    ms = (time.perf_counter() - t0) * 1000.0
+    pixel_mb = im.size[0] * im.size[1] * 3 / 1e6
+
+    if ms > settings.UPLOAD_DECODE_WARN_MS:
+        log.warning("Decode lambat: %.0f ms (%s×%s)", ms, *im.size)
+    with _stats_lock:
+        _stats["accepted"] += 1
+        _stats["presized"] += presized
+        _stats["bytes_total"] += len(data)
+        _stats["decode_ms_total"] += ms
+        _stats["decode_ms_max"] = max(_stats["decode_ms_max"], ms)
+        _stats["pixel_mb_max"] = max(_stats["pixel_mb_max"], pixel_mb)
+    memwatch.mark("decode")
+    return im
+
+
+def upload_stats() -> Dict:
+    with _stats_lock:
+        s = {**_stats, "rejected": dict(_stats["rejected"])}
+    s["decode_ms_avg"] = s.pop("decode_ms_total") / s["accepted"] if s["accepted"] else 0.0
+    s["bytes_avg"] = s.pop("bytes_total") / s["accepted"] if s["accepted"] else 0.0
+    return s
@@ -1,8 +1,22 @@
 # api/urls.py
 from django.urls import path
-from .views import AnalyzeView, LabelsView
+from .views import (
+    AnalyzeView, ChatStartView, ChatTurnView, ClassifyView, ExplainView, FollowupView, HealthView,
+    JobStatusView, LabelsView, MemoryView, MetricsView, ModelMetaView, ModelReloadView,
+)
 
 urlpatterns = [
     path('analyze', AnalyzeView.as_view(), name='analyze'),
+    path('classify', ClassifyView.as_view(), name='classify'),
+    path('explain', ExplainView.as_view(), name='explain'),
+    path('chat', ChatStartView.as_view(), name='chat-start'),
+    path('chat/<str:session_id>', ChatTurnView.as_view(), name='chat-turn'),
     path('labels', LabelsView.as_view(), name='labels'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
+    path('health', HealthView.as_view(), name='health'),
+    path('model/meta', ModelMetaView.as_view(), name='model-meta'),
+    path('model/reload', ModelReloadView.as_view(), name='model-reload'),
+    path('followup/<str:handle>', FollowupView.as_view(), name='followup'),
+    path('jobs/<uuid:job_id>', JobStatusView.as_view(), name='job-status'),
+    path('debug/memory', MemoryView.as_view(), name='debug-memory'),
 ]
@@ -1,48 +1,281 @@
 # api/views.py
+import time
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.conf import settings
-from PIL import Image
-import io
 
-from .inference import predict_image
-from .model_loader import get_model_and_meta
-from .llm import explain_prediction
+from .model_loader import get_model_and_meta, model_status, reload_model
+from .pipeline import (
+    ImageDecodeError, analyze_image, classify_image, decode_image, explain, explain_stored, load_analysis,
+    store_analysis,
+)
+from .llm import get_followup, llm_call_stats, prefix_cache_stats, semantic_cache_stats
+from . import admission, events, jobs, memwatch, singleflight
+from .models import AnalysisJob
+from .conversation import ConversationBusy, store as conversations
+from .kb_bundle import active_bundle
+from .rag import index_version
+from .inference import inference_stats
+from .roi import roi_stats
+from .uploads import inspect_image, read_upload, upload_stats
 
 class LabelsView(APIView):
     def get(self, request):
         _, class_names, _, _ = get_model_and_meta()
         return Response({"labels": class_names})
 
+class HealthView(APIView):
+    """Liveness + versi knowledge-base yang sedang dipakai worker ini."""
+    def get(self, request):
+        bundle = active_bundle()
+        return Response({
+            "status": "ok",
+            "kb_bundle": bundle.version if bundle else None,
+            "index_version": index_version(),
+            "model": model_status(),
+        })
+
+class ModelMetaView(APIView):
+    """
+    Metadata model untuk klien: frontend men-downscale & re-encode gambar ke target `upload`
+    sebelum dikirim. ROI_CROP aktif → klien kirim sampai UPLOAD_DECODE_MAX_SIDE (server masih
+    perlu crop kuku); selain itu langsung img_size×img_size (sama dengan Resize di inferensi).
+    """
+    def get(self, request):
+        _, class_names, img_size, _ = get_model_and_meta()
+        if settings.ROI_CROP:
+            upload = {"fit": "contain", "width": settings.UPLOAD_DECODE_MAX_SIDE, "height": settings.UPLOAD_DECODE_MAX_SIDE}
+        else:
+            upload = {"fit": "stretch", "width": img_size, "height": img_size}
+        upload.update({
+            "formats": settings.CLIENT_UPLOAD_FORMATS,
+            "quality": settings.CLIENT_UPLOAD_QUALITY,
+            "max_bytes": settings.UPLOAD_MAX_BYTES,
+        })
+        resp = Response({
+            "version": model_status()["version"],
+            "img_size": img_size,
+            "labels": class_names,
+            "upload": upload,
+        })
+        resp["Cache-Control"] = "public, max-age=300"
+        return resp
+
+class ModelReloadView(APIView):
+    """Picu hot-reload checkpoint di worker ini (header X-Admin-Token = MODEL_ADMIN_TOKEN)."""
+    def post(self, request):
+        token = settings.MODEL_ADMIN_TOKEN
+        if not token or request.headers.get("X-Admin-Token") != token:
+            return Response({"detail": "Tidak diizinkan."}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            info = reload_model()
+        except Exception as e:
+            return Response({"detail": f"Reload gagal, model lama tetap aktif: {e}"},
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(info)
+
+class MetricsView(APIView):
+    """Statistik cache LLM per proses worker (hit rate, token & latensi yang dihemat)."""
+    def get(self, request):
+        return Response({
+            "prefix_cache": prefix_cache_stats(),
+            "semantic_cache": semantic_cache_stats(),
+            "llm_calls": llm_call_stats(),
+            "conversations": conversations.snapshot(),
+            "inference": inference_stats(),
+            "roi": roi_stats(),
+            "uploads": upload_stats(),
+            "analysis_log": events.event_stats(),
+            "singleflight": singleflight.all_stats(),
+            "memory": memwatch.gauges(),
+            "admission": admission.admission_stats(),
+        })
+
+class MemoryView(APIView):
+    """Gauge memori, delta per tahap & situs alokasi yang tumbuh sejak baseline (X-Admin-Token)."""
+    def get(self, request):
+        token = settings.MODEL_ADMIN_TOKEN
+        if not token or request.headers.get("X-Admin-Token") != token:
+            return Response({"detail": "Tidak diizinkan."}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            limit = max(1, min(int(request.query_params.get("limit", 15)), 100))
+        except ValueError:
+            limit = 15
+        return Response({
+            "gauges": memwatch.gauges(),
+            "stages": memwatch.stage_stats(),
+            "top_growth": memwatch.live_diff(limit),
+        })
+
+class FollowupView(APIView):
+    """Ambil jawaban LLM yang selesai setelah anggaran latensi /analyze habis."""
+    def get(self, request, handle):
+        item = get_followup(handle)
+        if item is None:
+            return Response({"detail": "Handle tidak ditemukan atau kedaluwarsa."}, status=404)
+        return Response({"status": item["status"], "explanation_md": item["explanation_md"]})
+
+def _overloaded(e: admission.Overloaded) -> Response:
+    resp = Response({"detail": str(e)}, status=e.status)
+    resp["Retry-After"] = e.retry_after
+    return resp
+
 class AnalyzeView(APIView):
     def post(self, request):
+        t0 = time.perf_counter()
         if "image" not in request.FILES:
             return Response({"detail": "Harap unggah field 'image'."}, status=400)
+        try:
+            admission.check_rate(request)  # 429 sebelum membaca upload
+        except admission.Overloaded as e:
+            return _overloaded(e)
 
         user_prompt = request.data.get("prompt", "")
-        img_file = request.FILES["image"]
+        try:
+            data = read_upload(request.FILES["image"])
+            inspect_image(data)  # header saja: tolak bom dekompresi sebelum decode
+        except ImageDecodeError as e:
+            return Response({"detail": str(e)}, status=e.status)
 
-        # Validasi sederhana
-        if img_file.size > 5 * 1024 * 1024:
-            return Response({"detail": "Ukuran file > 5MB."}, status=400)
+        # Mode async: simpan ke antrean, balas job id segera (poll di /api/jobs/<id>)
+        if (request.data.get("mode") or request.query_params.get("mode")) == "async":
+            try:
+                job = jobs.enqueue(bytes(data), user_prompt)
+            except jobs.QueueFull:
+                resp = Response({"detail": "Server sedang sibuk, coba lagi sebentar."},
+                                status=status.HTTP_503_SERVICE_UNAVAILABLE)
+                resp["Retry-After"] = str(settings.ANALYZE_QUEUE_RETRY_AFTER_S)
+                return resp
+            return Response(job.as_status(), status=status.HTTP_202_ACCEPTED)
 
         try:
-            img_bytes = img_file.read()
-            pil = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-        except Exception:
-            return Response({"detail": "Gagal membaca gambar. Pastikan format valid (JPG/PNG)."}, status=400)
+            pil = decode_image(data)
+        except ImageDecodeError as e:
+            return Response({"detail": str(e)}, status=e.status)
 
-        # Prediksi
-        pred = predict_image(pil, tta=True)
-        label, conf, probs = pred["label"], pred["confidence"], pred["probs"]
+        if not admission.enabled():
+            result = analyze_image(pil, user_prompt)
+        else:
+            # slot model & slot LLM terpisah; tunggu melewati anggaran → tolak cepat
+            budget = settings.ADMISSION_QUEUE_BUDGET_S
+            try:
+                with admission.inference_lane.slot(budget):
+                    pred = classify_image(pil)
+            except admission.Overloaded as e:
+                return _overloaded(e)
+            try:
+                with admission.llm_lane.slot(max(0.0, budget - (time.perf_counter() - t0))):
+                    result = {**pred, **explain(pred["prediction"], pred["confidence"], pred["probs"], user_prompt)}
+            except admission.Overloaded as e:
+                if not settings.ADMISSION_DEGRADE:
+                    return _overloaded(e)
+                # klasifikasi saja; penjelasan bisa diminta nanti lewat /api/explain dengan token ini
+                admission.note_degraded()
+                result = {
+                    **pred,
+                    "explanation_md": "_Penjelasan belum tersedia karena server sedang sibuk. Coba lagi sebentar._",
+                    "degraded": True,
+                    "analysis_token": store_analysis(pred),
+                    "retry_after_s": int(e.retry_after),
+                }
+        events.record("analyze", result, (time.perf_counter() - t0) * 1000.0, user_prompt)
+        return Response(result, status=status.HTTP_200_OK)
 
-        # Penjelasan LLM
-        explanation = explain_prediction(label, conf, probs, user_prompt)
+class ClassifyView(APIView):
+    """Klasifikasi saja (cepat) + token analisis untuk /api/explain."""
+    def post(self, request):
+        t0 = time.perf_counter()
+        if "image" not in request.FILES:
+            return Response({"detail": "Harap unggah field 'image'."}, status=400)
+        try:
+            admission.check_rate(request)
+        except admission.Overloaded as e:
+            return _overloaded(e)
+        try:
+            pil = decode_image(read_upload(request.FILES["image"]))
+        except ImageDecodeError as e:
+            return Response({"detail": str(e)}, status=e.status)
 
+        try:
+            with admission.admit(admission.inference_lane):
+                pred = classify_image(pil)
+        except admission.Overloaded as e:
+            return _overloaded(e)
+        events.record("classify", pred, (time.perf_counter() - t0) * 1000.0)
         return Response({
-            "prediction": label,
-            "confidence": conf,
-            "probs": probs,
-            "explanation_md": explanation  # markdown siap render di frontend
+            **pred,
+            "analysis_token": store_analysis(pred),
+            "token_ttl_s": settings.ANALYSIS_TOKEN_TTL_S,
         }, status=status.HTTP_200_OK)
+
+class ExplainView(APIView):
+    """Penjelasan LLM untuk hasil /api/classify (tanpa upload & klasifikasi ulang)."""
+    def post(self, request):
+        t0 = time.perf_counter()
+        token = request.data.get("analysis_token") or ""
+        user_prompt = request.data.get("prompt", "")
+        try:
+            admission.check_rate(request)
+            with admission.admit(admission.llm_lane):
+                out = explain_stored(token, user_prompt)
+        except admission.Overloaded as e:
+            return _overloaded(e)
+        if out is None:
+            return Response({"detail": "Token analisis tidak valid atau kedaluwarsa; unggah ulang gambar."},
+                            status=status.HTTP_410_GONE)
+        events.record("explain", out, (time.perf_counter() - t0) * 1000.0, user_prompt)
+        return Response(out, status=status.HTTP_200_OK)
+
+class ChatStartView(APIView):
+    """Mulai sesi percakapan dari token /api/classify; giliran pertama = penjelasan lengkap."""
+    def post(self, request):
+        pred = load_analysis(request.data.get("analysis_token") or "")
+        if pred is None:
+            return Response({"detail": "Token analisis tidak valid atau kedaluwarsa; unggah ulang gambar."},
+                            status=status.HTTP_410_GONE)
+        try:
+            admission.check_rate(request)
+            with admission.admit(admission.llm_lane):
+                conv = conversations.create(pred["prediction"], pred["confidence"], pred["probs"])
+                answer = conv.ask(request.data.get("prompt", ""))
+        except admission.Overloaded as e:
+            return _overloaded(e)
+        return Response({**pred, "session_id": conv.id, "turn": conv.turns, "explanation_md": answer})
+
+class ChatTurnView(APIView):
+    """Pertanyaan lanjutan; hanya passage baru & riwayat ringkas yang dikirim ke LLM."""
+    def post(self, request, session_id):
+        conv = conversations.get(session_id)
+        if conv is None:
+            return Response({"detail": "Sesi tidak ditemukan atau kedaluwarsa."}, status=404)
+        question = (request.data.get("prompt") or "").strip()
+        if not question:
+            return Response({"detail": "Harap isi field 'prompt'."}, status=400)
+        try:
+            admission.check_rate(request)
+            with admission.admit(admission.llm_lane):
+                answer = conv.ask(question)
+        except admission.Overloaded as e:
+            return _overloaded(e)
+        except ConversationBusy:
+            return Response({"detail": "Pertanyaan sebelumnya pada sesi ini masih diproses; coba lagi."},
+                            status=status.HTTP_409_CONFLICT)
+        return Response({"session_id": conv.id, "turn": conv.turns, "answer_md": answer})
+
+class JobStatusView(APIView):
+    """Status/hasil job async; ?wait=<detik> untuk long-poll sampai selesai."""
+    def get(self, request, job_id):
+        try:
+            wait_s = float(request.query_params.get("wait", 0) or 0)
+        except ValueError:
+            wait_s = 0.0
+        wait_s = min(max(wait_s, 0.0), settings.ANALYZE_LONGPOLL_MAX_S)
+        job = jobs.wait_for_job(job_id, wait_s)
+        if job is None:
+            return Response({"detail": "Job tidak ditemukan."}, status=404)
+        body = job.as_status()
+        if job.status == AnalysisJob.STATUS_QUEUED:
+            body["queue_depth"] = jobs.queue_depth()
+        return Response(body)
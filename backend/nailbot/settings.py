@@ -60,6 +60,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.MemoryWatchMiddleware',
 ]
 
 ROOT_URLCONF = 'nailbot.urls'
@@ -116,6 +117,24 @@ STATICFILES_DIRS = [BASE_DIR / "static"] if (BASE_DIR / "static").exists() else
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.getenv("MEDIA_ROOT", str(BASE_DIR / "media"))
 
+# ==== Cache (state analisis classify → explain) ====
+# Default LocMem (per proses). Multi-worker: set CACHE_BACKEND ke DB/Redis agar token terbaca lintas worker,
+# mis. CACHE_BACKEND=django.core.cache.backends.db.DatabaseCache CACHE_LOCATION=nailbot_cache
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "nailbot"),
+    }
+}
+ANALYSIS_TOKEN_TTL_S = int(os.getenv("ANALYSIS_TOKEN_TTL_S", "900"))
+
+# Sesi percakapan lanjutan (api/conversation.py), disimpan di cache default di atas:
+# multi-worker/multi-host memerlukan CACHE_BACKEND bersama, seperti token analisis
+CHAT_SESSION_TTL_S = int(os.getenv("CHAT_SESSION_TTL_S", "1800"))   # TTL idle, diperbarui tiap giliran
+CHAT_LOCK_TTL_S = int(os.getenv("CHAT_LOCK_TTL_S", "180"))          # > durasi terlama satu giliran LLM
+CHAT_LOCK_WAIT_S = float(os.getenv("CHAT_LOCK_WAIT_S", "2"))        # giliran bersamaan pada sesi yang sama → 409
+CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", "6"))
+
 # ==== Default PK field ====
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -147,12 +166,111 @@ if _cors_origins:
 DATA_UPLOAD_MAX_MEMORY_SIZE = int(os.getenv("DATA_UPLOAD_MAX_MEMORY_SIZE", 10 * 1024 * 1024))  # 10 MB
 FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.getenv("FILE_UPLOAD_MAX_MEMORY_SIZE", 10 * 1024 * 1024))  # 10 MB
 
+# ==== Validasi upload gambar (api/uploads.py) ====
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", 5 * 1024 * 1024))  # 5 MB
+UPLOAD_MAX_PIXELS = int(os.getenv("UPLOAD_MAX_PIXELS", 40_000_000))    # dari header, sebelum decode
+UPLOAD_MAX_SIDE = int(os.getenv("UPLOAD_MAX_SIDE", "10000"))
+UPLOAD_FORMATS = [f.strip().upper() for f in os.getenv("UPLOAD_FORMATS", "JPEG,PNG,WEBP").split(",") if f.strip()]
+UPLOAD_DECODE_MAX_SIDE = int(os.getenv("UPLOAD_DECODE_MAX_SIDE", "1024"))  # sisi terpanjang setelah decode
+UPLOAD_DECODE_WARN_MS = float(os.getenv("UPLOAD_DECODE_WARN_MS", "500"))
+# Downscale di klien sebelum upload (GET /api/model/meta): format yang dicoba berurutan & kualitas encode
+CLIENT_UPLOAD_FORMATS = [f.strip() for f in os.getenv("CLIENT_UPLOAD_FORMATS", "image/webp,image/jpeg").split(",") if f.strip()]
+CLIENT_UPLOAD_QUALITY = float(os.getenv("CLIENT_UPLOAD_QUALITY", "0.9"))
+
 # ==== Konfigurasi Model & Gemini (dipakai di api/model_loader.py & api/llm.py) ====
 CKPT_PATH = os.getenv("CKPT_PATH", str(BASE_DIR / "best_efficientnet_b0.pt"))
 LABELS_JSON = os.getenv("LABELS_JSON", str(BASE_DIR / "labels.json"))
+# Hot-reload checkpoint (api/model_loader.py): interval cek mtime CKPT_PATH, 0 = nonaktif
+MODEL_WATCH_S = float(os.getenv("MODEL_WATCH_S", "0"))
+# Token untuk POST /api/model/reload (kosong = endpoint nonaktif)
+MODEL_ADMIN_TOKEN = os.getenv("MODEL_ADMIN_TOKEN", "")
+# Hasil `manage.py calibrate_model` (temperature + ambang); dipakai bila cocok dengan versi checkpoint
+CALIBRATION_PATH = os.getenv("CALIBRATION_PATH", str(BASE_DIR / "models" / "calibration.json"))
+# Mode TTA klasifikasi: "auto" (early-exit terkalibrasi), "always", "never".
+# Default "always"; "auto" hanya bila file kalibrasi sudah ada (ambang tanpa kalibrasi belum teruji)
+INFERENCE_TTA = os.getenv("INFERENCE_TTA", "auto" if os.path.exists(CALIBRATION_PATH) else "always").lower()
+EARLY_EXIT_THRESHOLD = float(os.getenv("EARLY_EXIT_THRESHOLD", "0.90"))  # default tanpa kalibrasi
+EARLY_EXIT_MARGIN = float(os.getenv("EARLY_EXIT_MARGIN", "0.0"))
+# Pool proses inferensi (api/infer_pool.py): 0 = inline di thread request
+INFER_POOL_WORKERS = int(os.getenv("INFER_POOL_WORKERS", "0"))
+INFER_POOL_THREADS = int(os.getenv("INFER_POOL_THREADS", "0"))  # torch thread/proses; 0 = core / worker
+INFER_POOL_AFFINITY = os.getenv("INFER_POOL_AFFINITY", "True").lower() in ("1", "true", "yes", "on")
+# Crop ROI kuku sebelum klasifikasi (api/roi.py); heuristik warna di salinan ROI_DOWNSCALE px
+ROI_CROP = os.getenv("ROI_CROP", "False").lower() in ("1", "true", "yes", "on")
+ROI_DOWNSCALE = int(os.getenv("ROI_DOWNSCALE", "128"))
+ROI_PAD = float(os.getenv("ROI_PAD", "0.15"))
+# Inferensi shadow/A-B (api/shadow.py): checkpoint kandidat, porsi sampel & lokasi log
+SHADOW_CKPT_PATH = os.getenv("SHADOW_CKPT_PATH", "")
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", "0.1")) if SHADOW_CKPT_PATH else 0.0
+SHADOW_LOG_PATH = os.getenv("SHADOW_LOG_PATH", str(BASE_DIR / "logs" / "shadow.bin"))
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+# "gemini" (default) atau "fake" (klien offline untuk dev/test, lihat api/llm/fake_client.py)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+# Prefix prompt statis didaftarkan sebagai cached content Gemini (TTL detik)
+GEMINI_PREFIX_CACHE = os.getenv("GEMINI_PREFIX_CACHE", "True").lower() in ("1","true","yes","on")
+GEMINI_PREFIX_CACHE_TTL = int(os.getenv("GEMINI_PREFIX_CACHE_TTL", "3600"))
+
+# Cache semantik jawaban LLM (api/llm/semantic_cache.py)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "True").lower() in ("1","true","yes","on")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", str(24 * 3600)))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1024"))
+
+# Ketahanan panggilan LLM (api/llm/resilience.py); budget 0 = tunggu tanpa batas
+LLM_LATENCY_BUDGET_MS = float(os.getenv("LLM_LATENCY_BUDGET_MS", "15000"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "False").lower() in ("1","true","yes","on")
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_S = float(os.getenv("LLM_BREAKER_RESET_S", "30"))
+LLM_MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", "8"))
+
+# Mode async /api/analyze (api/jobs.py): antrean di tabel AnalysisJob
+ANALYZE_QUEUE_MAX = int(os.getenv("ANALYZE_QUEUE_MAX", "64"))            # backpressure: 503 bila penuh
+ANALYZE_QUEUE_RETRY_AFTER_S = int(os.getenv("ANALYZE_QUEUE_RETRY_AFTER_S", "5"))
+ANALYZE_JOB_WORKERS = int(os.getenv("ANALYZE_JOB_WORKERS", "2"))         # 0 = hanya via `manage.py analyze_worker`
+ANALYZE_JOB_AUTOSTART = os.getenv("ANALYZE_JOB_AUTOSTART", "True").lower() in ("1", "true", "yes", "on")  # start saat proses web boot
+ANALYZE_JOB_HEARTBEAT_S = float(os.getenv("ANALYZE_JOB_HEARTBEAT_S", "10"))  # interval detak worker selama job berjalan
+ANALYZE_JOB_TIMEOUT_S = int(os.getenv("ANALYZE_JOB_TIMEOUT_S", "60"))    # job running tanpa detak selama ini → diantrekan ulang
+ANALYZE_JOB_RETENTION_S = int(os.getenv("ANALYZE_JOB_RETENTION_S", str(7 * 24 * 3600)))  # job done/error lebih tua → dihapus
+ANALYZE_LONGPOLL_MAX_S = float(os.getenv("ANALYZE_LONGPOLL_MAX_S", "25"))
+
+# Admission control endpoint inferensi & LLM (api/admission.py), per proses worker; default mati
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "False").lower() in ("1", "true", "yes", "on")
+ADMISSION_INFER_SLOTS = int(os.getenv("ADMISSION_INFER_SLOTS", "4"))
+ADMISSION_LLM_SLOTS = int(os.getenv("ADMISSION_LLM_SLOTS", str(LLM_MAX_WORKERS)))
+ADMISSION_INFER_EST_S = float(os.getenv("ADMISSION_INFER_EST_S", "0.3"))  # tebakan awal EWMA durasi layanan
+ADMISSION_LLM_EST_S = float(os.getenv("ADMISSION_LLM_EST_S", "4"))
+ADMISSION_QUEUE_BUDGET_S = float(os.getenv("ADMISSION_QUEUE_BUDGET_S", "10"))  # perkiraan tunggu > ini → 503
+# per klien; 0 = tanpa batas. Di belakang proxy REMOTE_ADDR = proxy → set ADMISSION_CLIENT_HEADER dulu
+ADMISSION_RATE_PER_MIN = float(os.getenv("ADMISSION_RATE_PER_MIN", "0"))
+ADMISSION_BURST = float(os.getenv("ADMISSION_BURST", "10"))
+ADMISSION_CLIENT_HEADER = os.getenv("ADMISSION_CLIENT_HEADER", "")  # mis. X-Forwarded-For di belakang proxy
+# jumlah proxy tepercaya di depan app: kunci klien = entri ke-N dari kanan header di atas
+ADMISSION_TRUSTED_PROXIES = int(os.getenv("ADMISSION_TRUSTED_PROXIES", "1"))
+ADMISSION_DEGRADE = os.getenv("ADMISSION_DEGRADE", "True").lower() in ("1", "true", "yes", "on")  # LLM penuh → klasifikasi saja
+
+# Log event analisis (api/events.py): buffer memori → bulk insert tiap BATCH event / FLUSH_S detik
+ANALYSIS_LOG_ENABLED = os.getenv("ANALYSIS_LOG_ENABLED", "True").lower() in ("1", "true", "yes", "on")
+ANALYSIS_LOG_BATCH = int(os.getenv("ANALYSIS_LOG_BATCH", "100"))
+ANALYSIS_LOG_FLUSH_S = float(os.getenv("ANALYSIS_LOG_FLUSH_S", "5"))
+ANALYSIS_LOG_BUFFER = int(os.getenv("ANALYSIS_LOG_BUFFER", "5000"))  # penuh → event dibuang, tidak memblokir
+ANALYSIS_LOG_PROMPT_CHARS = int(os.getenv("ANALYSIS_LOG_PROMPT_CHARS", "500"))
+# SQLite (db.sqlite3 default): journal WAL diset sekali oleh migrasi 0004_sqlite_wal; synchronous=NORMAL & busy_timeout per koneksi (api/apps.py)
+SQLITE_WAL = os.getenv("SQLITE_WAL", "True").lower() in ("1", "true", "yes", "on")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# Observabilitas memori (api/memwatch.py): tracemalloc aktif sepanjang proses selama ENABLED; sampling hanya untuk delta per tahap & snapshot
+MEM_TRACE_ENABLED = os.getenv("MEM_TRACE_ENABLED", "False").lower() in ("1", "true", "yes", "on")
+MEM_TRACE_SAMPLE_RATE = float(os.getenv("MEM_TRACE_SAMPLE_RATE", "0.05"))  # porsi request yang dicatat per tahap / memicu snapshot
+MEM_TRACE_FRAMES = int(os.getenv("MEM_TRACE_FRAMES", "1"))  # >1 = traceback lebih dalam, overhead lebih besar
+MEM_SNAPSHOT_DIR = os.getenv("MEM_SNAPSHOT_DIR", str(BASE_DIR / "logs" / "mem"))
+MEM_SNAPSHOT_INTERVAL_S = float(os.getenv("MEM_SNAPSHOT_INTERVAL_S", "600"))
+MEM_SNAPSHOT_KEEP = int(os.getenv("MEM_SNAPSHOT_KEEP", "12"))  # per pid, snapshot pertama selalu disimpan (baseline)
+# Daur ulang worker: RSS > batas → tolak request baru (503), tunggu in-flight (maks DRAIN_S) lalu SIGTERM. 0 = mati
+MEM_RECYCLE_RSS_MB = float(os.getenv("MEM_RECYCLE_RSS_MB", "0"))
+MEM_RECYCLE_DRAIN_S = float(os.getenv("MEM_RECYCLE_DRAIN_S", "30"))
 
 # ==== Security headers (rekomendasi produksi) ====
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https') if os.getenv("BEHIND_PROXY", "False").lower() in ("1","true","yes","on") else None
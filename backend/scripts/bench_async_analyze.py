@@ -0,0 +1,85 @@
+# scripts/bench_async_analyze.py
+"""
+Benchmark responsivitas API saat antrean /analyze jenuh.
+
+Menembak N upload bersamaan ke server yang sedang berjalan (mode sync vs async),
+sambil mengukur latensi probe ringan (/api/labels) selama beban berlangsung.
+
+Contoh (server: python manage.py runserver):
+  python scripts/bench_async_analyze.py --image kuku.jpg --concurrency 32 --requests 128
+"""
+import argparse, statistics, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def _pct(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))] if xs else float("nan")
+
+
+def _probe(base, stop, out):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        try:
+            requests.get(f"{base}/labels", timeout=60)
+            out.append((time.perf_counter() - t0) * 1000.0)
+        except requests.RequestException:
+            out.append(float("inf"))
+        time.sleep(0.2)
+
+
+def run(base, image_bytes, mode, concurrency, n):
+    codes, lat, probe = [], [], []
+    stop = threading.Event()
+    th = threading.Thread(target=_probe, args=(base, stop, probe), daemon=True)
+    th.start()
+
+    def _one(_):
+        t0 = time.perf_counter()
+        try:
+            r = requests.post(
+                f"{base}/analyze",
+                files={"image": ("img.jpg", image_bytes, "image/jpeg")},
+                data={"prompt": "", "mode": mode},
+                timeout=120,
+            )
+            code = r.status_code
+        except requests.RequestException:
+            code = 0
+        lat.append((time.perf_counter() - t0) * 1000.0)
+        codes.append(code)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        list(ex.map(_one, range(n)))
+    wall = time.perf_counter() - t0
+    stop.set()
+    th.join()
+
+    print(f"\n== mode={mode} concurrency={concurrency} requests={n} wall={wall:.1f}s")
+    for c in sorted(set(codes)):
+        print(f"  HTTP {c}: {codes.count(c)}")
+    print(f"  submit latency  p50={statistics.median(lat):.0f}ms p95={_pct(lat, 0.95):.0f}ms")
+    if probe:
+        print(f"  /labels probe   p50={statistics.median(probe):.0f}ms p95={_pct(probe, 0.95):.0f}ms")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--base", default="http://localhost:8000/api")
+    ap.add_argument("--image", required=True)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--requests", type=int, default=128)
+    ap.add_argument("--modes", default="sync,async")
+    args = ap.parse_args()
+
+    with open(args.image, "rb") as f:
+        img = f.read()
+    for mode in args.modes.split(","):
+        run(args.base, img, mode.strip(), args.concurrency, args.requests)
+
+
+if __name__ == "__main__":
+    main()
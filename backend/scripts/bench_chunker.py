@@ -0,0 +1,83 @@
+# scripts/bench_chunker.py
+"""
+Benchmark chunker: chunk_text lama (regex greedy per jendela 800 karakter) vs
+api.chunker.chunk_by_tokens (sekali jalan, dibatasi token MiniLM) pada korpus sintetis.
+
+Jalankan dari folder backend/:  python scripts/bench_chunker.py [--mb 1 2 4]
+"""
+import argparse, os, random, re, sys, time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))
+from api.chunker import chunk_by_tokens
+
+EMB_MODEL_NAME = os.getenv("EMB_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
+
+_WORDS = (
+    "kuku jari warna tebal rapuh garis cekungan infeksi jamur psoriasis melanoma clubbing pitting "
+    "nail plate matrix onycholysis keratin pigment bed cuticle trauma deficiency iron zinc"
+).split()
+
+
+def legacy_chunk_text(text: str, max_chars: int = 800, overlap: int = 120):
+    """Salinan chunk_text lama dari scripts/build_index.py (pembanding)."""
+    if len(text) <= max_chars:
+        return [text]
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + max_chars
+        chunk = text[start:end]
+        m = re.search(r'.*[.!?](\s|$)', chunk, flags=re.S)
+        if m and (m.end() > max_chars * 0.6):
+            end = start + m.end()
+            chunk = text[start:end]
+        chunks.append(chunk.strip())
+        start = max(0, end - overlap)
+    return [c for c in chunks if c]
+
+
+def synth_corpus(n_bytes: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts, size = [], 0
+    while size < n_bytes:
+        sent = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(6, 30)))
+        sent = sent.capitalize() + rng.choice([".", ".", ".", "?", "!"])
+        sep = "\n\n" if rng.random() < 0.08 else " "
+        parts.append(sent + sep)
+        size += len(sent) + len(sep)
+    return "".join(parts)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mb", type=float, nargs="*", default=[1, 2, 4])
+    ap.add_argument("--max-tokens", type=int, default=200)
+    ap.add_argument("--overlap", type=int, default=32)
+    args = ap.parse_args()
+
+    from transformers import AutoTokenizer
+    tok = AutoTokenizer.from_pretrained(EMB_MODEL_NAME)
+
+    print(f"{'MB':>5} {'lama s':>8} {'n':>7} {'baru s':>8} {'n':>7} {'maks tok lama':>14} {'maks tok baru':>14}")
+    for mb in args.mb:
+        text = synth_corpus(int(mb * 1e6))
+
+        t0 = time.perf_counter()
+        old = legacy_chunk_text(text)
+        t_old = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        new = chunk_by_tokens(text, tok, args.max_tokens, args.overlap)
+        t_new = time.perf_counter() - t0
+
+        # token maks per chunk lama (sampel) — seberapa sering melewati batas model
+        sample = old[:: max(1, len(old) // 500)]
+        old_max = max(len(x) for x in tok(sample, add_special_tokens=False)["input_ids"])
+        new_max = max(c["n_tokens"] for c in new)
+        print(f"{mb:>5.1f} {t_old:>8.2f} {len(old):>7} {t_new:>8.2f} {len(new):>7} {old_max:>14} {new_max:>14}")
+
+
+if __name__ == "__main__":
+    main()
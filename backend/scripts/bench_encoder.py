@@ -0,0 +1,60 @@
+# scripts/bench_encoder.py
+"""
+Latensi encode query per backend (api/encoder.py) untuk batch 1–16 + paritas kosinus vs torch.
+
+Jalankan dari folder backend/:  python scripts/bench_encoder.py [--repeat 50] [--backends torch int8 onnx]
+"""
+import argparse, statistics, sys, time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))
+from api import rag
+from api.encoder import BACKENDS, build_encoder
+
+QUERIES = [
+    "kuku menebal dan berubah warna kekuningan, apakah infeksi jamur?",
+    "apakah cekungan kecil di kuku berbahaya? | label: pitting",
+    "jari kebiruan kenapa ya | label: blue_finger",
+    "ujung jari membulat penyebabnya apa",
+    "garis gelap pada kuku apakah kanker | label: Acral_Lentiginous_Melanoma",
+    "bagaimana merawat kuku sehat",
+    "nail clubbing causes and associated conditions",
+    "Jelaskan secara non-diagnostik | label: Onychogryphosis",
+]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=50)
+    ap.add_argument("--batches", type=int, nargs="*", default=[1, 2, 4, 8, 16])
+    ap.add_argument("--backends", nargs="*", default=list(BACKENDS))
+    args = ap.parse_args()
+
+    st = rag._get_model()
+    ref = None
+    print(f"{'backend':<8} {'batch':>5} {'p50 ms':>8} {'p95 ms':>8} {'min cos':>8}")
+    for name in args.backends:
+        enc = build_encoder(name, st, rag.ONNX_PATH)
+        if enc.name != name:
+            print(f"{name:<8} tidak tersedia (fallback {enc.name}), dilewati")
+            continue
+        for b in args.batches:
+            texts = (QUERIES * (b // len(QUERIES) + 1))[:b]
+            enc.encode(texts)  # warm-up
+            lat = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                vecs = enc.encode(texts)
+                lat.append((time.perf_counter() - t0) * 1000.0)
+            if name == "torch" and ref is None and b == max(args.batches):
+                ref = vecs
+            lat.sort()
+            cos = "-"
+            if ref is not None and len(ref) == len(vecs):
+                cos = f"{float((vecs * ref).sum(axis=1).min()):.4f}"
+            print(f"{name:<8} {b:>5} {statistics.median(lat):>8.2f} {lat[int(0.95 * (len(lat) - 1))]:>8.2f} {cos:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# scripts/bench_infer_pool.py
+"""
+Sweep konkurensi: inferensi inline di thread (seperti thread request Django) vs pool proses
+(api/infer_pool.py). Melaporkan throughput & latensi p50/p95 per tingkat konkurensi.
+
+Jalankan dari folder backend/:
+  python scripts/bench_infer_pool.py --image kuku.jpg --workers 4 --levels 1 2 4 8 16
+  python scripts/bench_infer_pool.py --task embed --workers 2
+"""
+import argparse, os, statistics, sys, time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "nailbot.settings")
+
+
+def _pct(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))]
+
+
+def _sweep(name, fn, levels, per_level):
+    print(f"\n[{name}]  {'conc':>4} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for c in levels:
+        lat = []
+
+        def _one(_):
+            t0 = time.perf_counter()
+            fn()
+            lat.append((time.perf_counter() - t0) * 1000.0)
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=c) as ex:
+            list(ex.map(_one, range(max(per_level, c))))
+        wall = time.perf_counter() - t0
+        print(f"{'':<{len(name) + 2}}  {c:>4} {len(lat) / wall:>8.1f} {statistics.median(lat):>8.1f} {_pct(lat, 0.95):>8.1f}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--task", choices=["predict", "embed"], default="predict")
+    ap.add_argument("--image", help="Gambar uji (wajib untuk --task predict).")
+    ap.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    ap.add_argument("--levels", type=int, nargs="*", default=[1, 2, 4, 8, 16])
+    ap.add_argument("--requests", type=int, default=64, help="Request per tingkat konkurensi.")
+    args = ap.parse_args()
+
+    os.environ["INFER_POOL_WORKERS"] = str(args.workers)
+    import django
+    django.setup()
+    from PIL import Image
+    from api import infer_pool
+    from api.inference import _predict_local
+    from api.rag import _get_encoder
+
+    if args.task == "predict":
+        if not args.image:
+            sys.exit("--image wajib untuk --task predict")
+        pil = Image.open(args.image).convert("RGB")
+        inline = lambda: _predict_local(pil, True)
+        pooled = lambda: infer_pool.predict(pil, True)
+    else:
+        texts = ["kuku menebal dan berubah warna kekuningan, apakah infeksi jamur?"]
+        inline = lambda: _get_encoder().encode(texts)
+        pooled = lambda: infer_pool.embed(texts)
+
+    inline(), pooled()  # warm-up: muat model di proses ini & di semua worker pool
+    for _ in range(args.workers * 2):
+        pooled()
+    _sweep("inline", inline, args.levels, args.requests)
+    _sweep(f"pool x{args.workers}", pooled, args.levels, args.requests)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# scripts/bench_quant_search.py
+"""
+Laporan embedding terkuantisasi (api/qemb.py) per koleksi rag_index:
+  - memori: float32 vs int8 (+scale) vs biner
+  - recall@k pencarian dua tahap (int8 / biner → rescoring float32) terhadap brute force float32
+  - latensi per query
+
+Query uji: prompt contoh (di-embed) + sampel vektor dokumen sendiri.
+Jalankan dari folder backend/ setelah build_index.py / build_scholar_index.py:
+  python scripts/bench_quant_search.py [--k 5 10] [--factors 2 4 8]
+"""
+import argparse, statistics, sys, time
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))
+from api import rag
+from api.qemb import QuantizedIndex, maybe_load, recall_at_k
+
+PROMPTS = [
+    "apakah cekungan kuku ini berbahaya?",
+    "jari kebiruan kenapa ya",
+    "ujung jari membulat penyebabnya apa",
+    "kuku menebal melengkung seperti tanduk",
+    "garis gelap pada kuku apakah kanker",
+    "bagaimana merawat kuku sehat",
+    "nail pitting psoriasis",
+    "clubbing lung disease",
+]
+
+
+def _latency_ms(index: QuantizedIndex, queries, k, mode, factor) -> float:
+    lat = []
+    for q in queries:
+        t0 = time.perf_counter()
+        index.search(q, k, mode=mode, rescore_factor=factor)
+        lat.append((time.perf_counter() - t0) * 1000.0)
+    return statistics.median(lat)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--k", type=int, nargs="*", default=[5, 10])
+    ap.add_argument("--factors", type=int, nargs="*", default=[2, 4, 8])
+    ap.add_argument("--sample", type=int, default=200, help="Jumlah vektor dokumen sebagai query.")
+    args = ap.parse_args()
+
+    prompt_vecs = rag.embed(PROMPTS)
+    rng = np.random.default_rng(0)
+    for name in (rag.COLL_LOCAL, rag.COLL_SCHOLAR):
+        index = maybe_load(rag.INDEX_DIR, name)
+        if index is None:
+            print(f"\n{name}: sidecar qemb belum ada (jalankan ulang builder), dilewati")
+            continue
+        emb = np.asarray(index.emb, dtype=np.float32)
+        pick = rng.choice(len(emb), size=min(args.sample, len(emb)), replace=False)
+        queries = np.concatenate([prompt_vecs, emb[pick]])
+
+        mem = index.memory_report()
+        print(f"\n{name}: {mem['n']} vektor | float32 {mem['float32_mb']:.2f} MB, "
+              f"int8 {mem['int8_mb']:.2f} MB ({mem['float32_mb'] / max(mem['int8_mb'], 1e-9):.1f}×), "
+              f"biner {mem['binary_mb']:.2f} MB ({mem['float32_mb'] / max(mem['binary_mb'], 1e-9):.1f}×)")
+        print(f"{'mode':<7} {'faktor':>6} " + " ".join(f"{'R@' + str(k):>7}" for k in args.k) + f" {'p50 ms':>8}")
+        k_lat = max(args.k)
+        print(f"{'off':<7} {'-':>6} " + " ".join(f"{1.0:>7.3f}" for _ in args.k)
+              + f" {_latency_ms(index, queries, k_lat, 'off', 1):>8.3f}")
+        for mode in ("int8", "binary"):
+            for f in args.factors:
+                recalls = [recall_at_k(index, queries, k, mode, f) for k in args.k]
+                print(f"{mode:<7} {f:>6} " + " ".join(f"{r:>7.3f}" for r in recalls)
+                      + f" {_latency_ms(index, queries, k_lat, mode, f):>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
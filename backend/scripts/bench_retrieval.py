@@ -0,0 +1,76 @@
+# scripts/bench_retrieval.py
+"""
+Bandingkan retriever "multi" (ekspansi multi-varian lama) vs "hybrid" (BM25 + dense, RRF).
+
+Metrik:
+  - latensi per request (median & p95, ms)
+  - label-precision: porsi passage yang cocok dengan label target
+    (scholar: metadata label; lokal: nama file kb/<label>.md)
+
+Jalankan dari folder backend/:  python scripts/bench_retrieval.py [--repeat 5]
+"""
+import argparse, statistics, sys, time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))
+from api import rag
+
+# (prompt, label target) — campuran ID/EN, termasuk istilah yang dulu butuh alias manual
+CASES = [
+    ("apakah cekungan kuku ini berbahaya?", "pitting"),
+    ("jari kebiruan kenapa ya", "blue_finger"),
+    ("ujung jari membulat penyebabnya apa", "clubbing"),
+    ("kuku menebal melengkung seperti tanduk", "Onychogryphosis"),
+    ("garis gelap pada kuku apakah kanker", "Acral_Lentiginous_Melanoma"),
+    ("bagaimana merawat kuku sehat", "Healthy_Nail"),
+    ("", "pitting"),
+    ("", "clubbing"),
+]
+
+
+def _label_match(hit, label: str) -> bool:
+    if hit.get("bucket") == "S":
+        return hit.get("label") == label
+    return Path(hit.get("source") or "").stem.lower() == label.lower()
+
+
+def _run(fn, repeat: int):
+    lat, prec = [], []
+    for prompt, label in CASES:
+        query = (prompt or "Jelaskan secara non-diagnostik") + f" | label: {label}"
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            hits = fn(query, label)
+            lat.append((time.perf_counter() - t0) * 1000.0)
+        prec.append(sum(_label_match(h, label) for h in hits) / max(1, len(hits)))
+    lat.sort()
+    return {
+        "p50_ms": statistics.median(lat),
+        "p95_ms": lat[int(0.95 * (len(lat) - 1))],
+        "label_precision": statistics.mean(prec),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    # warm-up: muat model embedding, koleksi & BM25 sekali
+    rag.embed(["kuku"])
+    rag._get_collections()
+
+    multi = _run(lambda q, l: rag._retrieve_multi_variants(q, l, 2, 3, 8), args.repeat)
+    rag.RETRIEVAL_MODE = "hybrid"
+    hybrid = _run(lambda q, l: rag.retrieve_multi_smart(q, prefer_label=l), args.repeat)
+
+    print(f"{'mode':<8} {'p50 ms':>9} {'p95 ms':>9} {'label-prec':>11}")
+    for name, r in (("multi", multi), ("hybrid", hybrid)):
+        print(f"{name:<8} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['label_precision']:>11.3f}")
+    if multi["p50_ms"] > 0:
+        print(f"\nPenurunan latensi median: {100.0 * (1 - hybrid['p50_ms'] / multi['p50_ms']):.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# scripts/bench_roi.py
+"""
+Apakah crop ROI kuku (api/roi.py) memungkinkan resolusi lebih kecil / tanpa TTA?
+
+Untuk folder validasi berlabel (<data>/<nama_kelas>/*.jpg) bandingkan akurasi & latensi:
+  full frame vs ROI  ×  resolusi (img_size checkpoint + --sizes)  ×  TTA on/off
+serta biaya tahap ROI per gambar.
+
+Jalankan dari folder backend/:  python scripts/bench_roi.py --data data/val --sizes 160 192
+"""
+import argparse, os, statistics, sys, time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "nailbot.settings")
+import django
+
+django.setup()
+
+import numpy as np
+from PIL import Image
+
+from api.inference import _run_probs
+from api.model_loader import get_model_and_meta
+from api.roi import crop_nail_roi
+
+_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+def _load(root: Path, class_names):
+    items = []
+    for ci, name in enumerate(class_names):
+        d = root / name
+        if d.is_dir():
+            items += [(p, ci) for p in sorted(d.iterdir()) if p.suffix.lower() in _EXTS]
+    return items
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--data", required=True)
+    ap.add_argument("--sizes", type=int, nargs="*", default=[160, 192])
+    ap.add_argument("--limit", type=int, default=0, help="Batasi jumlah gambar (0 = semua).")
+    args = ap.parse_args()
+
+    model, class_names, img_size, device = get_model_and_meta()
+    items = _load(Path(args.data), class_names)
+    if args.limit:
+        items = items[:args.limit]
+    if not items:
+        sys.exit("Tidak ada gambar berlabel.")
+
+    imgs, ys, crops, roi_ms = [], [], [], []
+    for p, ci in items:
+        pil = Image.open(p).convert("RGB")
+        crop, info = crop_nail_roi(pil)
+        imgs.append(pil)
+        crops.append(crop)
+        ys.append(ci)
+        roi_ms.append(info["ms"])
+    y = np.asarray(ys)
+    print(f"{len(items)} gambar | ROI: median {statistics.median(roi_ms):.2f} ms, "
+          f"maks {max(roi_ms):.2f} ms, di-crop {sum(c is not i for c, i in zip(crops, imgs)) / len(imgs):.0%}")
+
+    sizes = [img_size] + [s for s in args.sizes if s != img_size]
+    print(f"{'input':<6} {'size':>5} {'tta':>4} {'acc':>7} {'p50 ms':>8}")
+    for src_name, src in (("full", imgs), ("roi", crops)):
+        for size in sizes:
+            for tta in (True, False):
+                preds, lat = [], []
+                for pil in src:
+                    t0 = time.perf_counter()
+                    probs = _run_probs(model, size, device, pil, tta)
+                    lat.append((time.perf_counter() - t0) * 1000.0)
+                    preds.append(int(np.argmax(probs)))
+                acc = float((np.asarray(preds) == y).mean())
+                print(f"{src_name:<6} {size:>5} {str(tta):>4} {acc:>7.2%} {statistics.median(lat):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# scripts/bench_upload_size.py
+"""
+Upload asli vs downscale di klien (meniru frontend/src/lib/downscale.ts dengan PIL).
+
+Per gambar: ukuran byte, waktu decode server (uploads.decode_image) dan perkiraan latensi
+end-to-end di jaringan yang di-throttle (profil DevTools: RTT + upload/bandwidth). Dengan --url,
+request benar-benar dikirim ke server yang berjalan dan waktu respons servernya ikut diukur.
+
+Jalankan dari folder backend/:
+  python scripts/bench_upload_size.py --images foto_kuku/ --img-size 224
+  python scripts/bench_upload_size.py --images foto_kuku/ --url http://localhost:8000/api/classify
+"""
+import argparse, io, os, statistics, sys, time, uuid
+from pathlib import Path
+from urllib import request as urlrequest
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "nailbot.settings")
+
+# (RTT ms, uplink kbit/s) — preset throttling Chrome DevTools
+PROFILES = {"slow-3g": (400, 400), "fast-3g": (150, 675), "4g": (60, 9000)}
+_EXT = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp"}
+
+
+def client_downscale(data: bytes, side: int, fit: str, fmt: str, quality: float) -> bytes:
+    from PIL import Image, ImageOps
+
+    im = ImageOps.exif_transpose(Image.open(io.BytesIO(data))).convert("RGB")
+    if fit == "stretch":
+        im = im.resize((side, side), Image.LANCZOS)
+    else:
+        im.thumbnail((side, side), Image.LANCZOS)
+    buf = io.BytesIO()
+    im.save(buf, fmt, quality=int(quality * 100))
+    return buf.getvalue()
+
+
+def transfer_ms(n_bytes: int, rtt_ms: float, up_kbps: float) -> float:
+    # 2 RTT (TCP + request/response, koneksi TLS diasumsikan sudah hangat) + waktu kirim body
+    return 2 * rtt_ms + n_bytes * 8 / up_kbps
+
+
+def post(url: str, data: bytes, filename: str) -> float:
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"image\"; filename=\"{filename}\"\r\n"
+        f"Content-Type: application/octet-stream\r\n\r\n"
+    ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+    req = urlrequest.Request(url, data=body, headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+    t0 = time.perf_counter()
+    with urlrequest.urlopen(req) as resp:
+        resp.read()
+    return (time.perf_counter() - t0) * 1000.0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--images", required=True, help="Folder gambar uji.")
+    ap.add_argument("--img-size", type=int, default=224, help="img_size model (lihat GET /api/model/meta).")
+    ap.add_argument("--fit", choices=["stretch", "contain"], default="stretch")
+    ap.add_argument("--format", choices=["WEBP", "JPEG"], default="WEBP")
+    ap.add_argument("--quality", type=float, default=0.9)
+    ap.add_argument("--url", default=None, help="Endpoint /api/classify untuk latensi server nyata.")
+    ap.add_argument("--limit", type=int, default=50)
+    args = ap.parse_args()
+
+    import django
+    django.setup()
+    from api.uploads import decode_image
+
+    paths = sorted(p for p in Path(args.images).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png", ".webp"))
+    paths = paths[:args.limit]
+    if not paths:
+        sys.exit(f"Tidak ada gambar di {args.images}")
+
+    rows = {"asli": [], "klien": []}
+    for p in paths:
+        orig = p.read_bytes()
+        small = client_downscale(orig, args.img_size, args.fit, args.format, args.quality)
+        for name, data, fname in (("asli", orig, p.name), ("klien", small, f"upload.{_EXT[args.format]}")):
+            t0 = time.perf_counter()
+            decode_image(data)
+            decode_ms = (time.perf_counter() - t0) * 1000.0
+            server_ms = post(args.url, data, fname) if args.url else decode_ms
+            rows[name].append((len(data), decode_ms, server_ms))
+
+    print(f"{len(paths)} gambar, target {args.fit} {args.img_size}px {args.format} q={args.quality}")
+    print(f"{'':<6} {'KB med':>8} {'decode ms':>10} {'server ms':>10}  " + "  ".join(f"{k + ' ms':>12}" for k in PROFILES))
+    med = {}
+    for name, r in rows.items():
+        kb = statistics.median(x[0] for x in r) / 1024
+        dec = statistics.median(x[1] for x in r)
+        srv = statistics.median(x[2] for x in r)
+        e2e = [statistics.median(transfer_ms(x[0], rtt, up) + x[2] for x in r) for rtt, up in PROFILES.values()]
+        med[name] = (kb, e2e)
+        print(f"{name:<6} {kb:>8.1f} {dec:>10.1f} {srv:>10.1f}  " + "  ".join(f"{v:>12.0f}" for v in e2e))
+    saved = 1 - sum(x[0] for x in rows["klien"]) / sum(x[0] for x in rows["asli"])
+    print(f"\nbyte dihemat: {saved:.1%}; latensi end-to-end median turun " +
+          ", ".join(f"{k} {a / b:.1f}×" for k, a, b in zip(PROFILES, med["asli"][1], med["klien"][1])))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,22 @@
 # scripts/build_index.py
-import os, glob, re, uuid
+import os, sys, glob, re, uuid
 from pathlib import Path
 import chromadb
 from sentence_transformers import SentenceTransformer
 
 BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))  # agar paket api/ bisa diimpor dari scripts/
+from api.bm25 import BM25Index, bm25_path
+from api.chunker import chunk_by_tokens
+from api.qemb import QuantizedIndex
+
 KB_DIR = BASE_DIR / "kb"
 INDEX_DIR = BASE_DIR / "rag_index"
 COLL_NAME = "nail_kb"
 EMB_MODEL_NAME = os.getenv("EMB_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
+# batas chunk dalam token tokenizer model embedding (bukan karakter)
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
 
 def read_text(path: Path) -> str:
     text = path.read_text(encoding="utf-8", errors="ignore")
@@ -17,24 +25,6 @@ def read_text(path: Path) -> str:
     text = re.sub(r'\n{3,}', '\n\n', text)
     return text.strip()
 
-def chunk_text(text: str, max_chars: int = 800, overlap: int = 120):
-    """Chunk sederhana berbasis jumlah karakter + overlap (windowing)."""
-    if len(text) <= max_chars:
-        return [text]
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = start + max_chars
-        chunk = text[start:end]
-        # pastikan potong di batas kalimat bila memungkinkan
-        m = re.search(r'.*[.!?](\s|$)', chunk, flags=re.S)
-        if m and (m.end() > max_chars * 0.6):
-            end = start + m.end()
-            chunk = text[start:end]
-        chunks.append(chunk.strip())
-        start = max(0, end - overlap)
-    return [c for c in chunks if c]
-
 def main():
     INDEX_DIR.mkdir(exist_ok=True)
     client = chromadb.PersistentClient(path=str(INDEX_DIR))
@@ -51,20 +41,32 @@ def main():
     if not files:
         raise SystemExit(f"Tidak ada file .md/.txt di {KB_DIR}")
 
+    max_tokens = min(CHUNK_MAX_TOKENS, model.max_seq_length - 2)  # sisakan [CLS]/[SEP]
     for path in files:
         raw = read_text(path)
-        for i, chunk in enumerate(chunk_text(raw)):
+        for i, chunk in enumerate(chunk_by_tokens(raw, model.tokenizer, max_tokens, CHUNK_OVERLAP_TOKENS)):
             doc_id = f"{path.as_posix()}::{i}::{uuid.uuid4().hex[:8]}"
-            docs.append(chunk)
+            docs.append(chunk["text"])
             ids.append(doc_id)
-            metas.append({"source": path.as_posix(), "chunk_index": i})
+            # offset karakter & panjang token (dipakai context packer runtime)
+            metas.append({
+                "source": path.as_posix(), "chunk_index": i,
+                "start": chunk["start"], "end": chunk["end"], "n_tokens": chunk["n_tokens"],
+            })
 
     # embed in batch
-    embeddings = model.encode(docs, batch_size=64, normalize_embeddings=True).tolist()
-    col.upsert(documents=docs, embeddings=embeddings, metadatas=metas, ids=ids)
+    embeddings = model.encode(docs, batch_size=64, normalize_embeddings=True)
+    col.upsert(documents=docs, embeddings=embeddings.tolist(), metadatas=metas, ids=ids)
+
+    # indeks leksikal BM25 + embedding terkuantisasi (int8/biner) berdampingan dengan koleksi vektor
+    BM25Index.build(ids, docs).save(bm25_path(INDEX_DIR, COLL_NAME))
+    qindex = QuantizedIndex.build(ids, embeddings)
+    qindex.save(INDEX_DIR, COLL_NAME)
 
+    mem = qindex.memory_report()
     print(f"Index built: {len(docs)} chunks from {len(files)} files")
-    print(f"Collection: {COLL_NAME} @ {INDEX_DIR}")
+    print(f"Collection: {COLL_NAME} @ {INDEX_DIR} (+ BM25, qemb: float32 {mem['float32_mb']:.2f} MB → "
+          f"int8 {mem['int8_mb']:.2f} MB / biner {mem['binary_mb']:.2f} MB)")
 
 if __name__ == "__main__":
     main()
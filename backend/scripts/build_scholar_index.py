@@ -1,10 +1,14 @@
 # scripts/build_scholar_index.py
-import os, time, json, re, urllib.parse, xml.etree.ElementTree as ET
+import os, sys, time, json, re, urllib.parse, xml.etree.ElementTree as ET
 from pathlib import Path
 import requests, chromadb
 from sentence_transformers import SentenceTransformer
 
 BASE_DIR   = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))  # agar paket api/ bisa diimpor dari scripts/
+from api.bm25 import BM25Index, bm25_path
+from api.qemb import QuantizedIndex
+
 INDEX_DIR  = BASE_DIR / "rag_index"
 COLL_NAME  = "nail_kb_scholar"
 EMB_MODEL  = os.getenv("EMB_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
@@ -97,9 +101,17 @@ def main():
     if not docs:
         raise SystemExit("Tidak ada paper yang berhasil diambil. Cek koneksi/query.")
 
-    embs = model.encode(docs, batch_size=32, normalize_embeddings=True).tolist()
-    col.upsert(documents=docs, embeddings=embs, metadatas=metas, ids=ids)
-    print(f"Scholar index built: {len(docs)} chunks → {COLL_NAME} @ {INDEX_DIR}")
+    for meta, ids_ in zip(metas, model.tokenizer(docs, add_special_tokens=False)["input_ids"]):
+        meta["n_tokens"] = len(ids_)
+
+    embs = model.encode(docs, batch_size=32, normalize_embeddings=True)
+    col.upsert(documents=docs, embeddings=embs.tolist(), metadatas=metas, ids=ids)
+    BM25Index.build(ids, docs).save(bm25_path(INDEX_DIR, COLL_NAME))
+    qindex = QuantizedIndex.build(ids, embs)
+    qindex.save(INDEX_DIR, COLL_NAME)
+    mem = qindex.memory_report()
+    print(f"Scholar index built: {len(docs)} chunks → {COLL_NAME} @ {INDEX_DIR} (+ BM25, qemb: float32 "
+          f"{mem['float32_mb']:.2f} MB → int8 {mem['int8_mb']:.2f} MB / biner {mem['binary_mb']:.2f} MB)")
 
 if __name__ == "__main__":
     main()
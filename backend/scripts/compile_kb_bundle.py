@@ -0,0 +1,75 @@
+# scripts/compile_kb_bundle.py
+"""
+Kompilasi knowledge-base ke satu bundle berversi (.nkb) lalu publikasikan sebagai CURRENT.
+
+Sumber: koleksi Chroma hasil build_index.py & build_scholar_index.py (embedding, teks,
+metadata termasuk n_tokens), alias query dari api/rag.py, dan label map (labels.json).
+Server yang berjalan akan hot-swap ke bundle baru dalam KB_BUNDLE_POLL_S detik.
+
+Jalankan dari folder backend/:  python scripts/compile_kb_bundle.py [--keep 3] [--no-publish]
+"""
+import argparse, json, os, sys
+from pathlib import Path
+
+import chromadb
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))
+from api import kb_bundle
+from api.rag import COLL_LOCAL, COLL_SCHOLAR, EMB_MODEL_NAME, INDEX_DIR, _GENERAL_ALIASES, _LABEL_ALIASES
+
+
+def _dump_collection(client, name: str) -> dict:
+    col = client.get_collection(name)
+    got = col.get(include=["embeddings", "documents", "metadatas"])
+    return {
+        "ids": got["ids"],
+        "documents": got["documents"],
+        "metadatas": got["metadatas"],
+        "embeddings": got["embeddings"],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--labels", default=os.getenv("LABELS_JSON", str(BASE_DIR / "models" / "labels.json")))
+    ap.add_argument("--keep", type=int, default=3, help="Jumlah bundle lama yang disimpan.")
+    ap.add_argument("--no-publish", action="store_true", help="Tulis bundle tanpa mengubah CURRENT.")
+    args = ap.parse_args()
+
+    client = chromadb.PersistentClient(path=str(INDEX_DIR))
+    collections = {name: _dump_collection(client, name) for name in (COLL_LOCAL, COLL_SCHOLAR)}
+    with open(args.labels, "r", encoding="utf-8") as f:
+        labels = json.load(f)
+
+    kb_bundle.BUNDLE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = kb_bundle.BUNDLE_DIR / "kb-build.nkb"
+    version = kb_bundle.write_bundle(
+        tmp_path,
+        collections,
+        aliases={"label": _LABEL_ALIASES, "general": _GENERAL_ALIASES},
+        labels=labels,
+        emb_model=EMB_MODEL_NAME,
+    )
+    final = kb_bundle.BUNDLE_DIR / f"kb-{version}.nkb"
+    os.replace(tmp_path, final)
+
+    kb_bundle.KBBundle(final)  # verifikasi checksum sebelum dipublikasikan
+    if not args.no_publish:
+        kb_bundle.publish(final)
+
+    # bersihkan bundle lama; yang baru dibuat & yang ditunjuk CURRENT (mis. --no-publish) tidak dihapus
+    ptr = kb_bundle.pointer_path()
+    current = ptr.read_text(encoding="utf-8").strip() if ptr.exists() else ""
+    old = sorted(kb_bundle.BUNDLE_DIR.glob("kb-*.nkb"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for p in old[max(1, args.keep):]:
+        if p != final and p.name != current:
+            p.unlink(missing_ok=True)
+
+    sizes = {n: len(c["ids"]) for n, c in collections.items()}
+    print(f"Bundle {version}: {sizes} → {final} ({final.stat().st_size / 1e6:.1f} MB)")
+    print("Dipublikasikan sebagai CURRENT." if not args.no_publish else "Tidak dipublikasikan (--no-publish).")
+
+
+if __name__ == "__main__":
+    main()
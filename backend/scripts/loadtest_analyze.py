@@ -0,0 +1,103 @@
+# scripts/loadtest_analyze.py
+"""
+Load test open-loop untuk POST /api/analyze: request datang dengan laju tetap (tidak menunggu
+respons sebelumnya), seperti klien sungguhan saat lonjakan. Per tingkat laju dilaporkan goodput
+(200 dalam --timeout), p50/p95 latensi sukses, porsi 429/503 (dan latensinya: penolakan harus
+cepat), degraded (klasifikasi saja) dan timeout.
+
+Bandingkan server dengan ADMISSION_ENABLED=True vs False; tanpa admission control goodput
+runtuh melewati kapasitas karena semua request mengantre sampai timeout.
+
+Jalankan dari folder backend/ (server sudah berjalan):
+  python scripts/loadtest_analyze.py --image kuku.jpg --rates 1 2 4 8 16 --duration 30
+  # uji kuota per klien (429): server perlu ADMISSION_RATE_PER_MIN > 0 dan
+  # ADMISSION_CLIENT_HEADER=X-Forwarded-For (banyak klien dari satu mesin)
+  python scripts/loadtest_analyze.py --image kuku.jpg --clients 200
+"""
+import argparse, json, statistics, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib import error, request as urlrequest
+
+
+def _pct(xs, q):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(q * len(xs)))] if xs else float("nan")
+
+
+def _body(image: bytes, filename: str, prompt: str):
+    boundary = uuid.uuid4().hex
+    parts = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"prompt\"\r\n\r\n{prompt}\r\n"
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"image\"; filename=\"{filename}\"\r\n"
+        f"Content-Type: application/octet-stream\r\n\r\n"
+    ).encode() + image + f"\r\n--{boundary}--\r\n".encode()
+    return parts, f"multipart/form-data; boundary={boundary}"
+
+
+def _one(url, body, ctype, client, timeout):
+    headers = {"Content-Type": ctype, "X-Forwarded-For": f"10.0.{client // 256}.{client % 256}"}
+    t0 = time.perf_counter()
+    try:
+        with urlrequest.urlopen(urlrequest.Request(url, data=body, headers=headers), timeout=timeout) as resp:
+            data = json.loads(resp.read() or b"{}")
+            kind = "degraded" if data.get("degraded") else "ok"
+    except error.HTTPError as e:
+        kind = str(e.code)
+    except Exception:
+        kind = "timeout"
+    return kind, (time.perf_counter() - t0) * 1000.0
+
+
+def run_level(url, body, ctype, rate, duration, clients, timeout):
+    futs = []
+    n = int(rate * duration)
+    with ThreadPoolExecutor(max_workers=min(1024, int(rate * timeout) + 8)) as ex:
+        t_start = time.perf_counter()
+        for i in range(n):
+            delay = t_start + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futs.append(ex.submit(_one, url, body, ctype, i % clients, timeout))
+    wall = max(duration, time.perf_counter() - t_start)
+    results = [f.result() for f in futs]
+    by = {}
+    for kind, ms in results:
+        by.setdefault(kind, []).append(ms)
+    ok = by.get("ok", [])
+    shed = by.get("429", []) + by.get("503", [])
+    return {
+        "rate": rate,
+        "goodput": len(ok) / wall,
+        "p50": statistics.median(ok) if ok else float("nan"),
+        "p95": _pct(ok, 0.95),
+        "shed": len(shed) / max(1, n),
+        "shed_p95": _pct(shed, 0.95),
+        "degraded": len(by.get("degraded", [])) / max(1, n),
+        "timeout": len(by.get("timeout", [])) / max(1, n),
+        "other": sum(len(v) for k, v in by.items() if k not in ("ok", "degraded", "429", "503", "timeout")),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="http://localhost:8000/api/analyze")
+    ap.add_argument("--image", required=True)
+    ap.add_argument("--prompt", default="Apa penyebab dan perawatannya?")
+    ap.add_argument("--rates", type=float, nargs="*", default=[1, 2, 4, 8, 16], help="Request/detik per tingkat.")
+    ap.add_argument("--duration", type=float, default=30, help="Detik per tingkat.")
+    ap.add_argument("--clients", type=int, default=50, help="Jumlah klien berbeda (X-Forwarded-For).")
+    ap.add_argument("--timeout", type=float, default=30, help="Timeout klien (detik).")
+    args = ap.parse_args()
+
+    body, ctype = _body(Path(args.image).read_bytes(), Path(args.image).name, args.prompt)
+    print(f"{'req/s':>6} {'goodput':>8} {'p50 ms':>8} {'p95 ms':>8} {'ditolak':>8} {'tolak p95':>10} "
+          f"{'degraded':>9} {'timeout':>8} {'lain':>5}")
+    for rate in args.rates:
+        r = run_level(args.url, body, ctype, rate, args.duration, args.clients, args.timeout)
+        print(f"{r['rate']:>6.1f} {r['goodput']:>8.2f} {r['p50']:>8.0f} {r['p95']:>8.0f} {r['shed']:>8.1%} "
+              f"{r['shed_p95']:>10.0f} {r['degraded']:>9.1%} {r['timeout']:>8.1%} {r['other']:>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+// Downscale + re-encode gambar di browser sebelum upload.
+// Target diambil dari GET /api/model/meta: model hanya melihat img_size×img_size, jadi
+// mengirim foto asli (bisa beberapa MB) hanya membuang waktu upload & decode di server.
+
+export interface UploadSpec {
+  fit: "contain" | "stretch"; // stretch = persis width×height (sama dengan Resize di server)
+  width: number;
+  height: number;
+  formats: string[]; // dicoba berurutan, mis. ["image/webp", "image/jpeg"]
+  quality: number;
+  max_bytes: number;
+}
+
+export interface PreparedUpload {
+  file: File;
+  originalBytes: number;
+  bytes: number;
+  width: number;
+  height: number;
+  ms: number; // waktu decode + resize + encode di browser
+}
+
+let specPromise: Promise<UploadSpec | null> | null = null;
+
+export function fetchUploadSpec(apiBase: string): Promise<UploadSpec | null> {
+  if (!specPromise) {
+    specPromise = fetch(`${apiBase}/model/meta`)
+      .then((res) => (res.ok ? res.json() : null))
+      .then((meta) => (meta?.upload as UploadSpec) ?? null)
+      .catch(() => null);
+    // gagal → jangan di-cache, coba lagi di upload berikutnya
+    specPromise.then((spec) => { if (!spec) specPromise = null; });
+  }
+  return specPromise;
+}
+
+function targetSize(w: number, h: number, spec: UploadSpec): [number, number] {
+  if (spec.fit === "stretch") return [spec.width, spec.height];
+  const scale = Math.min(1, spec.width / w, spec.height / h);
+  return [Math.max(1, Math.round(w * scale)), Math.max(1, Math.round(h * scale))];
+}
+
+function makeCanvas(w: number, h: number): HTMLCanvasElement {
+  const c = document.createElement("canvas");
+  c.width = w;
+  c.height = h;
+  return c;
+}
+
+// Turun bertahap (maks ½ per langkah): drawImage sekali jalan dari 4000px ke 224px
+// menghasilkan aliasing di browser yang mengabaikan imageSmoothingQuality.
+function resample(src: CanvasImageSource, sw: number, sh: number, tw: number, th: number): HTMLCanvasElement {
+  let cur: CanvasImageSource = src;
+  let w = sw, h = sh;
+  let canvas: HTMLCanvasElement;
+  do {
+    canvas = makeCanvas(Math.max(tw, Math.round(w / 2)), Math.max(th, Math.round(h / 2)));
+    const ctx = canvas.getContext("2d") as CanvasRenderingContext2D;
+    ctx.imageSmoothingEnabled = true;
+    ctx.imageSmoothingQuality = "high";
+    ctx.drawImage(cur, 0, 0, w, h, 0, 0, canvas.width, canvas.height);
+    cur = canvas; w = canvas.width; h = canvas.height;
+  } while (w !== tw || h !== th);
+  return canvas;
+}
+
+function toBlob(canvas: HTMLCanvasElement, type: string, quality: number): Promise<Blob | null> {
+  return new Promise((resolve) => canvas.toBlob(resolve, type, quality));
+}
+
+export async function prepareUpload(file: File, spec: UploadSpec | null): Promise<PreparedUpload> {
+  const t0 = performance.now();
+  const keep = (w = 0, h = 0): PreparedUpload => ({
+    file, originalBytes: file.size, bytes: file.size, width: w, height: h, ms: performance.now() - t0,
+  });
+  if (!spec) return keep();
+
+  let bitmap: ImageBitmap;
+  try {
+    bitmap = await createImageBitmap(file, { imageOrientation: "from-image" });
+  } catch {
+    return keep(); // format tak dikenal browser → biarkan server yang memutuskan
+  }
+  const [tw, th] = targetSize(bitmap.width, bitmap.height, spec);
+  const resized = tw !== bitmap.width || th !== bitmap.height;
+  if (!resized && spec.formats.includes(file.type)) {
+    bitmap.close();
+    return keep(tw, th); // sudah sesuai target
+  }
+
+  const canvas = resample(bitmap, bitmap.width, bitmap.height, tw, th);
+  bitmap.close();
+  for (const type of spec.formats) {
+    const blob = await toBlob(canvas, type, spec.quality);
+    // Safari lama: toBlob("image/webp") diam-diam menghasilkan PNG → coba format berikutnya
+    if (!blob || blob.type !== type) continue;
+    if (blob.size >= file.size && !resized) break;
+    const ext = type.split("/")[1].replace("jpeg", "jpg");
+    return {
+      file: new File([blob], `upload.${ext}`, { type }),
+      originalBytes: file.size,
+      bytes: blob.size,
+      width: tw,
+      height: th,
+      ms: performance.now() - t0,
+    };
+  }
+  return keep(tw, th);
+}